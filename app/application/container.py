@@ -1,6 +1,16 @@
 from app.application.services.blockchain_listener import PaymentPoller
+from app.application.services.block_checkpoint import BlockCheckpoint
+from app.application.services.intent_pool import IntentPoolService
+from app.application.services.payment_events import PaymentEventsHub
+from app.application.services.payment_intents import PaymentIntentsService
+from app.application.services.payment_log_filter import PaymentLogFilter
 from app.application.services.payment_processor import PaymentProcessor, TransactionService
+from app.application.services.poller_coordination import PollerCoordinator
+from app.application.services.poller_metrics import PollerMetrics
 from app.application.services.qr_generator import QRCodeService
+from app.application.services.qr_renderer import QRRenderExecutor
+from app.application.services.short_links import ShortLinkService
+from app.application.services.tariff_cache import TariffCache
 from app.application.services.tariffs import TariffsService
 from app.infrastructure.container import InfrastructureContainer
 from app.config import Settings
@@ -11,10 +21,16 @@ class ServicesContainer:
         self._settings = settings
         self._infra = infra
         self._qr_service = None
+        self._qr_render_executor = None
+        self._short_links = None
         self._payment_processor = None
         self._tariffs_service = None
         self._transaction_service = None
         self._blockchain_listener = None
+        self._poller_metrics = None
+        self._intent_pool = None
+        self._payment_intents = None
+        self._payment_events = None
         
     @property
     def qr_service(self) -> QRCodeService:
@@ -22,23 +38,67 @@ class ServicesContainer:
             self._qr_service = QRCodeService(
                 settings = self._settings,
                 transaction_service=self.transaction_service,
-                blockchain_helper=self._infra.blockchain_helper
+                blockchain_helper=self._infra.blockchain_helper,
+                render_executor=self.qr_render_executor,
+                short_links=self.short_links,
+                qr_cache=self._infra.qr_cache_redis
             )
         return self._qr_service
 
+    @property
+    def short_links(self) -> ShortLinkService:
+        if self._short_links is None:
+            self._short_links = ShortLinkService(
+                short_links_repo=self._infra.short_links_redis,
+                base_url=self._settings.public_base_url
+            )
+        return self._short_links
+
+    @property
+    def qr_render_executor(self) -> QRRenderExecutor:
+        if self._qr_render_executor is None:
+            self._qr_render_executor = QRRenderExecutor(
+                workers=self._settings.qr_render_workers,
+                queue_size=self._settings.qr_render_queue_size,
+                timeout=self._settings.qr_render_timeout
+            )
+        return self._qr_render_executor
+
     @property
     def payment_processor(self) -> PaymentProcessor:
         if self._payment_processor is None:
             self._payment_processor = PaymentProcessor(
-                transactions_pg=self._infra.transactions_pg
+                transactions_pg=self._infra.transactions_pg,
+                payment_status_redis=self._infra.payment_status_redis,
+                negative_ttl_seconds=self._settings.payment_check_negative_ttl_seconds,
+                settled_ttl_seconds=self._settings.settled_payment_ttl_seconds
             )
         return self._payment_processor
 
+    @property
+    def payment_events(self) -> PaymentEventsHub:
+        if self._payment_events is None:
+            self._payment_events = PaymentEventsHub(
+                pubsub=self._infra.pubsub,
+                payment_processor=self.payment_processor,
+                transaction_service=self.transaction_service,
+                keepalive_seconds=self._settings.payment_events_keepalive_seconds,
+                max_wait_seconds=self._settings.payment_ttl_seconds
+            )
+        return self._payment_events
+
     @property
     def tariffs_service(self) -> TariffsService:
         if self._tariffs_service is None:
             self._tariffs_service = TariffsService(
-                tariffs_repo=self._infra.tariffs_pg
+                tariffs_repo=self._infra.tariffs_pg,
+                intent_pool_repo=self._infra.intent_pool_redis,
+                version_repo=self._infra.tariffs_version_redis,
+                cache=TariffCache(
+                    ttl_seconds=self._settings.tariff_cache_ttl_seconds,
+                    max_size=self._settings.tariff_cache_max_size
+                ),
+                pubsub=self._infra.pubsub
             )
         return self._tariffs_service
 
@@ -47,18 +107,71 @@ class ServicesContainer:
         if self._transaction_service is None:
             self._transaction_service = TransactionService(
                 redis_repository=self._infra.transactions_redis,
-                transactions_pg=self._infra.transactions_pg
+                transactions_pg=self._infra.transactions_pg,
+                payment_status_redis=self._infra.payment_status_redis,
+                pubsub=self._infra.pubsub,
+                ttl_seconds=self._settings.payment_ttl_seconds,
+                settled_ttl_seconds=self._settings.settled_payment_ttl_seconds
             )
         return self._transaction_service
 
+    @property
+    def intent_pool(self) -> IntentPoolService:
+        if self._intent_pool is None:
+            self._intent_pool = IntentPoolService(
+                settings=self._settings,
+                pool_repo=self._infra.intent_pool_redis,
+                tariffs_service=self.tariffs_service,
+                qr_service=self.qr_service
+            )
+        return self._intent_pool
+
+    @property
+    def payment_intents(self) -> PaymentIntentsService:
+        if self._payment_intents is None:
+            self._payment_intents = PaymentIntentsService(
+                tariffs_service=self.tariffs_service,
+                transaction_service=self.transaction_service,
+                qr_service=self.qr_service,
+                intent_pool=self.intent_pool
+            )
+        return self._payment_intents
+
+    @property
+    def poller_metrics(self) -> PollerMetrics:
+        if self._poller_metrics is None:
+            self._poller_metrics = PollerMetrics(metrics_repo=self._infra.poller_metrics_redis)
+        return self._poller_metrics
+
     @property
     def blockchain_listener(self) -> PaymentPoller:
         if self._blockchain_listener is None:
             self._blockchain_listener = PaymentPoller(
                 settings=self._settings,
-                redis_repository=self._infra.transactions_redis,
                 transactions_pg=self._infra.transactions_pg,
                 blockchain_helper=self._infra.blockchain_helper,
-                transaction_service=self.transaction_service
+                transaction_service=self.transaction_service,
+                checkpoint=BlockCheckpoint(
+                    checkpoint_repo=self._infra.checkpoint_redis,
+                    blockchain_helper=self._infra.blockchain_helper,
+                    flush_interval=self._settings.checkpoint_flush_interval,
+                    flush_blocks=self._settings.checkpoint_flush_blocks,
+                    reorg_rewind_blocks=self._settings.checkpoint_reorg_rewind_blocks
+                ),
+                metrics=self.poller_metrics,
+                coordinator=PollerCoordinator(
+                    coordination_repo=self._infra.poller_coordination_redis,
+                    lease_ttl_seconds=self._settings.poller_lease_ttl_seconds,
+                    range_blocks=self._settings.poller_range_blocks,
+                    claim_ttl_seconds=self._settings.poller_range_claim_ttl_seconds
+                ),
+                log_filter=PaymentLogFilter(
+                    tariffs_repo=self._infra.tariffs_pg,
+                    transaction_service=self.transaction_service,
+                    blockchain_helper=self._infra.blockchain_helper,
+                    tariff_filter=self._settings.poller_tariff_filter,
+                    pending_filter=self._settings.poller_pending_filter,
+                    pending_filter_max=self._settings.poller_pending_filter_max
+                )
             )
         return self._blockchain_listener
\ No newline at end of file
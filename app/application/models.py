@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # Сервисные модели для тарифов
 
@@ -45,3 +45,36 @@ class ContractData(BaseModel):
     paymentId: UUID
     tariffId: UUID
     price: int
+
+# Сервисные модели для выдачи QR-кодов
+
+class PreparedIntent(BaseModel):
+    """ Заранее подготовленный платеж из пула: calldata и QR-код уже посчитаны """
+    payment_id: UUID
+    tariff_id: UUID
+    amount: int
+    payment_url: str
+    qr_content: str
+    image: bytes
+    
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
+class IssuedQRCode(BaseModel):
+    """ Результат выдачи QR-кода пользователю """
+    transaction: TransactionData
+    image: bytes
+    image_format: str
+    etag: str
+
+class FailedQRCode(BaseModel):
+    """ QR-код пачки, который не удалось отрендерить: платеж создан, изображения нет """
+    transaction: TransactionData
+    image_format: str
+    error: str
+
+class CachedQRCode(BaseModel):
+    """ QR-код существующего неоплаченного платежа """
+    image: bytes
+    image_format: str
+    etag: str
+    ttl: int
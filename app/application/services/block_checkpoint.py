@@ -0,0 +1,124 @@
+""" Контрольная точка поллера: последний полностью обработанный блок """
+import asyncio
+from collections import Counter
+import logging
+from typing import Optional
+
+from app.infrastructure.blockchain import AsyncWeb3Service
+from app.infrastructure.db.redis.repositories import BlockCheckpointRepository
+
+logger = logging.getLogger(__name__)
+
+
+class BlockCheckpoint:
+    """
+    Считает, до какого блока все события уже обработаны, и сохраняет этот блок с хешем.
+    Источники событий (догоняющий обход, подписка) сообщают, до какого блока они
+    все события уже отдали в очередь, каждое событие учитывается от постановки в очередь
+    до конца обработки. Безопасный блок - меньший из отметок источников и блока
+    перед самым ранним необработанным событием.
+    В Redis точка пишется не на каждое событие, а раз в flush_interval секунд
+    или при продвижении на flush_blocks блоков, с fencing-токеном текущего лидера.
+    При загрузке хеш сверяется с канонической цепью: блок точки ушел в реорганизацию -
+    обработка начинается на reorg_rewind_blocks блоков раньше.
+    """
+    def __init__(
+            self,
+            checkpoint_repo: BlockCheckpointRepository,
+            blockchain_helper: AsyncWeb3Service,
+            flush_interval: float = 5.0,
+            flush_blocks: int = 100,
+            reorg_rewind_blocks: int = 128
+        ):
+        self.checkpoint_repo = checkpoint_repo
+        self.blockchain_helper = blockchain_helper
+        self.flush_interval = flush_interval
+        self.flush_blocks = flush_blocks
+        self.reorg_rewind_blocks = max(1, reorg_rewind_blocks)
+
+        self.persisted: Optional[int] = None
+        self.fencing_token = 0
+        self._sources: dict[str, int] = {}
+        self._in_flight: Counter[int] = Counter()
+        self._last_flush = 0.0
+
+    async def load(self) -> Optional[int]:
+        """
+        Блок, с которого безопасно продолжить (все до него включительно обработано),
+        None - поллер запускается впервые.
+        """
+        checkpoint = await self.checkpoint_repo.get()
+        if checkpoint is None:
+            return None
+        block_number, block_hash = checkpoint
+        canonical = await self.blockchain_helper.get_canonical_hash(block_number)
+        if canonical != block_hash:
+            # События после точки расхождения могли быть из отвалившейся ветки - перечитываем
+            # с запасом, повторный перенос уже обработанных платежей безвреден
+            rewound = max(0, block_number - self.reorg_rewind_blocks)
+            logger.warning(
+                f"Checkpoint block {block_number} ({block_hash}) is no longer canonical ({canonical}), "
+                f"resuming from block {rewound + 1}"
+            )
+            block_number = rewound
+        else:
+            logger.info(f"Loaded checkpoint at block {block_number} ({block_hash})")
+        # Откат тоже становится сохраненной точкой - иначе запись не продолжится до старого блока
+        self.persisted = block_number
+        return self.persisted
+
+    def reset(self):
+        """Новый срок лидерства: отметки источников и учет событий начинаются заново."""
+        self._sources.clear()
+        self._in_flight.clear()
+
+    def mark_source(self, source: str, block_number: int):
+        """Источник отдал в очередь все события до block_number включительно."""
+        self._sources[source] = max(block_number, self._sources.get(source, block_number))
+
+    def finish_source(self, source: str):
+        """Источник закончил работу и больше не сдерживает контрольную точку."""
+        self._sources.pop(source, None)
+
+    def add(self, block_number: int):
+        self._in_flight[block_number] += 1
+
+    def done(self, block_number: int):
+        self._in_flight[block_number] -= 1
+        if self._in_flight[block_number] <= 0:
+            del self._in_flight[block_number]
+
+    @property
+    def safe_block(self) -> Optional[int]:
+        if not self._sources:
+            return None
+        safe = min(self._sources.values())
+        if self._in_flight:
+            safe = min(safe, min(self._in_flight) - 1)
+        return safe
+
+    async def run(self):
+        """Периодически сохраняет контрольную точку, если она продвинулась достаточно."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(1.0, self.flush_interval))
+            safe = self.safe_block
+            if safe is None or (self.persisted is not None and safe <= self.persisted):
+                continue
+            due = loop.time() - self._last_flush >= self.flush_interval
+            if due or self.persisted is None or safe - self.persisted >= self.flush_blocks:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Checkpoint flush failed: {e}")
+
+    async def flush(self):
+        safe = self.safe_block
+        if safe is None or (self.persisted is not None and safe <= self.persisted):
+            return
+        block_hash = await self.blockchain_helper.get_block_hash(safe)
+        if not await self.checkpoint_repo.set(safe, block_hash, self.fencing_token):
+            raise RuntimeError(f"Checkpoint write fenced off: token {self.fencing_token} is stale")
+        self.persisted = safe
+        self._last_flush = asyncio.get_running_loop().time()
+        logger.debug(f"Checkpoint advanced to block {safe}")
@@ -1,12 +1,18 @@
 import asyncio
+from collections import OrderedDict
 import logging
-from typing import Dict
+import time
 
 from app.config import Settings
 from app.infrastructure.blockchain import AsyncWeb3Service
-from app.infrastructure.db.redis.repositories import TransactionsRepository as TransactionsRepositoryRedis
+from app.infrastructure.payment_log import PaymentEvent
 from app.infrastructure.db.postgres.repositories.transactions import TransactionsRepository as TransactionsRepositoryPostgres
+from app.application.services.block_checkpoint import BlockCheckpoint
+from app.application.services.confirmations import ConfirmationBuffer
+from app.application.services.payment_log_filter import PaymentLogFilter
 from app.application.services.payment_processor import TransactionService
+from app.application.services.poller_coordination import PollerCoordinator
+from app.application.services.poller_metrics import PollerMetrics
 
 logging.basicConfig(
     level=logging.INFO,  # уровень логирования
@@ -16,74 +22,356 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class PaymentPoller:
+    """
+    Поллер платежей. Экземпляров может быть несколько: все разбирают диапазоны
+    догоняющего обхода, а лидер (аренда в Redis) дополнительно слушает новые блоки
+    и ведет контрольную точку. Потерял аренду - прекращает работу лидера,
+    другой экземпляр подхватит ее с сохраненной контрольной точки.
+    """
+    CATCH_UP_SOURCE = "catch_up"
+    LIVE_SOURCE = "live"
+    FILTER_SOURCE = "filter_rescan"
+
     def __init__(
             self, 
             settings: Settings, 
-            redis_repository: TransactionsRepositoryRedis, 
             transactions_pg: TransactionsRepositoryPostgres, 
             blockchain_helper: AsyncWeb3Service, 
-            transaction_service: TransactionService
+            transaction_service: TransactionService,
+            checkpoint: BlockCheckpoint,
+            metrics: PollerMetrics,
+            coordinator: PollerCoordinator,
+            log_filter: PaymentLogFilter
         ):
         self.settings = settings
-        self.redis_repository = redis_repository
         self.transactions_pg = transactions_pg
         self.blockchain_helper = blockchain_helper
         self.transaction_service = transaction_service
+        self.checkpoint = checkpoint
+        self.metrics = metrics
+        self.coordinator = coordinator
+        self.log_filter = log_filter
+        self.workers = max(1, settings.poller_workers)
+        self.batch_size = max(1, settings.poller_batch_size)
+        self.batch_wait = settings.poller_batch_wait_ms / 1000
         
+        self.is_leader = False
         self.last_block = None
-        self.queue: asyncio.Queue[Dict] = asyncio.Queue()  # очередь событий
+        self.head_block = None
+        self.confirmed_block = None
+        self._new_term()
 
-    async def start(self):
-    # Получаем последнюю обработанную точку
-        self.last_block = await self.get_last_processed_block() or 0
-        
-        # Запускаем все три задачи параллельно
-        await asyncio.gather(
-            self.catch_up_pending_transactions(),
-            self.listen_new_transactions(),
-            self.process_queue()  # единый обработчик очереди
+    def _new_term(self):
+        """Состояние лидера создается заново на каждый срок аренды."""
+        # Свежие события ждут подтверждений здесь и только потом попадают в очередь
+        self.confirmations = ConfirmationBuffer(
+            blockchain_helper=self.blockchain_helper,
+            confirmations=self.settings.blockchain_confirmations,
+            release=self.enqueue,
+            on_confirmed=lambda block: self.checkpoint.mark_source(self.LIVE_SOURCE, block),
+            metrics=self.metrics
         )
+        # Очереди ограничены: при отставании обработки подписка ждет на put,
+        # а не копит события в памяти
+        self.queue: asyncio.Queue[PaymentEvent] = asyncio.Queue(maxsize=max(1, self.settings.poller_queue_size))
+        self._shards: list[asyncio.Queue[PaymentEvent]] = [
+            asyncio.Queue(maxsize=self.batch_size * 2) for _ in range(self.workers)
+        ]
+        # Время постановки необработанных событий в очередь - первое самое старое
+        self._enqueued_at: OrderedDict[int, float] = OrderedDict()
+        self.checkpoint.reset()
+
+    async def start(self):
+        try:
+            await self.log_filter.refresh()
+        except Exception as e:
+            # Без фильтра узел отдает все события контракта - медленнее, но ничего не теряем
+            logger.error(f"Failed to build payment log filter: {e}")
+        try:
+            await asyncio.gather(
+                *(self.process_ranges() for _ in range(max(1, self.settings.poller_range_workers))),
+                self.run_leadership(),
+                self.refresh_log_filter(),
+                self.report_metrics()
+            )
+        finally:
+            await self.coordinator.release()
+
+    async def run_leadership(self):
+        """Пытается стать лидером, пока лидер - продлевает аренду. Потерял - останавливает срок."""
+        renew_every = self.coordinator.lease_ttl / 3
+        while True:
+            try:
+                token = await self.coordinator.acquire()
+            except Exception as e:
+                logger.error(f"Failed to acquire poller lease: {e}")
+                token = None
+            if token is None:
+                await asyncio.sleep(renew_every)
+                continue
+
+            logger.info(f"Instance {self.coordinator.instance_id} became poller leader, fencing token {token}")
+            self.checkpoint.fencing_token = token
+            term = asyncio.create_task(self.lead())
+            try:
+                while True:
+                    await asyncio.wait({term}, timeout=renew_every)
+                    if term.done():
+                        break
+                    if not await self.coordinator.renew():
+                        logger.warning(f"Poller lease lost, stepping down (token {token})")
+                        break
+            finally:
+                term.cancel()
+                try:
+                    await term
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    # Срок упал - отдаем аренду, пусть ее возьмет экземпляр поздоровее
+                    logger.error(f"Poller leader term failed: {e}")
+                    await self.coordinator.release()
+                    await asyncio.sleep(renew_every)
+                self.is_leader = False
+
+    async def lead(self):
+        self._new_term()
+        self.is_leader = True
+        # Голову читаем один раз: догоняющий обход идет до последнего подтвержденного блока,
+        # подписка - со следующего, иначе блоки между двумя чтениями головы выпадают
+        self.head_block = await self.blockchain_helper.get_current_block()
+        self.confirmed_block = self.head_block - self.settings.blockchain_confirmations
+        self.last_block = await self.get_last_processed_block()
+
+        self.confirmations.start(self.confirmed_block)
+        self.checkpoint.mark_source(self.CATCH_UP_SOURCE, self.last_block)
+        self.checkpoint.mark_source(self.LIVE_SOURCE, self.confirmed_block)
+        await self.coordinator.plan(self.last_block + 1, self.confirmed_block)
+        try:
+            await asyncio.gather(
+                self.track_catch_up(),
+                self.listen_new_transactions(),
+                self.rescan_filtered_blocks(),
+                self.process_queue(),  # раздает события обработчикам
+                self.checkpoint.run()
+            )
+        finally:
+            try:
+                await self.checkpoint.flush()
+            except Exception as e:
+                logger.error(f"Final checkpoint flush failed: {e}")
     
     async def get_last_processed_block(self) -> int:
-        last_tx = await self.redis_repository.get_last_block_number()
-        return last_tx
+        """Блок из контрольной точки. При первом запуске - poller_start_block или последний подтвержденный блок."""
+        checkpoint = await self.checkpoint.load()
+        if checkpoint is not None:
+            return checkpoint
+        if self.settings.poller_start_block is not None:
+            return self.settings.poller_start_block - 1
+        return self.confirmed_block
     
-    async def catch_up_pending_transactions(self):
-        current_block = await self.blockchain_helper.get_current_block()
-        if self.last_block < current_block:
-            logger.info(f"Catching up from block {self.last_block + 1} to {current_block}")
-            txs = await self.blockchain_helper.get_pending_payments(
-                from_block=self.last_block + 1,
-                to_block=current_block
-            )
-            for tx in txs:
-                await self.queue.put(tx)  # кладём в очередь
+    async def track_catch_up(self):
+        """Двигает контрольную точку догоняющего обхода по диапазонам, завершенным всеми экземплярами."""
+        frontier = self.last_block
+        while frontier < self.confirmed_block:
+            await asyncio.sleep(1.0)
+            try:
+                frontier = await self.coordinator.advance_frontier(frontier)
+            except Exception as e:
+                logger.error(f"Failed to read catch-up progress: {e}")
+                continue
+            self.checkpoint.mark_source(self.CATCH_UP_SOURCE, frontier)
+        logger.info(f"Catch-up finished at block {self.confirmed_block}")
+        self.checkpoint.finish_source(self.CATCH_UP_SOURCE)
+
+    async def refresh_log_filter(self):
+        while True:
+            await asyncio.sleep(self.settings.poller_filter_refresh_seconds)
+            try:
+                await self.log_filter.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh payment log filter: {e}")
+
+    async def rescan_filtered_blocks(self):
+        """
+        Фильтр по тарифам изменился - блоки, прошедшие со старым фильтром, перечитываются
+        с новым. События идут через буфер подтверждений, повтор уже перенесенного безвреден.
+        """
+        # Новый срок планирует догоняющий обход от контрольной точки уже с текущим фильтром
+        self.log_filter.take_stale()
+        while True:
+            await asyncio.sleep(self.settings.poller_filter_refresh_seconds)
+            stale_from = self.log_filter.take_stale()
+            if stale_from is None:
+                continue
+            # Подписка переключается на новый фильтр со следующим сообщением
+            while not self.blockchain_helper.filter_applied:
+                await asyncio.sleep(1.0)
+
+            self.checkpoint.mark_source(self.FILTER_SOURCE, stale_from - 1)
+            try:
+                head = await self.blockchain_helper.get_current_block()
+                logger.info(f"Payment log filter changed, rescanning blocks {stale_from}-{head}")
+                async for _, events in self.blockchain_helper.scan_payment_logs(stale_from, head):
+                    for event in events:
+                        await self.confirmations.add(event)
+            except Exception as e:
+                logger.error(f"Rescan after filter change failed, will be retried: {e}")
+                self.log_filter.mark_stale(stale_from)
+            finally:
+                self.checkpoint.finish_source(self.FILTER_SOURCE)
+
+    async def process_ranges(self):
+        """Разбирает диапазоны догоняющего обхода, запланированные лидером. Работает на каждом экземпляре."""
+        while True:
+            try:
+                block_range = await self.coordinator.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim catch-up range: {e}")
+                block_range = None
+            if block_range is None:
+                await asyncio.sleep(self.settings.poller_range_poll_interval)
+                continue
 
-            self.last_block = current_block
+            try:
+                await self.process_range(block_range)
+                await self.coordinator.complete(block_range)
+            except Exception as e:
+                # Захват истечет, и диапазон разберет этот или другой экземпляр
+                logger.error(f"Catch-up range {block_range[0]}-{block_range[1]} failed, will be retried: {e}")
+
+    async def process_range(self, block_range: tuple[int, int]):
+        start, end = block_range
+        logger.info(f"Catching up blocks {start}-{end}")
+        loop = asyncio.get_running_loop()
+        extend_at = loop.time() + self.coordinator.claim_ttl / 3
+        if not self.log_filter.covers(end):
+            await self.log_filter.refresh()
+        # Конец диапазона известен - ожидающие платежи читаем после него, см. PaymentLogFilter
+        payment_hashes = await self.log_filter.pending_payment_hashes()
+        # Окна приходят в порядке блоков, ошибку диапазона не глушим - иначе потеряем платежи
+        async for _, txs in self.blockchain_helper.scan_payment_logs(start, end, payment_hashes=payment_hashes):
+            for i in range(0, len(txs), self.batch_size):
+                await self.process_payments(txs[i:i + self.batch_size])
+            if loop.time() >= extend_at:
+                await self.coordinator.extend(block_range)
+                extend_at = loop.time() + self.coordinator.claim_ttl / 3
 
     async def listen_new_transactions(self):
-        async def callback(tx: Dict):
-            await self.queue.put(tx)  # кладём новые события в очередь
+        await self.blockchain_helper.listen_payments(
+            self.confirmations.add,  # в очередь события попадут после подтверждения
+            from_block=self.confirmed_block + 1,
+            on_progress=self.confirmations.on_progress,
+            on_head=self.confirmations.on_head
+        )
 
-        await self.blockchain_helper.listen_payments(callback)
+    async def enqueue(self, tx: PaymentEvent):
+        self.checkpoint.add(tx.block_number)
+        self._enqueued_at[id(tx)] = time.monotonic()
+        await self.queue.put(tx)
 
     async def process_queue(self):
+        """
+        Раздает события по poller_workers обработчикам по хешу payment_id: события
+        одного платежа обрабатываются строго по порядку, разных платежей - параллельно.
+        Контрольная точка не уйдет дальше самого раннего необработанного блока,
+        в каком бы обработчике он ни застрял.
+        """
+        workers = [asyncio.create_task(self._process_shard(shard)) for shard in self._shards]
+        try:
+            while True:
+                tx = await self.queue.get()
+                # Занятый шард тормозит раздачу, а за ней и производителей
+                await self._shards[self._shard(tx.payment_id)].put(tx)
+                self.queue.task_done()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _process_shard(self, shard: asyncio.Queue[PaymentEvent]):
+        """Забирает из шарда пачку до poller_batch_size событий или poller_batch_wait_ms и переносит ее разом."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await shard.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if not shard.empty():
+                    batch.append(shard.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(shard.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._settle_batch(batch)
+                for tx in batch:
+                    self.checkpoint.done(tx.block_number)
+            finally:
+                for tx in batch:
+                    self._enqueued_at.pop(id(tx), None)
+                    shard.task_done()
+
+    async def _settle_batch(self, batch: list[PaymentEvent]):
+        """
+        Переносит пачку, повторяя при ошибке с растущей паузой до poller_retry_max_seconds.
+        Перенос идемпотентен, так что повтор безопасен. Пока пачка не прошла, шард стоит,
+        а за ним через ограниченные очереди ждут и источники событий.
+        """
+        attempt = 0
         while True:
-            tx = await self.queue.get()
             try:
-                await self.process_payment(tx)
+                await self.process_payments(batch)
+                return
             except Exception as e:
-                logger.error(f"Error processing payment {tx.get('tx_hash')}: {e}")
-            finally:
-                # Обновляем last_block
-                self.last_block = max(self.last_block or 0, tx["block_number"])
-                self.queue.task_done()
+                attempt += 1
+                delay = min(self.settings.poller_retry_max_seconds, 0.5 * 2 ** (attempt - 1))
+                blocks = sorted({tx.block_number for tx in batch})
+                logger.error(
+                    f"Error processing {len(batch)} payments in blocks {blocks[0]}-{blocks[-1]} "
+                    f"(attempt {attempt}), retrying in {delay:.1f}s: {e}"
+                )
+                await asyncio.sleep(delay)
+
+    def _shard(self, payment_id: str) -> int:
+        # payment_id - keccak, младшие байты распределены равномерно
+        return int(payment_id[-8:], 16) % self.workers
+
+    async def process_payments(self, batch: list[PaymentEvent]):
+        # Транзакция в Redis лежит под paymentId из события, см. TransactionService.compute_payment_hash
+        tx_hashes = {tx.payment_id: tx.tx_hash for tx in batch}
+        migrated = await self.transaction_service.migrate_transactions(list(tx_hashes))
+        self.metrics.payments_settled += len(migrated)
+        for data in migrated:
+            tx_hash = tx_hashes.get(TransactionService.compute_payment_hash(data.payment_id))
+            logger.info(f"Processed payment {data.payment_id} in tx {tx_hash}")
+
+    async def report_metrics(self):
+        interval = self.settings.poller_metrics_interval
+        while True:
+            await asyncio.sleep(interval)
+            if not self.is_leader:
+                continue  # метрики поллера публикует лидер, иначе экземпляры перетирают друг друга
+            self.update_lag_metrics()
+            self.metrics.set_gauge("fencing_token", self.checkpoint.fencing_token)
+            self.metrics.set_gauge("rpc_endpoints", self.blockchain_helper.rpc_pool.stats())
+            try:
+                await self.metrics.publish(expire_seconds=int(interval * 3))
+            except Exception as e:
+                logger.error(f"Failed to publish poller metrics: {e}")
+
+    def update_lag_metrics(self):
+        """Глубина очередей, возраст самого старого необработанного события и отставание от головы."""
+        self.metrics.set_gauge("queue_depth", self.queue.qsize() + sum(shard.qsize() for shard in self._shards))
+        self.metrics.set_gauge("confirmation_buffer_size", self.confirmations.size)
+
+        oldest = next(iter(self._enqueued_at.values()), None)
+        self.metrics.set_gauge("oldest_event_age_seconds", time.monotonic() - oldest if oldest is not None else 0.0)
 
-    async def process_payment(self, tx: Dict):
-        tx_hash = tx["tx_hash"]
-        # TODO: error прописать
-        valid_tx = await self.redis_repository.find_transaction(tx_hash)
-        if valid_tx:
-            await self.transaction_service.migrate_transaction(tx_hash)
-            await self.redis_repository.delete_transaction(tx_hash)
-            logger.info(f"Processed payment {tx_hash}")
+        head = max(self.head_block or 0, self.confirmations.head or 0)
+        safe = self.checkpoint.safe_block
+        if safe is not None:
+            self.metrics.set_gauge("blocks_behind_head", max(0, head - safe))
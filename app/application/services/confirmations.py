@@ -0,0 +1,152 @@
+""" Буфер событий до нужной глубины подтверждений с обработкой реорганизаций """
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.application.services.poller_metrics import PollerMetrics
+from app.infrastructure.blockchain import AsyncWeb3Service
+from app.infrastructure.payment_log import PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+EventKey = tuple[str, int]
+
+
+class ConfirmationBuffer:
+    """
+    Держит события свежих блоков в памяти, пока над ними не наберется confirmations блоков,
+    и только тогда отдает их в release. Ничего не ждет на каждое событие отдельно:
+    блоки отпускаются пачкой при каждом новом заголовке.
+
+    Реорганизация ловится двумя способами:
+    - parent_hash нового заголовка не совпал с запомненным хешем предыдущего блока -
+      события ветки, которая отвалилась, выбрасываются и перечитываются с канонической цепи;
+    - перед выдачей блок сверяется с каноническим хешем, расхождение - перечитываем блок.
+    Лог, отозванный подпиской (removed), просто удаляется из буфера.
+    """
+    def __init__(
+            self,
+            blockchain_helper: AsyncWeb3Service,
+            confirmations: int,
+            release: Callable[[PaymentEvent], Awaitable[Any]],
+            on_confirmed: Callable[[int], Any],
+            metrics: PollerMetrics
+        ):
+        self.blockchain_helper = blockchain_helper
+        self.confirmations = max(0, confirmations)
+        self.release = release
+        self.on_confirmed = on_confirmed
+        self.metrics = metrics
+
+        self.head: Optional[int] = None
+        self.delivered: Optional[int] = None   # все события до этого блока уже пришли в буфер
+        self.confirmed: Optional[int] = None   # все события до этого блока уже отданы в release
+        self._blocks: dict[int, dict[EventKey, PaymentEvent]] = {}
+        self._headers: dict[int, str] = {}
+
+    def start(self, confirmed_block: int):
+        """Блоки до confirmed_block включительно - зона догоняющего обхода, не буфера."""
+        self.confirmed = confirmed_block
+        self.delivered = confirmed_block
+
+    @property
+    def size(self) -> int:
+        return sum(len(events) for events in self._blocks.values())
+
+    async def add(self, event: PaymentEvent):
+        block_number = event.block_number
+        key = event.key
+        if event.removed:
+            events = self._blocks.get(block_number)
+            if events and events.pop(key, None) is not None:
+                self.metrics.reorged_events += 1
+                if not events:
+                    del self._blocks[block_number]
+            return
+
+        if self.confirmed is not None and block_number <= self.confirmed:
+            # Повтор уже подтвержденного (догрузка после переподключения) - перенос идемпотентен
+            await self._release_event(event)
+            return
+        self._blocks.setdefault(block_number, {})[key] = event
+
+    async def on_progress(self, block_number: int):
+        if self.delivered is None or block_number > self.delivered:
+            self.delivered = block_number
+            await self._advance()
+
+    async def on_head(self, header: Dict[str, Any]):
+        number = header["number"]
+        known_parent = self._headers.get(number - 1)
+        if known_parent is not None and known_parent != header["parent_hash"]:
+            await self._handle_reorg(number - 1)
+
+        # Цепь могла стать короче - заголовки выше нового больше не канонические
+        for stale in [block for block in self._headers if block >= number]:
+            del self._headers[stale]
+        self._headers[number] = header["hash"]
+        self.head = number
+
+        # Для сверки parent_hash достаточно заголовков в пределах глубины подтверждений
+        for old in [block for block in self._headers if block < number - self.confirmations - 1]:
+            del self._headers[old]
+        await self._advance()
+
+    async def _advance(self):
+        if self.head is None or self.delivered is None:
+            return
+        target = min(self.delivered, self.head - self.confirmations)
+        if self.confirmed is not None and target <= self.confirmed:
+            return
+        for block_number in sorted(block for block in self._blocks if block <= target):
+            await self._release_block(block_number)
+        self.confirmed = target
+        self.on_confirmed(target)
+
+    async def _release_block(self, block_number: int):
+        events = self._blocks.pop(block_number)
+        canonical = await self.blockchain_helper.get_block_hash(block_number)
+        if any(event.block_hash != canonical for event in events.values()):
+            logger.warning(f"Block {block_number} was reorged before confirmation, reloading its events")
+            self.metrics.reorgs += 1
+            self.metrics.reorged_events += len(events)
+            events = {
+                event.key: event
+                for event in await self.blockchain_helper.get_payment_logs(block_number, block_number)
+            }
+        for event in events.values():
+            await self._release_event(event)
+
+    async def _release_event(self, event: PaymentEvent):
+        self.metrics.time_to_finality.observe(max(0.0, time.time() - event.timestamp))
+        await self.release(event)
+
+    async def _handle_reorg(self, mismatched_block: int):
+        """
+        Ищет точку расхождения, идя назад по запомненным заголовкам, выбрасывает
+        события отвалившейся ветки и перечитывает эти блоки с канонической цепи.
+        """
+        fork = mismatched_block
+        while fork in self._headers:
+            if await self.blockchain_helper.get_block_hash(fork) == self._headers[fork]:
+                break
+            fork -= 1
+        fork += 1  # первый блок, отличающийся от канонической цепи
+
+        self.metrics.reorgs += 1
+        if self.confirmed is not None and fork <= self.confirmed:
+            logger.critical(
+                f"Reorg from block {fork} is deeper than {self.confirmations} confirmations: "
+                f"payments up to block {self.confirmed} were already released"
+            )
+        start = fork if self.confirmed is None else max(fork, self.confirmed + 1)
+        logger.warning(f"Reorg detected at block {fork}, replaying blocks from {start}")
+
+        for block_number in [block for block in self._blocks if block >= start]:
+            self.metrics.reorged_events += len(self._blocks.pop(block_number))
+        for block_number in [block for block in self._headers if block >= fork]:
+            del self._headers[block_number]
+
+        if self.delivered is not None and start <= self.delivered:
+            for event in await self.blockchain_helper.get_payment_logs(start, self.delivered):
+                self._blocks.setdefault(event.block_number, {})[event.key] = event
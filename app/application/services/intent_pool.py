@@ -0,0 +1,155 @@
+""" Пул заранее подготовленных платежей для активных тарифов """
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+import uuid
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.application.models import PreparedIntent, TariffData
+from app.application.services.qr_generator import QRCodeService
+from app.application.services.tariffs import TariffsService
+from app.config import Settings
+from app.infrastructure.db.redis.repositories import IntentPoolRepository
+
+logger = logging.getLogger(__name__)
+
+
+class IntentPoolService:
+    """
+    Держит в Redis по пулу готовых платежей на каждый активный тариф:
+    payment_id, calldata и PNG уже посчитаны, запросу остается только забрать один.
+    Фоновая задача доливает пул до intent_pool_size, когда он опускается до low watermark.
+    """
+    def __init__(
+            self,
+            settings: Settings,
+            pool_repo: IntentPoolRepository,
+            tariffs_service: TariffsService,
+            qr_service: QRCodeService
+        ):
+        self.pool_repo = pool_repo
+        self.tariffs_service = tariffs_service
+        self.qr_service = qr_service
+
+        self.pool_size = settings.intent_pool_size
+        self.low_watermark = settings.intent_pool_low_watermark
+        self.refill_interval = settings.intent_pool_refill_interval
+        self.pool_ttl = settings.intent_pool_ttl_seconds
+
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.pool_size > 0
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def acquire(self, tariff: TariffData) -> Optional[PreparedIntent]:
+        """Атомарно забирает подготовленный платеж. None - пул пуст или отключен."""
+        if not self.enabled:
+            return None
+
+        raw, remaining = await self.pool_repo.pop(tariff.tariff_id)
+        if remaining <= self.low_watermark:
+            self._wakeup.set()
+        if raw is None:
+            return None
+
+        try:
+            intent = PreparedIntent.model_validate_json(raw)
+        except ValidationError:
+            # Пул собран предыдущей версией сервиса - пересобираем
+            await self.invalidate(tariff.tariff_id)
+            return None
+        if intent.amount != tariff.price:
+            # Цена изменилась, а пул еще не успели сбросить - весь пул устарел
+            await self.invalidate(tariff.tariff_id)
+            return None
+        return intent
+
+    async def release(self, intent: PreparedIntent):
+        """Возвращает в пул платеж, который так и не был привязан к пользователю."""
+        await self.pool_repo.push_back(intent.tariff_id, intent.model_dump_json())
+
+    async def invalidate(self, tariff_id: UUID):
+        await self.pool_repo.clear(tariff_id)
+        self._wakeup.set()
+
+    async def refill(self, tariff: TariffData):
+        """Доливает пул тарифа, если он опустился до low watermark."""
+        if not await self.pool_repo.try_lock(tariff.tariff_id, expire_seconds=60):
+            return  # пул уже наполняет другой воркер
+        try:
+            size = await self.pool_repo.size(tariff.tariff_id)
+            if size > self.low_watermark:
+                return
+            intents = await self._prepare(tariff, self.pool_size - size)
+            if intents:
+                await self.pool_repo.push_many(
+                    tariff.tariff_id,
+                    [intent.model_dump_json() for intent in intents],
+                    expire_seconds=self.pool_ttl
+                )
+                logger.info(f"Intent pool for tariff {tariff.name} refilled with {len(intents)} intents")
+        finally:
+            await self.pool_repo.unlock(tariff.tariff_id)
+
+    async def _prepare(self, tariff: TariffData, count: int) -> list[PreparedIntent]:
+        """Готовит платежи пачками по числу процессов рендеринга, не занимая весь пул."""
+        batch_size = max(1, self.qr_service.render_executor.workers // 2)
+        intents = []
+        for _ in range(0, count, batch_size):
+            payment_ids = [uuid.uuid4() for _ in range(min(batch_size, count - len(intents)))]
+            urls = self.qr_service.build_payment_urls(payment_ids, tariff.tariff_id, tariff.price)
+            contents = [
+                self.qr_service.qr_content(payment_id, url) for payment_id, url in zip(payment_ids, urls)
+            ]
+            try:
+                images = await asyncio.gather(*(
+                    self.qr_service.generate_qr_code_image(content) for content in contents
+                ))
+            except HTTPException:
+                # Пул рендеринга занят запросами пользователей - им приоритет
+                break
+            intents.extend(
+                PreparedIntent(
+                    payment_id=payment_id,
+                    tariff_id=tariff.tariff_id,
+                    amount=tariff.price,
+                    payment_url=url,
+                    qr_content=content,
+                    image=image
+                )
+                for payment_id, url, content, image in zip(payment_ids, urls, contents, images)
+            )
+        return intents
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                for raw_tariff in await self.tariffs_service.get_all():
+                    if raw_tariff.is_active:
+                        await self.refill(TariffData.model_validate(raw_tariff))
+            except Exception as e:
+                logger.error(f"Intent pool refill failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
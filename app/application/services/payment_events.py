@@ -0,0 +1,129 @@
+""" Push-уведомления клиентов об оплате платежа """
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+from app.application.services.payment_processor import PaymentProcessor, TransactionService
+from app.infrastructure.db.redis.pubsub import RedisPubSub
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentEventsHub:
+    """
+    Ждущие оплаты клиенты (SSE, WebSocket) регистрируются здесь. Поллер публикует
+    payment_id в Redis после переноса платежа, одна подписка на воркер будит нужных ждущих.
+    Неизвестный, истекший или уже перенесенный без оплаты платеж не ждем: при каждой
+    проверке сверяемся с транзакцией в Redis.
+    Подписка на уведомления - в start, до запуска общей подписки воркера; после close
+    все ожидания завершаются, клиенты переподключатся к другому воркеру.
+    """
+    # Полная перепроверка статуса, даже без уведомления - страховка от потерянного сообщения
+    RECHECK_INTERVAL = 60.0
+    PAID = "paid"
+    PENDING = "pending"
+    # Не оплачен и не ждет оплаты: истек или не выдавался - различить их уже нельзя
+    EXPIRED = "expired"
+
+    def __init__(
+            self,
+            pubsub: RedisPubSub,
+            payment_processor: PaymentProcessor,
+            transaction_service: TransactionService,
+            keepalive_seconds: float = 15.0,
+            max_wait_seconds: float = 3600.0
+        ):
+        self.pubsub = pubsub
+        self.payment_processor = payment_processor
+        self.transaction_service = transaction_service
+        self.keepalive_seconds = keepalive_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+        self._started = False
+        self._closed = False
+
+    async def start(self):
+        if not self._started:
+            self.pubsub.subscribe(TransactionService.SETTLED_CHANNEL, self._on_settled)
+            self._started = True
+
+    async def close(self):
+        if self._started:
+            self.pubsub.unsubscribe(TransactionService.SETTLED_CHANNEL, self._on_settled)
+            self._started = False
+        # Без подписки оплату никто не сообщит - будим ждущих, чтобы они завершились
+        self._closed = True
+        self._wake_all()
+
+    @property
+    def waiters(self) -> int:
+        return sum(len(events) for events in self._waiters.values())
+
+    async def status(self, payment_id: UUID) -> tuple[str, Optional[str]]:
+        """Текущий статус платежа и токен, если он оплачен."""
+        token = await self.payment_processor.check_payment(payment_id)
+        if token:
+            return self.PAID, token
+        if await self.transaction_service.is_payment_pending(payment_id):
+            return self.PENDING, None
+        # Перенос пишет в Postgres раньше, чем удаляет транзакцию из Redis:
+        # проверка мимо кеша промахов отличит только что оплаченный от истекшего
+        token = await self.payment_processor.check_payment(payment_id, fresh=True)
+        if token:
+            return self.PAID, token
+        return self.EXPIRED, None
+
+    async def watch(self, payment_id: UUID) -> AsyncIterator[Optional[str]]:
+        """
+        Ждет оплаты платежа. Отдает None раз в keepalive_seconds, пока платеж не оплачен,
+        и токен, когда оплачен. Завершается без токена, если платеж так и не оплатили
+        или ждать нечего: транзакции в Redis нет (не выдавалась или истекла).
+        """
+        key = str(payment_id)
+        event = asyncio.Event()
+        self._waiters.setdefault(key, set()).add(event)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_seconds
+        last_check = None
+        try:
+            while not self._closed:
+                if last_check is None or event.is_set() or loop.time() - last_check >= self.RECHECK_INTERVAL:
+                    # Сбрасываем до проверки: уведомление, пришедшее во время нее, не потеряется
+                    event.clear()
+                    last_check = loop.time()
+                    status, token = await self.status(payment_id)
+                    if status == self.PAID:
+                        yield token
+                        return
+                    if status == self.EXPIRED:
+                        return
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), min(self.keepalive_seconds, remaining))
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            events = self._waiters.get(key)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[key]
+
+    async def _on_settled(self, message: Optional[str]):
+        if message is None:
+            # Подписка переподключилась - уведомления могли потеряться, будим всех на перепроверку
+            self._wake_all()
+            return
+        for event in self._waiters.get(message, ()):
+            event.set()
+
+    def _wake_all(self):
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
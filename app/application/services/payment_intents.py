@@ -0,0 +1,191 @@
+""" Выдача QR-кодов на оплату тарифа """
+import asyncio
+import logging
+from typing import AsyncIterator, Optional, Union
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.application.models import CachedQRCode, FailedQRCode, IssuedQRCode, PreparedIntent, TariffData, TransactionData
+from app.application.services.intent_pool import IntentPoolService
+from app.application.services.payment_processor import TransactionService
+from app.application.services.qr_encoder import QRFormat
+from app.application.services.qr_generator import QRCodeService
+from app.application.services.tariffs import TariffsService
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentIntentsService:
+    """ Создает платеж пользователя и выдает QR-код для него """
+    CLAIM_ATTEMPTS = 3
+    
+    def __init__(
+            self,
+            tariffs_service: TariffsService,
+            transaction_service: TransactionService,
+            qr_service: QRCodeService,
+            intent_pool: IntentPoolService
+        ):
+        self.tariffs_service = tariffs_service
+        self.transaction_service = transaction_service
+        self.qr_service = qr_service
+        self.intent_pool = intent_pool
+
+    async def issue_qr_code(
+            self,
+            user_id: int,
+            tariff_name: str,
+            image_format: QRFormat = "png",
+            idempotency_key: Optional[str] = None
+        ) -> IssuedQRCode:
+        """
+        Выдает QR-код на оплату тарифа. Повторный запрос того же пользователя по тому же
+        тарифу получает уже открытый платеж, пока он не оплачен, не истек и цена не менялась.
+        С Idempotency-Key повтор запроса возвращает ровно тот же платеж, пока тот ждет оплаты;
+        оплаченный или истекший платеж повторно не выдается - ключ связывается с новым.
+        """
+        previous = None
+        if idempotency_key:
+            previous = await self.transaction_service.find_idempotent(user_id, idempotency_key)
+            if previous and await self.transaction_service.is_pending(previous):
+                return await self._reissue(previous, image_format)
+
+        tariff = await self.tariffs_service.get_by_name(tariff_name)
+        issued = await self._issue_for_tariff(user_id, tariff, image_format)
+
+        if idempotency_key:
+            data = await self.transaction_service.remember_idempotent(
+                user_id, idempotency_key, issued.transaction, replaces=previous
+            )
+            if data.payment_id != issued.transaction.payment_id:
+                # Параллельный повтор с тем же ключом успел раньше
+                return await self._reissue(data, image_format)
+        return issued
+
+    async def _issue_for_tariff(self, user_id: int, tariff: TariffData, image_format: QRFormat) -> IssuedQRCode:
+        """
+        Переиспользует открытый платеж или атомарно создает новый.
+        Новый платеж берется из пула, если он наполнен.
+        """
+        current = await self.transaction_service.find_open_transaction(user_id, tariff.tariff_id)
+        for _ in range(self.CLAIM_ATTEMPTS):
+            if current and current.amount == tariff.price and await self.transaction_service.is_pending(current):
+                return await self._reissue(current, image_format)
+
+            intent = await self.intent_pool.acquire(tariff)
+            data, conflict = await self.transaction_service.claim_transaction(
+                user_id, tariff, expected=current, payment_id=intent.payment_id if intent else None
+            )
+            if data is not None:
+                return await self._issue(data, intent, image_format)
+
+            # Индекс успел занять параллельный запрос - проверяем его платеж.
+            # Индекс истек или удален (conflict is None) - следующая попытка занимает пустой
+            if intent:
+                await self.intent_pool.release(intent)
+            current = conflict
+
+        raise HTTPException(status_code=409, detail="Слишком много одновременных запросов QR-кода, повторите позже")
+
+    async def _issue(self, data: TransactionData, intent: Optional[PreparedIntent], image_format: QRFormat) -> IssuedQRCode:
+        """Собирает QR-код для только что созданной транзакции и кладет его в кеш."""
+        if intent:
+            url = intent.payment_url
+            content = intent.qr_content
+            image = intent.image if image_format == "png" else None
+        else:
+            url = self.qr_service.build_qr_payload(data=data)
+            content = self.qr_service.qr_content(data.payment_id, url)
+            image = None
+
+        await self.qr_service.publish_payment_url(data.payment_id, url, content)
+        if image is None:
+            image = await self.qr_service.generate_qr_code_image(url=content, image_format=image_format)
+        etag = await self.qr_service.cache_image(data.payment_id, content, image, image_format)
+
+        return IssuedQRCode(transaction=data, image=image, image_format=image_format, etag=etag)
+
+    async def _reissue(self, data: TransactionData, image_format: QRFormat) -> IssuedQRCode:
+        """Отдает QR-код существующего платежа, по возможности из кеша."""
+        cached = await self.qr_service.get_cached_image(data.payment_id, image_format)
+        if cached:
+            return IssuedQRCode(transaction=data, image=cached.image, image_format=image_format, etag=cached.etag)
+        # Кеш еще не записал создавший платеж запрос - QR-код детерминирован, собираем сами
+        return await self._issue(data, None, image_format)
+
+    async def prepare_batch(self, user_ids: list[int], tariff_name: str) -> list[tuple[TransactionData, str]]:
+        """
+        Выдает платежи пачке пользователей по тем же правилам, что и issue_qr_code:
+        открытый неоплаченный платеж пользователя по тарифу переиспользуется, новый
+        занимает индекс открытых платежей. Тариф читается один раз, Redis - пачками.
+        Повторы user_id схлопываются. Возвращает пары (транзакция, содержимое QR-кода).
+        """
+        tariff = await self.tariffs_service.get_by_name(tariff_name)
+        claimed = await self.transaction_service.claim_transactions(user_ids, tariff, attempts=self.CLAIM_ATTEMPTS)
+        user_ids = list(dict.fromkeys(user_ids))
+        if len(claimed) < len(user_ids):
+            raise HTTPException(status_code=409, detail="Слишком много одновременных запросов QR-кода, повторите позже")
+        transactions = [claimed[user_id][0] for user_id in user_ids]
+
+        # Ссылки детерминированы - для переиспользованных платежей получаются те же самые
+        payment_ids = [data.payment_id for data in transactions]
+        urls = dict(zip(payment_ids, self.qr_service.build_payment_urls(payment_ids, tariff.tariff_id, tariff.price)))
+        contents = {payment_id: self.qr_service.qr_content(payment_id, url) for payment_id, url in urls.items()}
+
+        # Кеш и короткие ссылки переиспользованных платежей уже есть, продлевать их дальше платежа нельзя
+        created = {data.payment_id for data, is_new in claimed.values() if is_new}
+        await self.qr_service.publish_payment_urls(
+            {payment_id: url for payment_id, url in urls.items() if payment_id in created},
+            contents
+        )
+        await self.qr_service.cache_contents(
+            {payment_id: content for payment_id, content in contents.items() if payment_id in created}
+        )
+        return [(data, contents[data.payment_id]) for data in transactions]
+
+    async def render_batch(
+            self, prepared: list[tuple[TransactionData, str]], image_format: QRFormat = "png"
+        ) -> AsyncIterator[Union[IssuedQRCode, FailedQRCode]]:
+        """
+        Рендерит QR-коды пачки параллельно и отдает их по мере готовности.
+        В работе одновременно не больше двух рендеров на процесс пула, поэтому
+        в памяти никогда не лежит вся пачка изображений.
+        Упавший рендер не обрывает поток: вместо изображения отдается FailedQRCode,
+        платеж при этом создан и его QR можно получить через GET /payments/{payment_id}/qr.
+        """
+        async def render(data: TransactionData, content: str) -> Union[IssuedQRCode, FailedQRCode]:
+            try:
+                image = await self.qr_service.generate_qr_code_image(content, image_format, background=True)
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+                logger.warning(f"QR render failed for payment {data.payment_id}: {detail}")
+                return FailedQRCode(transaction=data, image_format=image_format, error=detail)
+            return IssuedQRCode(
+                transaction=data, image=image, image_format=image_format, etag=self.qr_service.make_etag(image)
+            )
+
+        window = self.qr_service.render_executor.workers * 2
+        pending: set[asyncio.Task] = set()
+        try:
+            for data, content in prepared:
+                pending.add(asyncio.create_task(render(data, content)))
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Клиент отключился посреди выдачи - не рендерим остаток впустую
+            for task in pending:
+                task.cancel()
+
+    async def get_qr_code(self, payment_id: UUID, image_format: QRFormat = "png") -> CachedQRCode:
+        """Отдает QR-код уже созданного неоплаченного платежа без создания нового."""
+        cached = await self.qr_service.get_cached_image(payment_id, image_format)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Платеж не найден, оплачен или истек")
+        return cached
@@ -0,0 +1,80 @@
+""" Фильтр событий PaymentReceived на стороне узла: только наши тарифы и платежи """
+import asyncio
+import logging
+from typing import Optional
+
+from app.application.services.payment_processor import TransactionService
+from app.infrastructure.blockchain import AsyncWeb3Service
+from app.infrastructure.db.postgres.repositories.tariffs import TariffsRepository
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentLogFilter:
+    """
+    Держит фильтр topics для eth_getLogs и подписки, чтобы узел отдавал только события
+    тарифов каталога. Неактивные тарифы тоже в фильтре: выданные по ним платежи еще могут прийти.
+
+    Фильтр, прочитанный после головы цепи head, полон для блоков до head включительно:
+    тариф появляется раньше оплаты по нему. Поэтому при каждом обновлении сначала читается
+    голова, потом каталог. Если фильтр изменился, блоки после головы предыдущего чтения
+    могли пройти со старым фильтром - с них начинается перечитывание (take_stale).
+    """
+    def __init__(
+            self,
+            tariffs_repo: TariffsRepository,
+            transaction_service: TransactionService,
+            blockchain_helper: AsyncWeb3Service,
+            tariff_filter: bool = True,
+            pending_filter: bool = False,
+            pending_filter_max: int = 1000
+        ):
+        self.tariffs_repo = tariffs_repo
+        self.transaction_service = transaction_service
+        self.blockchain_helper = blockchain_helper
+        self.tariff_filter = tariff_filter
+        self.pending_filter = pending_filter
+        self.pending_filter_max = pending_filter_max
+
+        self.complete_to: Optional[int] = None  # фильтр полон для блоков до этого включительно
+        self._stale_from: Optional[int] = None
+        # Обновляют и периодическая задача, и обработчики диапазонов - чтения не должны перемешаться
+        self._lock = asyncio.Lock()
+
+    def covers(self, block_number: int) -> bool:
+        return not self.tariff_filter or (self.complete_to is not None and block_number <= self.complete_to)
+
+    async def refresh(self):
+        if not self.tariff_filter:
+            return
+        async with self._lock:
+            head = await self.blockchain_helper.get_current_block()
+            tariffs = await self.tariffs_repo.get_all()
+            encoder = self.blockchain_helper.calldata_encoder
+            changed = self.blockchain_helper.set_tariff_filter(
+                encoder.tariff_hash(tariff.tariff_id) for tariff in tariffs
+            )
+            if changed:
+                logger.info(f"Payment log filter updated: {len(tariffs)} tariffs")
+                if self.complete_to is not None:
+                    self.mark_stale(self.complete_to + 1)
+            self.complete_to = head
+
+    def mark_stale(self, block_number: int):
+        """Блоки начиная с block_number нужно перечитать с текущим фильтром."""
+        self._stale_from = block_number if self._stale_from is None else min(self._stale_from, block_number)
+
+    def take_stale(self) -> Optional[int]:
+        """С какого блока события могли быть отфильтрованы устаревшим фильтром, None - перечитывать нечего."""
+        stale_from, self._stale_from = self._stale_from, None
+        return stale_from
+
+    async def pending_payment_hashes(self) -> Optional[list[str]]:
+        """
+        paymentId ожидающих оплаты платежей для фильтра по topics[1], None - не фильтровать.
+        Читать после того, как известен конец диапазона: платеж создается раньше оплаты,
+        а истекший или перенесенный платеж поллер все равно бы пропустил.
+        """
+        if not self.pending_filter:
+            return None
+        return await self.transaction_service.pending_payment_hashes(self.pending_filter_max)
@@ -1,29 +1,85 @@
 from datetime import datetime
-import hashlib
-import json
 import logging
 from typing import Optional
 from uuid import UUID
 import uuid
 
 from app.application.models import TariffData, TransactionData
-from app.infrastructure.db.redis.repositories import TransactionsRepository as TransactionsRepositoryRedis
+from app.infrastructure.calldata import PayForTariffEncoder
+from app.infrastructure.db.redis.pubsub import RedisPubSub
+from app.infrastructure.db.redis.repositories import (
+    PaymentStatusRepository,
+    QRCacheRepository,
+    TransactionsRepository as TransactionsRepositoryRedis,
+)
 from app.infrastructure.db.postgres.repositories.transactions import TransactionsRepository as TransactionsRepositoryPostgres
 
 logger = logging.getLogger(__name__)
 
 class PaymentProcessor:
     
-    def __init__(self, transactions_pg: TransactionsRepositoryPostgres):
+    def __init__(
+            self, 
+            transactions_pg: TransactionsRepositoryPostgres, 
+            payment_status_redis: PaymentStatusRepository, 
+            negative_ttl_seconds: float = 2.0,
+            settled_ttl_seconds: int = 7 * 24 * 3600
+        ):
         self.transactions_pg = transactions_pg  
+        self.payment_status_redis = payment_status_redis
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.settled_ttl_seconds = settled_ttl_seconds
 
-    async def check_payment(self, payment_id: UUID) -> Optional[str]:
-        """Проверяет, есть ли платеж с данным UUID в БД и возвращает токен, если есть."""
-        tx = self.transactions_pg.find(payment_id)
-        if tx.scalar_one_or_none() is not None:
+    async def check_payment(self, payment_id: UUID, fresh: bool = False) -> Optional[str]:
+        """
+        Проверяет, оплачен ли платеж, и возвращает токен, если да.
+        Сначала смотрит в Redis: оплаченные платежи туда пишет поллер, а недавние
+        промахи кешируются на пару секунд - частый опрос клиентов не доходит до Postgres.
+        fresh - мимо кеша промахов, сразу в Postgres.
+        """
+        status = await self.payment_status_redis.get_status(payment_id)
+        if status == PaymentStatusRepository.SETTLED:
             return PaymentProcessor._get_secret_token()
+        if status == PaymentStatusRepository.UNKNOWN and not fresh:
+            return None
+        
+        tx = await self.transactions_pg.find(payment_id)
+        if tx is not None:
+            await self.payment_status_redis.mark_settled([payment_id], expire_seconds=self.settled_ttl_seconds)
+            return PaymentProcessor._get_secret_token()
+        await self.payment_status_redis.mark_unknown(payment_id, expire_seconds=self.negative_ttl_seconds)
         return None
         
+    async def check_payments(self, payment_ids: list[UUID]) -> dict[UUID, Optional[str]]:
+        """
+        Пакетная версия check_payment: один MGET по кешу статусов и один запрос
+        в Postgres только для платежей, которых в кеше нет.
+        """
+        payment_ids = list(dict.fromkeys(payment_ids))
+        statuses = await self.payment_status_redis.get_statuses(payment_ids)
+        
+        result: dict[UUID, Optional[str]] = {}
+        missing = []
+        for payment_id in payment_ids:
+            status = statuses[payment_id]
+            if status == PaymentStatusRepository.SETTLED:
+                result[payment_id] = PaymentProcessor._get_secret_token()
+            elif status == PaymentStatusRepository.UNKNOWN:
+                result[payment_id] = None
+            else:
+                missing.append(payment_id)
+        
+        if missing:
+            settled = await self.transactions_pg.find_existing(missing)
+            unknown = [payment_id for payment_id in missing if payment_id not in settled]
+            if settled:
+                await self.payment_status_redis.mark_settled(list(settled), expire_seconds=self.settled_ttl_seconds)
+            if unknown:
+                await self.payment_status_redis.mark_unknown_many(unknown, expire_seconds=self.negative_ttl_seconds)
+            for payment_id in missing:
+                result[payment_id] = PaymentProcessor._get_secret_token() if payment_id in settled else None
+        return result
+        
     @staticmethod
     def _get_secret_token() -> str:
         """ Выдает секретный токен """
@@ -33,51 +89,227 @@ class PaymentProcessor:
 class TransactionService:
     """ Сервис управления жизненным циклом платежа """
     REDIS_KEY_TEMPLATE = "transaction:{payment_hash}"
+    OPEN_KEY_TEMPLATE = "open_transaction:{user_id}:{tariff_id}"
+    IDEMPOTENCY_KEY_TEMPLATE = "idempotency:{user_id}:{idempotency_key}"
+    # Канал, в который публикуется payment_id после переноса оплаченного платежа
+    SETTLED_CHANNEL = "payments:settled"
     
-    def __init__(self, redis_repository: TransactionsRepositoryRedis, transactions_pg: TransactionsRepositoryPostgres):
+    def __init__(
+            self, 
+            redis_repository: TransactionsRepositoryRedis, 
+            transactions_pg: TransactionsRepositoryPostgres, 
+            payment_status_redis: PaymentStatusRepository,
+            pubsub: RedisPubSub,
+            ttl_seconds: int = 3600,
+            settled_ttl_seconds: int = 7 * 24 * 3600
+        ):
         self.redis_repository = redis_repository
         self.tariffs_pg = transactions_pg
+        self.payment_status_redis = payment_status_redis
+        self.pubsub = pubsub
+        self.ttl_seconds = ttl_seconds
+        self.settled_ttl_seconds = settled_ttl_seconds
 
-    async def create_transaction_redis(self, user_id: int, tariff: TariffData) -> str:
-        """Создаёт транзакцию в Redis и возвращает данные для формирования calldata """
-        payment_id = str(uuid.uuid4())
-        
+    async def create_transaction_redis(self, user_id: int, tariff: TariffData, payment_id: Optional[UUID] = None) -> TransactionData:
+        """
+        Создаёт транзакцию в Redis и возвращает данные для формирования calldata.
+        payment_id передается, если платеж был подготовлен заранее в пуле.
+        """
         data = TransactionData(
-            payment_id=payment_id,
+            payment_id=payment_id or uuid.uuid4(),
             user_id=user_id,
             tariff_id=tariff.tariff_id,
             amount=tariff.price,
             created_at=datetime.utcnow(),
         )
-        payment_hash = TransactionService.compute_payment_hash(data.payment_id, data.tariff_id)
+        payment_hash = TransactionService.compute_payment_hash(data.payment_id)
         key = self._make_redis_key(payment_hash)
         
-        await self.redis_repository.create_transaction(key, json.dumps(data, default=str), expire_seconds=3600)
+        await self.redis_repository.create_transaction(key, data.model_dump(mode="json"), expire_seconds=self.ttl_seconds)
         return data
     
-    async def migrate_transaction(self, payment_hash: str):
-        tx = await self._find_transaction_redis(payment_hash)
-        new_tx = await self._create_transaction_postgres(tx)
-        if new_tx:
-            delete_tx = await self._delete_transaction_redis(payment_hash)
-            return delete_tx
-        else:
-            raise 
-    
-    async def _find_transaction_redis(self, payment_hash):
-        key = self._make_redis_key(payment_hash)
-        data = await self.redis_repository.find_transaction(key)
-        tx = TransactionData(**data)
-        return tx
-    
-    async def _create_transaction_postgres(self, tx):
-        tx = self.tariffs_pg.create(tx)
-        return tx
+    async def find_open_transaction(self, user_id: int, tariff_id: UUID) -> Optional[TransactionData]:
+        """Ищет открытую транзакцию пользователя по тарифу в индексе."""
+        raw = await self.redis_repository.get_raw(self._make_open_key(user_id, tariff_id))
+        return TransactionData.model_validate_json(raw) if raw else None
+
+    async def claim_transaction(
+            self,
+            user_id: int,
+            tariff: TariffData,
+            expected: Optional[TransactionData],
+            payment_id: Optional[UUID] = None
+        ) -> tuple[Optional[TransactionData], Optional[TransactionData]]:
+        """
+        Создаёт транзакцию и одновременно занимает индекс (user_id, tariff_id), если в нем
+        все еще лежит expected. Возвращает (созданная транзакция, None) при успехе,
+        иначе (None, текущая транзакция индекса) - ее успел записать конкурирующий запрос,
+        или (None, None), если индекс за это время истек или удален.
+        """
+        data = await self._prepare_data(payment_id or uuid.uuid4(), user_id, tariff.tariff_id, tariff.price)
+        key = self._make_redis_key(TransactionService.compute_payment_hash(data.payment_id))
+
+        claimed, current = await self.redis_repository.claim_transaction(
+            self._make_open_key(user_id, tariff.tariff_id),
+            key,
+            data.model_dump_json(),
+            expected=expected.model_dump_json() if expected else "",
+            expire_seconds=self.ttl_seconds
+        )
+        if claimed:
+            return data, None
+        return None, TransactionData.model_validate_json(current) if current else None
+
+    async def claim_transactions(
+            self, user_ids: list[int], tariff: TariffData, attempts: int = 3
+        ) -> dict[int, tuple[TransactionData, bool]]:
+        """
+        Пакетная версия find_open_transaction + is_pending + claim_transaction: открытый
+        неистекший платеж пользователя по тарифу с той же ценой переиспользуется, иначе
+        индекс занимается новым. Каждый шаг - один MGET или pipeline на всю пачку.
+        Возвращает user_id -> (транзакция, создана ли она сейчас). Пользователи, чей индекс
+        за attempts попыток так и не удалось занять, в результат не попадают.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        index_keys = {user_id: self._make_open_key(user_id, tariff.tariff_id) for user_id in user_ids}
+        raws = await self.redis_repository.get_many_raw(list(index_keys.values()))
+        current = {
+            user_id: TransactionData.model_validate_json(raw) if raw else None
+            for user_id, raw in zip(user_ids, raws)
+        }
+
+        result: dict[int, tuple[TransactionData, bool]] = {}
+        for attempt in range(attempts + 1):
+            await self._reuse_pending(current, tariff, result)
+            if not current or attempt == attempts:
+                break
+
+            claims = {
+                user_id: await self._prepare_data(uuid.uuid4(), user_id, tariff.tariff_id, tariff.price)
+                for user_id in current
+            }
+            outcomes = await self.redis_repository.claim_transactions(
+                [
+                    (
+                        index_keys[user_id],
+                        self._make_redis_key(TransactionService.compute_payment_hash(data.payment_id)),
+                        data.model_dump_json(),
+                        current[user_id].model_dump_json() if current[user_id] else "",
+                    )
+                    for user_id, data in claims.items()
+                ],
+                expire_seconds=self.ttl_seconds
+            )
+            # Проигравшие гонку получают то, что записал конкурент, и проверяются заново
+            current = {}
+            for (user_id, data), (claimed, raw) in zip(claims.items(), outcomes):
+                if claimed:
+                    result[user_id] = (data, True)
+                else:
+                    current[user_id] = TransactionData.model_validate_json(raw) if raw else None
+        return result
+
+    async def _reuse_pending(
+            self,
+            current: dict[int, Optional[TransactionData]],
+            tariff: TariffData,
+            result: dict[int, tuple[TransactionData, bool]]
+        ):
+        """Переносит из current в result платежи, которые еще ждут оплаты по текущей цене."""
+        candidates = [
+            user_id for user_id, data in current.items() if data is not None and data.amount == tariff.price
+        ]
+        if not candidates:
+            return
+        pending = await self.redis_repository.exists_many([
+            self._make_redis_key(TransactionService.compute_payment_hash(current[user_id].payment_id))
+            for user_id in candidates
+        ])
+        for user_id, is_pending in zip(candidates, pending):
+            if is_pending:
+                result[user_id] = (current.pop(user_id), False)
+
+    async def is_pending(self, data: TransactionData) -> bool:
+        """Транзакция еще ждет оплаты: не оплачена и не истекла."""
+        return await self.is_payment_pending(data.payment_id)
+
+    async def is_payment_pending(self, payment_id: UUID) -> bool:
+        key = self._make_redis_key(TransactionService.compute_payment_hash(payment_id))
+        return await self.redis_repository.exists(key)
+
+    async def pending_payments(self, payment_ids: list[UUID]) -> set[UUID]:
+        """Какие из платежей еще ждут оплаты - одним запросом на всю пачку."""
+        pending = await self.redis_repository.exists_many([
+            self._make_redis_key(TransactionService.compute_payment_hash(payment_id)) for payment_id in payment_ids
+        ])
+        return {payment_id for payment_id, is_pending in zip(payment_ids, pending) if is_pending}
+
+    async def find_idempotent(self, user_id: int, idempotency_key: str) -> Optional[TransactionData]:
+        raw = await self.redis_repository.get_raw(self._make_idempotency_key(user_id, idempotency_key))
+        return TransactionData.model_validate_json(raw) if raw else None
+
+    async def remember_idempotent(
+            self,
+            user_id: int,
+            idempotency_key: str,
+            data: TransactionData,
+            replaces: Optional[TransactionData] = None
+        ) -> TransactionData:
+        """
+        Связывает Idempotency-Key с транзакцией ровно на то время, пока она ждет оплаты.
+        replaces - уже не ожидающая оплаты транзакция, с которой ключ был связан раньше.
+        Если ключ успел занять параллельный запрос - возвращает его транзакцию.
+        """
+        raw = await self.redis_repository.remember_for_transaction(
+            self._make_idempotency_key(user_id, idempotency_key),
+            self._make_redis_key(TransactionService.compute_payment_hash(data.payment_id)),
+            data.model_dump_json(),
+            expected=replaces.model_dump_json() if replaces else ""
+        )
+        return TransactionData.model_validate_json(raw) if raw else data
+
+    async def pending_payment_hashes(self, limit: int) -> Optional[list[str]]:
+        """paymentId неоплаченных неистекших платежей, None - их больше limit."""
+        keys = await self.redis_repository.pending_keys(limit)
+        if keys is None:
+            return None
+        prefix = self._make_redis_key("")
+        return [key[len(prefix):] for key in keys]
+
+    async def migrate_transaction(self, payment_hash: str) -> Optional[TransactionData]:
+        """
+        Переносит оплаченную транзакцию из Redis в Postgres и отмечает платеж оплаченным.
+        payment_hash - paymentId из события контракта. None - платеж не наш или уже обработан.
+        """
+        migrated = await self.migrate_transactions([payment_hash])
+        return migrated[0] if migrated else None
+
+    async def migrate_transactions(self, payment_hashes: list[str]) -> list[TransactionData]:
+        """
+        Пакетный перенос: один MGET в Redis, один многострочный INSERT в Postgres,
+        одно удаление (транзакции и кеш QR) и пайплайны для статусов и уведомлений - на всю пачку.
+        Возвращает перенесенные транзакции; чужие и уже обработанные платежи пропускаются.
+        """
+        keys = [self._make_redis_key(payment_hash) for payment_hash in dict.fromkeys(payment_hashes)]
+        found = await self.redis_repository.find_transactions(keys)
+        pending = [(key, TransactionData(**data)) for key, data in zip(keys, found) if data is not None]
+        if not pending:
+            return []
+
+        txs = [tx for _, tx in pending]
+        # Повтор после сбоя между INSERT и удалением из Redis не упадет на дубликате
+        await self.tariffs_pg.create_many([tx.model_dump() for tx in txs])
+        payment_ids = [tx.payment_id for tx in txs]
+        # Вместе с транзакцией удаляется и кеш ее QR-кода: оплаченный платеж его больше не отдает
+        await self.redis_repository.delete_transactions(
+            [key for key, _ in pending],
+            related_keys=[QRCacheRepository.KEY_TEMPLATE.format(payment_id=payment_id) for payment_id in payment_ids]
+        )
+        await self.payment_status_redis.mark_settled(payment_ids, expire_seconds=self.settled_ttl_seconds)
+        # Статус уже в Redis - только теперь будим ждущих клиентов
+        await self.pubsub.publish_many(self.SETTLED_CHANNEL, [str(payment_id) for payment_id in payment_ids])
+        return txs
     
-    async def _delete_transaction_redis(self, payment_hash):
-        key = self._make_redis_key(payment_hash)
-        return await self.redis_repository.delete_transaction(key)
-        
     async def _prepare_data(self, payment_id: UUID, user_id: str, tariff_id: UUID, tariff_price: int):
         return TransactionData(
         payment_id=payment_id,
@@ -91,8 +323,15 @@ class TransactionService:
     def _make_redis_key(cls, payment_hash: str) -> str:
         return cls.REDIS_KEY_TEMPLATE.format(payment_hash=payment_hash)
     
+    @classmethod
+    def _make_open_key(cls, user_id: int, tariff_id: UUID) -> str:
+        return cls.OPEN_KEY_TEMPLATE.format(user_id=user_id, tariff_id=tariff_id)
+    
+    @classmethod
+    def _make_idempotency_key(cls, user_id: int, idempotency_key: str) -> str:
+        return cls.IDEMPOTENCY_KEY_TEMPLATE.format(user_id=user_id, idempotency_key=idempotency_key)
+    
     @staticmethod
-    def compute_payment_hash(payment_id: str, tariff_id: str) -> str:
-        data = f"{payment_id}{tariff_id}"
-        return hashlib.sha256(data.encode()).hexdigest()
-    
\ No newline at end of file
+    def compute_payment_hash(payment_id: UUID) -> str:
+        """paymentId платежа в контракте: по нему поллер находит транзакцию из события."""
+        return PayForTariffEncoder.payment_hash(payment_id).hex()
@@ -0,0 +1,95 @@
+""" Координация нескольких экземпляров поллера через Redis """
+import logging
+import os
+import socket
+from typing import Optional
+import uuid
+
+from app.infrastructure.db.redis.repositories import PollerCoordinationRepository
+
+logger = logging.getLogger(__name__)
+
+
+class PollerCoordinator:
+    """
+    Один экземпляр держит аренду лидерства: слушает новые блоки и ведет контрольную точку.
+    Каждый новый захват аренды получает растущий fencing-токен, и запись контрольной точки
+    с устаревшим токеном отклоняется - отставший бывший лидер ничего не испортит.
+    Догоняющий обход лидер нарезает на диапазоны по range_blocks блоков, а разбирают их
+    все экземпляры, включая лидера. Брошенный упавшим экземпляром диапазон
+    снова становится доступен, когда истекает его захват.
+    """
+    def __init__(
+            self,
+            coordination_repo: PollerCoordinationRepository,
+            lease_ttl_seconds: float = 10.0,
+            range_blocks: int = 5000,
+            claim_ttl_seconds: float = 60.0
+        ):
+        self.coordination_repo = coordination_repo
+        self.lease_ttl = lease_ttl_seconds
+        self.range_blocks = max(1, range_blocks)
+        self.claim_ttl = claim_ttl_seconds
+
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.token: Optional[int] = None
+
+    async def acquire(self) -> Optional[int]:
+        """Захватывает или продлевает аренду. Возвращает fencing-токен, None - лидер другой."""
+        self.token = await self.coordination_repo.acquire_leader(self.instance_id, self._ms(self.lease_ttl))
+        return self.token
+
+    async def renew(self) -> bool:
+        if self.token is None:
+            return False
+        try:
+            return await self.coordination_repo.renew_leader(self.instance_id, self.token, self._ms(self.lease_ttl))
+        except Exception as e:
+            # Не можем подтвердить аренду - считаем ее потерянной, пока она не истекла у других
+            logger.error(f"Failed to renew poller lease: {e}")
+            return False
+
+    async def release(self):
+        if self.token is None:
+            return
+        try:
+            await self.coordination_repo.release_leader(self.instance_id, self.token)
+        except Exception as e:
+            logger.error(f"Failed to release poller lease: {e}")
+        self.token = None
+
+    async def plan(self, from_block: int, to_block: int):
+        ranges = [
+            (start, min(start + self.range_blocks - 1, to_block))
+            for start in range(from_block, to_block + 1, self.range_blocks)
+        ]
+        await self.coordination_repo.plan_ranges(ranges)
+        if ranges:
+            logger.info(f"Planned {len(ranges)} catch-up ranges for blocks {from_block}-{to_block}")
+
+    async def claim(self) -> Optional[tuple[int, int]]:
+        return await self.coordination_repo.claim_range(self._ms(self.claim_ttl))
+
+    async def extend(self, block_range: tuple[int, int]) -> bool:
+        return await self.coordination_repo.extend_range(block_range, self._ms(self.claim_ttl))
+
+    async def complete(self, block_range: tuple[int, int]) -> bool:
+        return await self.coordination_repo.complete_range(block_range)
+
+    async def advance_frontier(self, frontier: int) -> int:
+        """
+        Сдвигает границу догоняющего обхода по завершенным диапазонам, идущим подряд
+        сразу за ней. Учтенные диапазоны удаляются из Redis.
+        """
+        consumed = []
+        for start, end in sorted(await self.coordination_repo.get_done_ranges()):
+            if start > frontier + 1:
+                break
+            consumed.append((start, end))
+            frontier = max(frontier, end)
+        await self.coordination_repo.forget_done_ranges(consumed)
+        return frontier
+
+    @staticmethod
+    def _ms(seconds: float) -> int:
+        return int(seconds * 1000)
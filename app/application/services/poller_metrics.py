@@ -0,0 +1,69 @@
+""" Метрики поллера: задержки подтверждения, реорганизации, отставание """
+from collections import deque
+import logging
+import time
+from typing import Any, Optional
+
+from app.infrastructure.db.redis.repositories import PollerMetricsRepository
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """Скользящее окно последних наблюдений с перцентилями."""
+    def __init__(self, size: int = 1000):
+        self._values: deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, value: float):
+        self._values.append(value)
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        if not self._values:
+            return {"count": self.count}
+        values = sorted(self._values)
+        return {
+            "count": self.count,
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+
+
+class PollerMetrics:
+    """
+    Метрики живут в памяти процесса поллера. Раз в интервал снимок пишется в Redis,
+    откуда его отдает API, и в лог.
+    """
+    def __init__(self, metrics_repo: PollerMetricsRepository):
+        self.metrics_repo = metrics_repo
+
+        # От времени блока с платежом до его выхода из буфера подтверждений, сек
+        self.time_to_finality = LatencyWindow()
+        self.reorgs = 0
+        self.reorged_events = 0
+        self.payments_settled = 0
+        self.gauges: dict[str, Any] = {}
+
+    def set_gauge(self, name: str, value: Any):
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        return {
+            "time_to_finality_seconds": self.time_to_finality.snapshot(),
+            "reorgs": self.reorgs,
+            "reorged_events": self.reorged_events,
+            "payments_settled": self.payments_settled,
+            **self.gauges,
+            "reported_at": time.time(),
+        }
+
+    async def publish(self, expire_seconds: int):
+        snapshot = self.snapshot()
+        await self.metrics_repo.set(snapshot, expire_seconds=expire_seconds)
+        logger.info(f"Poller metrics: {snapshot}")
+
+    async def load(self) -> Optional[dict]:
+        """Последний снимок, опубликованный поллером. None - поллер давно не отчитывался."""
+        return await self.metrics_repo.get()
@@ -0,0 +1,87 @@
+""" Кодирование матрицы QR-кода напрямую в PNG/SVG, без PIL """
+import struct
+import zlib
+from typing import Literal
+
+import qrcode
+
+QRFormat = Literal["png", "svg"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def build_matrix(data: str, border: int = 2) -> list[list[bool]]:
+    """Строит матрицу модулей QR-кода вместе с рамкой. True - темный модуль."""
+    qr = qrcode.QRCode(version=None, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _png_chunk(tag: bytes, payload: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(payload))
+        + tag
+        + payload
+        + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF)
+    )
+
+
+def matrix_to_png(matrix: list[list[bool]], box_size: int = 6) -> bytes:
+    """
+    Кодирует матрицу в 1-битный grayscale PNG.
+    Каждая строка пикселей упаковывается в байты целиком (бит 0 - черный, 1 - белый),
+    одинаковые строки модуля повторяются box_size раз, затем все сжимается zlib.
+    """
+    size = len(matrix) * box_size
+    pad = -size % 8
+    expand = str.maketrans({"0": "0" * box_size, "1": "1" * box_size})
+
+    rows = []
+    for modules in matrix:
+        bits = "".join("0" if dark else "1" for dark in modules).translate(expand) + "1" * pad
+        # Байт 0 в начале строки - PNG-фильтр None
+        row = b"\x00" + int(bits, 2).to_bytes((size + pad) // 8, "big")
+        rows.append(row * box_size)
+
+    header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)
+    return b"".join((
+        _PNG_SIGNATURE,
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"IDAT", zlib.compress(b"".join(rows), 9)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def matrix_to_svg(matrix: list[list[bool]], box_size: int = 6) -> str:
+    """
+    Кодирует матрицу в SVG с одним path: каждая горизонтальная серия
+    темных модулей - отдельный прямоугольник в координатах модулей.
+    """
+    count = len(matrix)
+    parts = []
+    for y, modules in enumerate(matrix):
+        x = 0
+        while x < count:
+            if not modules[x]:
+                x += 1
+                continue
+            start = x
+            while x < count and modules[x]:
+                x += 1
+            parts.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+
+    size = count * box_size
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {count} {count}" shape-rendering="crispEdges">'
+        f'<rect width="{count}" height="{count}" fill="#fff"/>'
+        f'<path d="{"".join(parts)}" fill="#000"/>'
+        "</svg>"
+    )
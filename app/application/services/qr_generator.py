@@ -1,28 +1,45 @@
-from io import BytesIO
+import asyncio
+import base64
+import hashlib
 import logging
 import urllib.parse
-
-import qrcode
+from typing import Optional
+from uuid import UUID
 
 from app.application.services.payment_processor import TransactionService
+from app.application.services.qr_encoder import QRFormat
+from app.application.services.qr_renderer import QRRenderExecutor, render_qr
+from app.application.services.short_links import ShortLinkService
 from app.config import Settings
-from app.application.models import ContractData, TransactionData
+from app.application.models import CachedQRCode, ContractData, TransactionData
 from app.infrastructure.blockchain import AsyncWeb3Service
+from app.infrastructure.db.redis.repositories import QRCacheRepository
 
 logger = logging.getLogger(__name__)
 
 class QRCodeService:
-    def __init__(self, settings: Settings, transaction_service: TransactionService, blockchain_helper: AsyncWeb3Service):
+    def __init__(
+            self,
+            settings: Settings,
+            transaction_service: TransactionService,
+            blockchain_helper: AsyncWeb3Service,
+            render_executor: QRRenderExecutor,
+            short_links: ShortLinkService,
+            qr_cache: QRCacheRepository
+        ):
         self._settings = settings
         self.transaction_service = transaction_service
         self.blockchain_helper = blockchain_helper
+        self.render_executor = render_executor
+        self.short_links = short_links
+        self.qr_cache = qr_cache
         
     def build_qr_payload(self, data: TransactionData) -> str:
         """Генерирует calldata и собирает данные для QR-кода."""
-        paymentId=data.payment_id  
-        tariffId=data.tariff_id
-        price=data.amount
-        
+        return self.build_payment_url(data.payment_id, data.tariff_id, data.amount)
+    
+    def build_payment_url(self, paymentId: UUID, tariffId: UUID, price: int) -> str:
+        """Генерирует calldata и ссылку на оплату, не привязанную к пользователю."""
         contract_data = ContractData(
             paymentId=paymentId, 
             tariffId=tariffId,
@@ -32,20 +49,89 @@ class QRCodeService:
         calldata = self.blockchain_helper.build_calldata(data=contract_data)
         return self._build_url(self._settings.contract_address, self._settings.chain_id, price, calldata)
     
-    def generate_qr_code_image(self, url: str) -> BytesIO:
+    def build_payment_urls(self, payment_ids: list[UUID], tariffId: UUID, price: int) -> list[str]:
+        """Пакетная версия build_payment_url для платежей одного тарифа."""
+        calldata = self.blockchain_helper.build_calldata_many([
+            ContractData(paymentId=paymentId, tariffId=tariffId, price=price) for paymentId in payment_ids
+        ])
+        return [
+            self._build_url(self._settings.contract_address, self._settings.chain_id, price, item)
+            for item in calldata
+        ]
+    
+    def qr_content(self, payment_id: UUID, payment_url: str) -> str:
+        """Строка, которая кодируется в QR: короткая ссылка или сама ссылка на оплату."""
+        if self._settings.qr_short_links:
+            return self.short_links.short_url(payment_id)
+        return payment_url
+    
+    async def publish_payment_url(self, payment_id: UUID, payment_url: str, qr_content: str):
+        """Регистрирует короткую ссылку, если QR-код был собран с ней."""
+        if qr_content != payment_url:
+            await self.short_links.register(payment_id, payment_url, expire_seconds=self._settings.payment_ttl_seconds)
+    
+    async def generate_qr_code_image(self, url: str, image_format: QRFormat = "png", background: bool = False) -> bytes:
+        """
+        Генерирует QR-код (PNG или SVG) по заданной строке, возвращает байты изображения.
+        Рендеринг выполняется в пуле процессов, event loop не блокируется.
+        background - дождаться места в очереди рендеринга вместо ответа 503.
         """
-        Генерирует PNG QR-код по заданной строке, возвращает BytesIO-объект.
+        return await self.render_executor.render(render_qr, url, image_format, wait_for_slot=background)
+    
+    async def publish_payment_urls(self, urls: dict[UUID, str], contents: dict[UUID, str]):
+        """Пакетная версия publish_payment_url."""
+        short = {payment_id: url for payment_id, url in urls.items() if contents[payment_id] != url}
+        if short:
+            await self.short_links.register_many(short, expire_seconds=self._settings.payment_ttl_seconds)
+    
+    async def cache_contents(self, contents: dict[UUID, str]):
         """
-        qr = qrcode.QRCode(version=1, box_size=6, border=2)
-        qr.add_data(url)
-        qr.make(fit=True)
+        Кладет в кеш только содержимое QR-кодов: изображения отрендерятся
+        при первом запросе GET /payments/{payment_id}/qr.
+        """
+        await self.qr_cache.create_many(contents, expire_seconds=self._settings.payment_ttl_seconds)
+    
+    async def cache_image(self, payment_id: UUID, qr_content: str, image: bytes, image_format: QRFormat) -> str:
+        """Кладет QR-код платежа в кеш на время жизни платежа, возвращает ETag."""
+        etag = self.make_etag(image)
+        await self.qr_cache.create(
+            payment_id,
+            content=qr_content,
+            image_format=image_format,
+            image=base64.b64encode(image).decode(),
+            etag=etag,
+            expire_seconds=self._settings.payment_ttl_seconds
+        )
+        return etag
+    
+    async def get_cached_image(self, payment_id: UUID, image_format: QRFormat) -> Optional[CachedQRCode]:
+        """
+        Отдает QR-код платежа из кеша. Если платеж жив, но нужного формата еще нет -
+        рендерит его один раз и дописывает в кеш. None - платеж оплачен или истек.
+        Кеш сверяется с самой транзакцией: запись, созданная повторной выдачей платежа,
+        живет полный TTL и может пережить истекший платеж.
+        """
+        entry, pending = await asyncio.gather(
+            self.qr_cache.find(payment_id, image_format),
+            self.transaction_service.is_payment_pending(payment_id),
+        )
+        if entry is None or not pending:
+            return None
 
-        img = qr.make_image(fill_color="black", back_color="white")
+        if entry["image"] is not None:
+            image = base64.b64decode(entry["image"])
+            etag = entry["etag"]
+        else:
+            image = await self.generate_qr_code_image(entry["content"], image_format)
+            etag = self.make_etag(image)
+            await self.qr_cache.add_image(payment_id, image_format, base64.b64encode(image).decode(), etag)
 
-        bio = BytesIO()
-        img.save(bio, "PNG")
-        bio.seek(0)
-        return bio
+        return CachedQRCode(image=image, image_format=image_format, etag=etag, ttl=max(entry["ttl"], 0))
+    
+    @staticmethod
+    def make_etag(image: bytes) -> str:
+        """Сильный ETag по содержимому изображения."""
+        return f'"{hashlib.sha256(image).hexdigest()[:32]}"'
     
     def _build_url(self, address, chain_id, value_wei, calldata) -> str:
         """
@@ -0,0 +1,108 @@
+""" Рендеринг QR-кодов в пуле процессов, вне event loop """
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+from typing import Callable
+
+from fastapi import HTTPException
+
+from app.application.services.qr_encoder import QRFormat, build_matrix, matrix_to_png, matrix_to_svg
+
+logger = logging.getLogger(__name__)
+
+
+def render_qr(data: str, image_format: QRFormat = "png", box_size: int = 6, border: int = 2) -> bytes:
+    """Рендерит QR-код в PNG или SVG. Выполняется в дочернем процессе пула."""
+    matrix = build_matrix(data, border=border)
+    if image_format == "svg":
+        return matrix_to_svg(matrix, box_size=box_size).encode()
+    return matrix_to_png(matrix, box_size=box_size)
+
+
+def _warm_up() -> int:
+    """Пустая задача для прогрева процессов пула."""
+    return os.getpid()
+
+
+class QRRenderExecutor:
+    """
+    Пул процессов для рендеринга QR-кодов с ограниченной очередью.
+    Если в работе и в очереди уже max_pending задач - новый рендер отклоняется с 503.
+    """
+    def __init__(self, workers: int | None = None, queue_size: int = 64, timeout: float = 5.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers + queue_size
+        self.timeout = timeout
+
+        self._pending = 0
+        self._slot_freed = asyncio.Event()
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def start(self):
+        """Создает пул и прогревает процессы, чтобы первые запросы не ждали spawn."""
+        if self._pool:
+            return  # уже запущен
+
+        # spawn, а не fork: форк процесса с работающим event loop и потоками небезопасен
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _warm_up) for _ in range(self.workers)
+        ))
+        logger.info(f"QR render pool started with {self.workers} workers")
+
+    async def close(self):
+        """Останавливает пул, отменяя задачи из очереди."""
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def render(self, func: Callable[..., bytes], *args, wait_for_slot: bool = False) -> bytes:
+        """
+        Выполняет функцию рендеринга в пуле с ограничением очереди и таймаутом.
+        wait_for_slot - для фоновых и пакетных задач: ждать свободного места вместо 503.
+        """
+        if self._pool is None:
+            await self.start()
+
+        while wait_for_slot and self._pending >= self.max_pending:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Очередь генерации QR-кодов переполнена, повторите запрос позже",
+                headers={"Retry-After": "1"},
+            )
+
+        # Слот освобождается, когда задача реально завершилась в процессе,
+        # а не когда истек таймаут ожидания, иначе пул можно переполнить
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        future: Future = self._pool.submit(func, *args)
+        # колбэк вызывается из служебного потока пула - счетчик меняем в потоке loop
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"QR render timed out after {self.timeout}s")
+            raise HTTPException(
+                status_code=503,
+                detail="Генерация QR-кода не уложилась в отведенное время",
+                headers={"Retry-After": "1"},
+            )
+
+    def _release(self):
+        self._pending -= 1
+        self._slot_freed.set()
@@ -0,0 +1,44 @@
+""" Короткие ссылки на оплату для компактных QR-кодов """
+import base64
+import logging
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.infrastructure.db.redis.repositories import ShortLinksRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ShortLinkService:
+    """
+    Вместо длинной ссылки MetaMask с calldata в QR-код кладется https://<host>/p/<code>,
+    а сама ссылка хранится в Redis и отдается редиректом.
+    Код выводится из payment_id, поэтому его можно посчитать заранее, до записи в Redis.
+    """
+    def __init__(self, short_links_repo: ShortLinksRepository, base_url: str):
+        self.short_links_repo = short_links_repo
+        self.base_url = base_url.rstrip("/")
+
+    @staticmethod
+    def make_code(payment_id: UUID) -> str:
+        # 9 байт UUID4 -> 12 символов base64url без паддинга
+        return base64.urlsafe_b64encode(payment_id.bytes[:9]).decode()
+
+    def short_url(self, payment_id: UUID) -> str:
+        return f"{self.base_url}/p/{self.make_code(payment_id)}"
+
+    async def register(self, payment_id: UUID, url: str, expire_seconds: int):
+        await self.short_links_repo.create(self.make_code(payment_id), url, expire_seconds=expire_seconds)
+
+    async def register_many(self, urls: dict[UUID, str], expire_seconds: int):
+        await self.short_links_repo.create_many(
+            {self.make_code(payment_id): url for payment_id, url in urls.items()},
+            expire_seconds=expire_seconds
+        )
+
+    async def resolve(self, code: str) -> str:
+        url = await self.short_links_repo.find(code)
+        if url is None:
+            raise HTTPException(status_code=404, detail="Ссылка на оплату не найдена или истекла")
+        return url
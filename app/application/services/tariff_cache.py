@@ -0,0 +1,58 @@
+""" Локальный кеш тарифов воркера """
+from collections import OrderedDict
+import time
+from typing import Optional
+from uuid import UUID
+
+from app.application.models import TariffData
+
+
+class TariffCache:
+    """
+    Read-through кеш тарифов в памяти воркера с TTL и ограничением размера (LRU).
+    Индексирован по имени и по tariff_id. Сбрасывается целиком при любом изменении
+    тарифов на любом воркере (через Redis pub/sub), TTL страхует от потерянных сообщений.
+    """
+    def __init__(self, ttl_seconds: float = 60.0, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+
+        self._by_name: OrderedDict[str, tuple[float, TariffData]] = OrderedDict()
+        self._names_by_id: dict[UUID, str] = {}
+        # Растет при каждом сбросе: чтение из БД, начатое до сброса, не попадет в кеш
+        self.generation = 0
+
+    def get_by_name(self, name: str) -> Optional[TariffData]:
+        entry = self._by_name.get(name)
+        if entry is None:
+            return None
+        expires_at, tariff = entry
+        if expires_at < time.monotonic():
+            self._evict(name)
+            return None
+        self._by_name.move_to_end(name)
+        return tariff
+
+    def get_by_id(self, tariff_id: UUID) -> Optional[TariffData]:
+        name = self._names_by_id.get(tariff_id)
+        return self.get_by_name(name) if name is not None else None
+
+    def put(self, tariff: TariffData, generation: int):
+        """Кладет тариф, прочитанный из БД при данном поколении кеша."""
+        if generation != self.generation:
+            return  # пока читали, тарифы изменились
+        self._evict(tariff.name)
+        self._by_name[tariff.name] = (time.monotonic() + self.ttl_seconds, tariff)
+        self._names_by_id[tariff.tariff_id] = tariff.name
+        while len(self._by_name) > self.max_size:
+            self._evict(next(iter(self._by_name)))
+
+    def clear(self):
+        self.generation += 1
+        self._by_name.clear()
+        self._names_by_id.clear()
+
+    def _evict(self, name: str):
+        entry = self._by_name.pop(name, None)
+        if entry is not None:
+            self._names_by_id.pop(entry[1].tariff_id, None)
@@ -1,31 +1,108 @@
 import logging
+import time
+from typing import Optional
+from uuid import UUID
 
 from fastapi import HTTPException
+from pydantic import TypeAdapter
 
 from app.application.models import PatchTariffModel, TariffActivateQuery, TariffCreate, TariffData
+from app.application.services.tariff_cache import TariffCache
 from app.infrastructure.db.postgres.repositories.tariffs import TariffsRepository
+from app.infrastructure.db.redis.pubsub import RedisPubSub
+from app.infrastructure.db.redis.repositories import IntentPoolRepository, TariffsVersionRepository
 
 logger = logging.getLogger(__name__)
 
+_catalogue_adapter = TypeAdapter(list[TariffData])
+
 
 class TariffsService:
     """Сервис для работы с тарифами."""
-    def __init__(self, tariffs_repo: TariffsRepository):
+    INVALIDATION_CHANNEL = "tariffs:invalidate"
+    
+    def __init__(
+            self, 
+            tariffs_repo: TariffsRepository, 
+            intent_pool_repo: IntentPoolRepository, 
+            version_repo: TariffsVersionRepository,
+            cache: TariffCache, 
+            pubsub: RedisPubSub
+        ):
         self.tariffs_repo = tariffs_repo
+        self.intent_pool_repo = intent_pool_repo
+        self.version_repo = version_repo
+        self.cache = cache
+        self.pubsub = pubsub
+        
+        # Версия каталога и готовые JSON-снимки для нее: ключ None - весь каталог, иначе имя тарифа
+        self._version: Optional[int] = None
+        self._version_synced_at = 0.0
+        self._snapshots: dict[Optional[str], bytes] = {}
+        # Сообщения об изменениях с других воркеров (и со своего тоже) сбрасывают кеш
+        self.pubsub.subscribe(self.INVALIDATION_CHANNEL, self._on_invalidation)
         
     # Добавить генерацию UUID по умолчанию
     async def create(self, data: TariffCreate):
         tariff = await self.tariffs_repo.create(data.model_dump())
+        await self._invalidate()
         return tariff 
 
     async def get_all(self):
         return await self.tariffs_repo.get_all()
 
-    async def get_by_name(self, name: str):
+    async def get_by_name(self, name: str) -> TariffData:
+        tariff = self.cache.get_by_name(name)
+        if tariff is not None:
+            return tariff
+        
+        generation = self.cache.generation
         raw_tariff = await self.tariffs_repo.get_by_name(name)
         if not raw_tariff:
             raise HTTPException(status_code=404, detail="Тариф не найден")
         tariff = TariffData.model_validate(raw_tariff)
+        self.cache.put(tariff, generation)
+        return tariff
+
+    async def catalogue_version(self) -> int:
+        """
+        Текущая версия каталога. Новые версии приходят через pub/sub, а раз в TTL кеша
+        версия сверяется с Redis на случай потерянного сообщения.
+        """
+        if self._version is None or time.monotonic() - self._version_synced_at > self.cache.ttl_seconds:
+            self._set_version(await self.version_repo.get())
+            self._version_synced_at = time.monotonic()
+        return self._version
+
+    async def catalogue_snapshot(self, version: int) -> bytes:
+        """JSON всего каталога для данной версии, сериализуется один раз на версию."""
+        snapshot = self._get_snapshot(version, None)
+        if snapshot is None:
+            tariffs = [TariffData.model_validate(tariff) for tariff in await self.get_all()]
+            snapshot = _catalogue_adapter.dump_json(tariffs)
+            self._put_snapshot(version, None, snapshot)
+        return snapshot
+
+    async def tariff_snapshot(self, version: int, name: str) -> bytes:
+        """JSON одного тарифа для данной версии каталога."""
+        snapshot = self._get_snapshot(version, name)
+        if snapshot is None:
+            tariff = await self.get_by_name(name)
+            snapshot = tariff.model_dump_json().encode()
+            self._put_snapshot(version, name, snapshot)
+        return snapshot
+
+    async def get_by_id(self, tariff_id: UUID) -> Optional[TariffData]:
+        tariff = self.cache.get_by_id(tariff_id)
+        if tariff is not None:
+            return tariff
+        
+        generation = self.cache.generation
+        raw_tariff = await self.tariffs_repo.get_by_id(tariff_id)
+        if not raw_tariff:
+            return None
+        tariff = TariffData.model_validate(raw_tariff)
+        self.cache.put(tariff, generation)
         return tariff
 
     async def update(self, name: str, data: PatchTariffModel):
@@ -33,18 +110,66 @@ class TariffsService:
         tariff = await self.tariffs_repo.update(name, update_data)
         if not tariff:
             raise HTTPException(status_code=404, detail="Тариф не найден")
+        if "price" in update_data:
+            # Подготовленные платежи содержат старую цену в calldata
+            await self.intent_pool_repo.clear(tariff.tariff_id)
+        await self._invalidate()
         return tariff
 
     async def set_activate(self, name: str, data: TariffActivateQuery):
-        tariff = await self.tariffs_repo.get_by_name(name)
-        if not tariff:
-            raise HTTPException(status_code=404, detail="Тариф не найден")
-        tariff.is_active = data.is_active
         updated = await self.tariffs_repo.update(name, {"is_active": data.is_active})
+        if not updated:
+            raise HTTPException(status_code=404, detail="Тариф не найден")
+        if not data.is_active:
+            await self.intent_pool_repo.clear(updated.tariff_id)
+        await self._invalidate()
         return updated
 
+    async def bulk_upsert(self, items: list[TariffCreate]):
+        """Синхронизирует каталог: создает новые тарифы и обновляет существующие по имени."""
+        tariffs = await self.tariffs_repo.bulk_upsert([item.model_dump() for item in items])
+        # Какие цены реально изменились, RETURNING не говорит - сбрасываем пулы всех тарифов
+        await self.intent_pool_repo.clear_many([tariff.tariff_id for tariff in tariffs])
+        await self._invalidate()
+        return tariffs
+
     async def delete_by_name(self, name: str):
         deleted_num = await self.tariffs_repo.delete_by_name(name)
         if deleted_num == 0:
             raise HTTPException(status_code=404, detail="Тарифы не найдены")
+        await self._invalidate()
         return deleted_num
+
+    async def _invalidate(self):
+        """
+        Поднимает версию каталога и сбрасывает кеш тарифов на этом воркере сразу,
+        на остальных - через pub/sub с новой версией в сообщении.
+        """
+        version = await self.version_repo.bump()
+        self.cache.clear()
+        self._set_version(version)
+        await self.pubsub.publish(self.INVALIDATION_CHANNEL, str(version))
+
+    async def _on_invalidation(self, message: Optional[str]):
+        self.cache.clear()
+        if message is None or not message.isdigit():
+            # После переподключения версия неизвестна - перечитаем из Redis
+            self._version = None
+            self._snapshots.clear()
+        elif self._version is None or int(message) > self._version:
+            self._set_version(int(message))
+
+    def _set_version(self, version: int):
+        if version != self._version:
+            self._version = version
+            self._snapshots.clear()
+
+    def _get_snapshot(self, version: int, name: Optional[str]) -> Optional[bytes]:
+        if version != self._version:
+            return None
+        return self._snapshots.get(name)
+
+    def _put_snapshot(self, version: int, name: Optional[str], snapshot: bytes):
+        # Снимок, собранный для уже устаревшей версии, не сохраняем
+        if version == self._version and len(self._snapshots) < self.cache.max_size:
+            self._snapshots[name] = snapshot
@@ -28,9 +28,61 @@ class Settings(BaseSettings):
     contract_address: str
     network_http_rpc_url: str
     network_ws_rpc_url: str
+    network_http_rpc_urls: list[str] = []  # Несколько HTTP-провайдеров (JSON-список), пусто - только network_http_rpc_url
+    network_ws_rpc_urls: list[str] = []    # То же для WebSocket: перебираются при переподключении
+    rpc_hedge_quantile: float = 0.9        # eth_getLogs дублируется на второй эндпоинт после этого перцентиля задержки
+    rpc_error_cooldown_seconds: float = 5.0  # Сколько не слать запросы на упавший эндпоинт
     blockchain_confirmations: int 
     chain_id: int
     contract_abi: list = Field(default_factory=load_abi)
+    log_poll_min_interval: float = 1.0      # Опрос get_logs, пока нет подписки: интервал при активности
+    log_poll_max_interval: float = 15.0     # ... и потолок, до которого он растет в простое
+    ws_resubscribe_max_seconds: float = 60.0  # Максимальная пауза между попытками восстановить подписку
+    log_scan_initial_window: int = 2000     # Блоков в одном eth_getLogs при догоняющем обходе
+    log_scan_max_window: int = 10000        # Потолок, до которого растет окно
+    log_scan_concurrency: int = 4           # Окон в работе одновременно
+    log_scan_timeout: float = 20.0          # Таймаут одного eth_getLogs, после него окно делится
+    poller_queue_size: int = 10000          # Событий в очереди поллера, сверх - источники ждут
+    poller_workers: int = 4                 # Параллельных обработчиков платежей в поллере
+    poller_batch_size: int = 100            # Событий в одной пачке переноса в Postgres
+    poller_batch_wait_ms: float = 20.0      # Сколько ждать добора пачки, мс
+    poller_retry_max_seconds: float = 30.0  # Максимальная пауза между повторами переноса упавшей пачки
+    poller_start_block: int | None = None   # С какого блока начать без контрольной точки, None - с текущего
+    checkpoint_flush_interval: float = 5.0  # Как часто сохранять контрольную точку поллера, сек
+    checkpoint_flush_blocks: int = 100      # ... или раньше, если она ушла вперед на столько блоков
+    checkpoint_reorg_rewind_blocks: int = 128  # Насколько откатиться, если блок точки ушел в реорганизацию
+    poller_metrics_interval: float = 10.0   # Как часто поллер публикует метрики в Redis и лог, сек
+    poller_lease_ttl_seconds: float = 10.0  # Аренда лидера поллеров: за это время после падения его заменят
+    poller_range_blocks: int = 5000         # Блоков в одном диапазоне догоняющего обхода
+    poller_range_workers: int = 2           # Диапазонов, которые экземпляр разбирает одновременно
+    poller_range_claim_ttl_seconds: float = 60.0  # Захват диапазона без продления истекает за столько
+    poller_range_poll_interval: float = 1.0 # Как часто проверять очередь диапазонов, если она пуста
+    poller_tariff_filter: bool = True       # Запрашивать у узла только события тарифов из каталога
+    poller_filter_refresh_seconds: float = 10.0  # Как часто перечитывать каталог для фильтра
+    poller_pending_filter: bool = False     # Догоняющий обход - только по paymentId ожидающих платежей
+    poller_pending_filter_max: int = 1000   # Больше ожидающих - фильтр по paymentId не применяется
+    
+    # Payment settings
+    payment_ttl_seconds: int = 3600        # Время жизни неоплаченного платежа в Redis
+    intent_pool_size: int = 20             # Готовых платежей на тариф, 0 - пул отключен
+    intent_pool_low_watermark: int = 5     # При таком остатке пул доливается
+    intent_pool_refill_interval: float = 5.0
+    intent_pool_ttl_seconds: int = 86400
+    settled_payment_ttl_seconds: int = 7 * 24 * 3600   # Сколько помнить оплаченный платеж в Redis
+    payment_check_negative_ttl_seconds: float = 2.0    # Негативный кеш /payments/{id}/check
+    payment_events_keepalive_seconds: float = 15.0     # Keepalive для SSE/WebSocket ожидания оплаты
+    qr_short_links: bool = False           # Кодировать в QR короткую ссылку вместо ссылки MetaMask
+    public_base_url: str = "http://localhost:8000"
+    
+    # Tariff cache settings
+    tariff_cache_ttl_seconds: float = 60.0
+    tariff_cache_max_size: int = 1024
+    tariffs_http_max_age: int = 5           # Cache-Control max-age для каталога тарифов
+    
+    # QR render settings
+    qr_render_workers: int | None = None  # None - по числу ядер
+    qr_render_queue_size: int = 64        # Сколько рендеров может ждать свободный процесс
+    qr_render_timeout: float = 5.0        # Секунды на один рендер
     
     # Logging settings
     debug: bool = False
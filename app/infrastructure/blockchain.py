@@ -1,12 +1,18 @@
 import asyncio
+from functools import partial
 import logging
-from typing import Any, Callable, Dict, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 import uuid
-from web3 import AsyncWeb3, Web3
+from web3 import AsyncWeb3
 from web3.contract import AsyncContract
-from web3.providers import AsyncHTTPProvider, WebSocketProvider
+from web3.exceptions import BlockNotFound
+from web3.providers import WebSocketProvider
 
 from app.config import Settings
+from app.infrastructure.calldata import PayForTariffEncoder
+from app.infrastructure.log_scanner import LogRangeScanner
+from app.infrastructure.payment_log import PaymentEvent, PaymentLogDecoder
+from app.infrastructure.rpc_pool import RpcPool
 from app.infrastructure.models import ContractData
 
 logger = logging.getLogger(__name__)
@@ -17,14 +23,22 @@ class AsyncWeb3Service:
         self.contract_address = AsyncWeb3.to_checksum_address(self.settings.contract_address)
         self.confirmation = self.settings.blockchain_confirmations
         
-        self.w3_http = AsyncWeb3(AsyncHTTPProvider(self.settings.network_http_rpc_url))
+        # HTTP-вызовы идут через пул эндпоинтов, выбирающий самый быстрый здоровый
+        self.rpc_pool = RpcPool.from_urls(
+            self.settings.network_http_rpc_urls or [self.settings.network_http_rpc_url],
+            hedge_quantile=self.settings.rpc_hedge_quantile,
+            cooldown=self.settings.rpc_error_cooldown_seconds,
+        )
+        self.w3_http = self.rpc_pool.primary
         self.eth_http = self.w3_http.eth
 
-        self.w3_ws = AsyncWeb3(WebSocketProvider(self.settings.network_ws_rpc_url))
+        # WebSocket-эндпоинты перебираются по кругу при переподключении
+        self.ws_urls = self.settings.network_ws_rpc_urls or [self.settings.network_ws_rpc_url]
+        self._ws_index = 0
+        self.w3_ws = AsyncWeb3(WebSocketProvider(self.ws_urls[0]))
         self.eth_ws = self.w3_ws.eth
 
         # Автодополнение нулями неправильных bytes переменных
-        self.w3_http.strict_bytes_type_checking = False
         self.w3_ws.strict_bytes_type_checking = False
 
         self.abi = self.settings.contract_abi
@@ -34,86 +48,313 @@ class AsyncWeb3Service:
         )
         self.contract_http: AsyncContract = self.w3_http.eth.contract(
             address=self.contract_address, abi=self.abi
-        )        
+        )
+        self.calldata_encoder = PayForTariffEncoder.from_abi(self.abi)
+
+        self.payment_decoder = PaymentLogDecoder.from_abi(self.abi)
+        self.payment_topic = self.payment_decoder.topic_hex
+        # Фильтр по хешам тарифов (topics[2]), None - все события контракта
+        self._tariff_topics: Optional[List[str]] = None
+        self._filter_version = 0
+        self._subscribed_version: Optional[int] = None
+        self._listen_block = 0
+        # Заголовок, до родителя которого логи уже отданы, а свои придут по подписке; None - цепочка прервалась
+        self._last_head: Optional[Dict[str, Any]] = None
+        self._on_progress: Optional[Callable[[int], Awaitable[Any]]] = None
+        self._on_head: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+
+        self.log_scanner = LogRangeScanner(
+            fetch=self.get_payment_logs,
+            initial_window=self.settings.log_scan_initial_window,
+            max_window=self.settings.log_scan_max_window,
+            concurrency=self.settings.log_scan_concurrency,
+            timeout=self.settings.log_scan_timeout,
+        )
+
+    def set_tariff_filter(self, tariff_hashes: Optional[Iterable[bytes]]) -> bool:
+        """
+        Запрашивать у узла только события этих тарифов. None или пустой набор - без фильтра.
+        Возвращает True, если фильтр изменился: подписка переподпишется на следующем сообщении.
+        """
+        topics = sorted("0x" + tariff_hash.hex() for tariff_hash in tariff_hashes or ()) or None
+        if topics == self._tariff_topics:
+            return False
+        self._tariff_topics = topics
+        self._filter_version += 1
+        return True
+
+    @property
+    def filter_applied(self) -> bool:
+        """Подписка уже идет с текущим фильтром (или ее нет и get_logs сразу берет новый)."""
+        return self._subscribed_version is None or self._subscribed_version >= self._filter_version
 
-    async def get_pending_payments(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
-        """Догоняющий обход через HTTP для старых блоков"""
+    def _payment_topics(self, payment_hashes: Optional[List[str]] = None) -> list:
+        """topics для PaymentReceived: [topic0, paymentId или любой, хеш тарифа или любой]."""
+        topics: list = [self.payment_topic, None, self._tariff_topics]
+        if payment_hashes is not None:
+            topics[1] = ["0x" + payment_hash for payment_hash in payment_hashes]
+        while topics[-1] is None:
+            topics.pop()
+        return topics
+
+    async def scan_payment_logs(
+            self, from_block: int, to_block: int, payment_hashes: Optional[List[str]] = None
+        ) -> AsyncIterator[Tuple[int, List[PaymentEvent]]]:
+        """
+        Догоняющий обход через HTTP для старых блоков: диапазон идет окнами параллельно,
+        события отдаются пачками в порядке блоков вместе с последним блоком окна.
+        payment_hashes - запрашивать только эти paymentId. Пустой список - запрашивать нечего.
+        Недоступный диапазон - LogScanError, а не пустой список.
+        """
         logger.info(f"Fetching events from blocks {from_block} to {to_block} via HTTP")
-        try:
-            events = await self.contract_http.events.PaymentReceived.get_logs(
-                from_block=from_block, to_block=to_block
-            )
-            parsed = []
-            for e in events:
-                args = e["args"]
-                parsed.append({
-                    "payment_id": args["paymentId"].hex(),
-                    "from_address": args["from"],
-                    "amount_wei": args["amount"],
-                    "amount_eth": Web3.from_wei(args["amount"], "ether"),  # <- исправлено
-                    "timestamp": args["timestamp"],
-                    "block_number": e["blockNumber"],
-                    "tx_hash": e["transactionHash"].hex()
-                })
-            logger.info(f"Found {len(parsed)} payments in historical blocks")
-            return parsed
-        except Exception as e:
-            logger.error(f"Error fetching historical events: {e}")
-            return []
+        if payment_hashes is not None and not payment_hashes:
+            yield to_block, []
+            return
+        fetch = partial(self.get_payment_logs, payment_hashes=payment_hashes) if payment_hashes else None
+        found = 0
+        async for _, window_end, events in self.log_scanner.scan(from_block, to_block, fetch=fetch):
+            found += len(events)
+            yield window_end, events
+        logger.info(f"Found {found} payments in historical blocks {from_block}-{to_block}")
+
+    async def get_payment_logs(
+            self, from_block: int, to_block: int, payment_hashes: Optional[List[str]] = None
+        ) -> List[PaymentEvent]:
+        """События PaymentReceived в диапазоне блоков одним eth_getLogs через HTTP."""
+        params = {
+            "address": self.contract_address,
+            "topics": self._payment_topics(payment_hashes),
+            "fromBlock": from_block,
+            "toBlock": to_block,
+        }
+        # Тяжелый запрос: медленный ответ дублируется на второй эндпоинт
+        logs = await self.rpc_pool.call_hedged(lambda w3: w3.eth.get_logs(params))
+        return self.payment_decoder.decode_many(logs)
 
     async def get_current_block(self) -> int:
-        return await self.eth_http.block_number
+        return await self.rpc_pool.call(lambda w3: w3.eth.block_number)
+
+    async def get_block_hash(self, block_number: int) -> str:
+        return (await self.get_block_header(block_number))["hash"]
+
+    async def get_canonical_hash(self, block_number: int) -> Optional[str]:
+        """Хеш блока в канонической цепи, None - такого блока в ней нет (цепь стала короче)."""
+        try:
+            return await self.get_block_hash(block_number)
+        except BlockNotFound:
+            return None
     
-    async def listen_payments(self, callback: Callable[[Dict[str, Any]], Any]):
+    async def get_block_header(self, block_identifier: Any = "latest") -> Dict[str, Any]:
+        block = await self.rpc_pool.call(lambda w3: w3.eth.get_block(block_identifier))
+        return self._parse_header(block)
+
+    async def listen_payments(
+            self,
+            callback: Callable[[PaymentEvent], Any],
+            from_block: Optional[int] = None,
+            on_progress: Optional[Callable[[int], Awaitable[Any]]] = None,
+            on_head: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+        ):
         """
-        Слушает события PaymentReceived в реальном времени
-        и вызывает callback для каждой новой транзакции.
+        Слушает события PaymentReceived в реальном времени через eth_subscribe("logs")
+        и вызывает callback для каждой новой транзакции, начиная с from_block (по умолчанию - со следующего).
+        Лог, выброшенный реорганизацией, приходит в callback с removed=True.
+        on_progress получает номер блока, все события до которого уже отданы в callback,
+        on_head - заголовки новых блоков (number, hash, parent_hash) для отслеживания реорганизаций.
+        Пока подписка недоступна - опрашивает get_logs с адаптивным интервалом
+        и периодически пытается подписаться снова.
         """
-        last_block = await self.get_current_block()
-        logger.info(f"Starting WebSocket listener from block {last_block + 1}")
+        # Последний блок, события которого уже отданы в callback
+        self._listen_block = from_block - 1 if from_block is not None else await self.get_current_block()
+        self._on_progress = on_progress
+        self._on_head = on_head
+        logger.info(f"Starting WebSocket listener from block {self._listen_block + 1}")
 
+        failures = 0
         while True:
             try:
-                events = await self.contract_ws.events.PaymentReceived.get_logs(
-                    from_block=last_block + 1,
-                    to_block="latest"
-                )
+                if failures:
+                    await self._reconnect_ws()
+                await self._listen_subscription(callback)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.error(f"WebSocket subscription error: {e}")
+            else:
+                failures = 0
+
+            retry_in = min(self.settings.ws_resubscribe_max_seconds, 2 ** failures)
+            await self._poll_logs(callback, duration=retry_in)
+
+    async def _listen_subscription(self, callback: Callable[[PaymentEvent], Any]):
+        """
+        Подписывается на логи контракта и на новые блоки, затем догружает через HTTP
+        пропущенное с прошлого раза: подписка до догрузки, чтобы между ними не было щели.
+        Событие в последнем догруженном блоке может прийти повторно - перенос платежа идемпотентен.
+        """
+        logs_subscription = await self._subscribe_logs()
+        heads_subscription = await self.eth_ws.subscribe("newHeads")
+        try:
+            head = await self._backfill(callback)
+            backfilled_to = head["number"]
+            # Логи после заголовка догрузки придут уже по подписке - от него цепочка и продолжается
+            self._last_head = head
+            logger.info(f"Subscribed to PaymentReceived logs from block {backfilled_to + 1}")
+
+            async for message in self.w3_ws.socket.process_subscriptions():
+                if not self.filter_applied:
+                    # Сначала новая подписка, потом отписка от старой - иначе между ними щель
+                    previous, logs_subscription = logs_subscription, await self._subscribe_logs()
+                    await self.eth_ws.unsubscribe(previous)
+                    # Новый фильтр - прогресс снова подтверждаем через eth_getLogs
+                    self._last_head = None
+                    logger.info("Resubscribed to PaymentReceived logs with updated tariff filter")
+                subscription = message.get("subscription")
+                if subscription == heads_subscription:
+                    header = self._parse_header(message["result"])
+                    await self._confirm_delivered(callback, header)
+                    if self._on_head:
+                        await self._on_head(header)
+                    continue
+                if subscription != logs_subscription:
+                    continue
+
+                event = self.payment_decoder.decode(message["result"])
+                if event is None:
+                    continue
+                if event.removed:
+                    await callback(event)
+                    continue
+                if event.block_number <= backfilled_to:
+                    continue  # уже отдано догрузкой
+                await callback(event)
+                # В блоке могут быть еще события - целиком пройден только предыдущий
+                await self._advance(event.block_number - 1)
+        finally:
+            self._subscribed_version = None
+            self._last_head = None
+            for subscription in (logs_subscription, heads_subscription):
+                try:
+                    await self.eth_ws.unsubscribe(subscription)
+                except Exception:
+                    pass  # соединение уже разорвано
+
+    async def _subscribe_logs(self) -> str:
+        version = self._filter_version
+        subscription = await self.eth_ws.subscribe("logs", {
+            "address": self.contract_address,
+            "topics": self._payment_topics(),
+        })
+        self._subscribed_version = version
+        return subscription
+
+    async def _backfill(self, callback: Callable[[PaymentEvent], Any]) -> Dict[str, Any]:
+        """Отдает события из блоков, пропущенных с последнего отданного. Возвращает заголовок, до которого догружено."""
+        header = await self.get_block_header("latest")
+        head = header["number"]
+        if head > self._listen_block:
+            async for window_end, events in self.scan_payment_logs(self._listen_block + 1, head):
                 for event in events:
-                    args = event["args"]
-                    parsed_event = {
-                        "payment_id": args["paymentId"].hex(),
-                        "from_address": args["from"],
-                        "amount_wei": args["amount"],
-                        "amount_eth": await self.eth_ws.from_wei(args["amount"], "ether"),
-                        "timestamp": args["timestamp"],
-                        "block_number": event["blockNumber"],
-                        "tx_hash": event["transactionHash"].hex()
-                    }
-                    await callback(parsed_event)
-
-                if events:
-                    last_block = max(e["blockNumber"] for e in events)
-
-                await asyncio.sleep(1)
+                    await callback(event)
+                await self._advance(window_end)
+        if self._on_head:
+            await self._on_head(header)
+        return header
+
+    async def _confirm_delivered(self, callback: Callable[[PaymentEvent], Any], header: Dict[str, Any]):
+        """
+        Считает отданными логи блоков до родителя нового заголовка. Узел шлет логи блока
+        при его импорте, раньше заголовка следующего, поэтому если заголовок продолжает
+        предыдущий (номер на единицу больше, parent_hash совпадает), логи родителя уже пришли
+        по этому соединению и прогресс двигается без запросов к узлу.
+        После разрыва цепочки - пропущенный номер, реорганизация, смена фильтра - логи
+        дочитываются через HTTP. Родитель запрашивается по хешу: узел, который его еще
+        не видел, ответит ошибкой, а не пустым списком. Уже пришедшие по подписке логи
+        отдаются повторно - перенос платежа идемпотентен.
+        """
+        previous, self._last_head = self._last_head, None
+        parent = header["number"] - 1
+        if parent <= self._listen_block:
+            self._last_head = header
+            return
+        if previous is not None and previous["number"] == parent and previous["hash"] == header["parent_hash"]:
+            await self._advance(parent)
+            self._last_head = header
+            return
+        try:
+            events = await self.rpc_pool.call(lambda w3: w3.eth.get_logs({
+                "address": self.contract_address,
+                "topics": self._payment_topics(),
+                "blockHash": header["parent_hash"],
+            }))
+            if parent - 1 > self._listen_block:
+                for event in await self.get_payment_logs(self._listen_block + 1, parent - 1):
+                    await callback(event)
+        except Exception as e:
+            # Прогресс не двигаем - следующий заголовок перепроверит диапазон целиком
+            logger.warning(f"Failed to confirm logs up to block {parent}: {e}")
+            return
+        for event in self.payment_decoder.decode_many(events):
+            await callback(event)
+        await self._advance(parent)
+        self._last_head = header
+
+    async def _advance(self, block_number: int):
+        if block_number > self._listen_block:
+            self._listen_block = block_number
+            if self._on_progress:
+                await self._on_progress(block_number)
+
+    async def _poll_logs(self, callback: Callable[[PaymentEvent], Any], duration: float):
+        """
+        Резервный опрос get_logs через HTTP на время duration. Интервал сбрасывается
+        до минимального, когда появляются новые блоки, и удваивается в простое и при ошибках.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        interval = self.settings.log_poll_min_interval
+        while loop.time() < deadline:
+            try:
+                head = await self.get_current_block()
+                if head > self._listen_block:
+                    await self._backfill(callback)
+                    interval = self.settings.log_poll_min_interval
+                else:
+                    interval = min(interval * 2, self.settings.log_poll_max_interval)
             except Exception as e:
-                logger.error(f"WebSocket listener error: {e}")
-                await asyncio.sleep(5)
-    
+                logger.error(f"Log polling error: {e}")
+                interval = min(interval * 2, self.settings.log_poll_max_interval)
+            await asyncio.sleep(min(interval, max(0.0, deadline - loop.time())))
+
+    async def _reconnect_ws(self):
+        try:
+            await self.w3_ws.provider.disconnect()
+        except Exception:
+            pass
+        if len(self.ws_urls) > 1:
+            # Переподключаемся уже к следующему эндпоинту - текущий, вероятно, и есть проблема
+            self._ws_index = (self._ws_index + 1) % len(self.ws_urls)
+            self.w3_ws.provider = WebSocketProvider(self.ws_urls[self._ws_index])
+        await self.w3_ws.provider.connect()
+        logger.info(f"WebSocket connection re-established to endpoint #{self._ws_index}")
+
+    @staticmethod
+    def _parse_header(header) -> Dict[str, Any]:
+        return {
+            "number": header["number"],
+            "hash": header["hash"].to_0x_hex(),
+            "parent_hash": header["parentHash"].to_0x_hex(),
+        }
+
     def uuid_to_bytes32_web3(self, u: uuid.UUID) -> bytes:
         # UUID → 16 байт, дополняем до 32 байт нулями справа
         return u.bytes.ljust(32, b'\x00')
 
     def build_calldata(self, data: ContractData) -> str:
-        """Генерирует calldata для payForTariff через ABI"""
+        """Генерирует calldata для payForTariff"""
+        return self.calldata_encoder.encode(data)
 
-        payment_hash = Web3.keccak(text=str(data.paymentId)).hex()
-        tariff_hash = Web3.keccak(text=str(data.tariffId)).hex()
-        price = data.price
-
-        print(payment_hash, tariff_hash, price)
-        calldata = self.contract_http.encode_abi(
-            "payForTariff",
-            args=[payment_hash, tariff_hash, price]
-        )
-        print(calldata)
-        return calldata
\ No newline at end of file
+    def build_calldata_many(self, items: List[ContractData]) -> List[str]:
+        """Генерирует calldata для payForTariff для пачки платежей"""
+        return self.calldata_encoder.encode_many(items)
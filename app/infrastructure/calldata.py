@@ -0,0 +1,68 @@
+""" Предкомпилированный энкодер calldata для payForTariff """
+from typing import Iterable
+from uuid import UUID
+
+from web3 import Web3
+
+from app.infrastructure.models import ContractData
+
+_UINT256_MAX = 2**256 - 1
+
+
+class PayForTariffEncoder:
+    """
+    Собирает calldata payForTariff(bytes32,bytes32,uint256) без ABI-машинерии web3:
+    селектор считается один раз, хеши тарифов кешируются, а аргументы статические -
+    calldata это просто селектор и три 32-байтных слова подряд.
+    """
+    FUNCTION_NAME = "payForTariff"
+    ARG_TYPES = ("bytes32", "bytes32", "uint256")
+
+    def __init__(self, selector: bytes):
+        self.selector = selector
+        self._tariff_hashes: dict[UUID, bytes] = {}
+
+    @classmethod
+    def from_abi(cls, abi: list) -> "PayForTariffEncoder":
+        """Находит payForTariff в ABI, сверяет сигнатуру и вычисляет селектор."""
+        for item in abi:
+            if item.get("type") == "function" and item.get("name") == cls.FUNCTION_NAME:
+                arg_types = tuple(arg["type"] for arg in item["inputs"])
+                if arg_types != cls.ARG_TYPES:
+                    raise ValueError(f"Unexpected {cls.FUNCTION_NAME} signature in ABI: {arg_types}")
+                signature = f"{cls.FUNCTION_NAME}({','.join(arg_types)})"
+                return cls(selector=bytes(Web3.keccak(text=signature)[:4]))
+        raise ValueError(f"Function {cls.FUNCTION_NAME} not found in ABI")
+
+    @staticmethod
+    def payment_hash(payment_id: UUID) -> bytes:
+        return bytes(Web3.keccak(text=str(payment_id)))
+
+    def tariff_hash(self, tariff_id: UUID) -> bytes:
+        """Хеш тарифа не меняется, поэтому считается один раз на тариф."""
+        tariff_hash = self._tariff_hashes.get(tariff_id)
+        if tariff_hash is None:
+            tariff_hash = bytes(Web3.keccak(text=str(tariff_id)))
+            self._tariff_hashes[tariff_id] = tariff_hash
+        return tariff_hash
+
+    def encode(self, data: ContractData) -> str:
+        return "0x" + self._encode(data.paymentId, data.tariffId, data.price).hex()
+
+    def encode_many(self, items: Iterable[ContractData]) -> list[str]:
+        """Пакетная версия encode для наполнения пулов и массовой генерации."""
+        return ["0x" + self._encode(data.paymentId, data.tariffId, data.price).hex() for data in items]
+
+    def _encode(self, payment_id: UUID, tariff_id: UUID, price: int) -> bytes:
+        return b"".join((
+            self.selector,
+            self.payment_hash(payment_id),
+            self.tariff_hash(tariff_id),
+            self._encode_uint256(price),
+        ))
+
+    @staticmethod
+    def _encode_uint256(value: int) -> bytes:
+        if not 0 <= value <= _UINT256_MAX:
+            raise ValueError(f"Value {value} does not fit into uint256")
+        return value.to_bytes(32, "big")
@@ -1,7 +1,18 @@
 from app.infrastructure.db.postgres.database import AsyncDatabaseHelper
 from app.infrastructure.db.postgres.repositories.tariffs import TariffsRepository
 from app.infrastructure.db.postgres.repositories.transactions import TransactionsRepository as PostgresTransactionsRepository
-from app.infrastructure.db.redis.repositories import TransactionsRepository as RedisTransactionsRepository
+from app.infrastructure.db.redis.pubsub import RedisPubSub
+from app.infrastructure.db.redis.repositories import (
+    BlockCheckpointRepository,
+    IntentPoolRepository,
+    PaymentStatusRepository,
+    PollerCoordinationRepository,
+    PollerMetricsRepository,
+    QRCacheRepository,
+    ShortLinksRepository,
+    TariffsVersionRepository,
+    TransactionsRepository as RedisTransactionsRepository,
+)
 from app.config import Settings
 from app.infrastructure.blockchain import AsyncWeb3Service
 
@@ -15,6 +26,15 @@ class InfrastructureContainer:
         self._tariffs_pg: TariffsRepository | None = None
         self._transactions_pg: PostgresTransactionsRepository | None = None
         self._transactions_redis: RedisTransactionsRepository | None = None
+        self._intent_pool_redis: IntentPoolRepository | None = None
+        self._short_links_redis: ShortLinksRepository | None = None
+        self._qr_cache_redis: QRCacheRepository | None = None
+        self._pubsub: RedisPubSub | None = None
+        self._tariffs_version_redis: TariffsVersionRepository | None = None
+        self._payment_status_redis: PaymentStatusRepository | None = None
+        self._checkpoint_redis: BlockCheckpointRepository | None = None
+        self._poller_metrics_redis: PollerMetricsRepository | None = None
+        self._poller_coordination_redis: PollerCoordinationRepository | None = None
         self._blockchain: AsyncWeb3Service | None = None
         
     @property
@@ -30,6 +50,12 @@ class InfrastructureContainer:
             )
         return self._async_redis_helper
     
+    @property
+    def pubsub(self) -> RedisPubSub:
+        if self._pubsub is None:
+            self._pubsub = RedisPubSub(self.redis_client)
+        return self._pubsub
+    
     @property
     def db_helper(self) -> AsyncDatabaseHelper:
         if self._async_db_helper is None:
@@ -54,6 +80,54 @@ class InfrastructureContainer:
             self._transactions_redis = RedisTransactionsRepository(self.redis_client)
         return self._transactions_redis
 
+    @property
+    def intent_pool_redis(self) -> IntentPoolRepository:
+        if self._intent_pool_redis is None:
+            self._intent_pool_redis = IntentPoolRepository(self.redis_client)
+        return self._intent_pool_redis
+
+    @property
+    def short_links_redis(self) -> ShortLinksRepository:
+        if self._short_links_redis is None:
+            self._short_links_redis = ShortLinksRepository(self.redis_client)
+        return self._short_links_redis
+
+    @property
+    def payment_status_redis(self) -> PaymentStatusRepository:
+        if self._payment_status_redis is None:
+            self._payment_status_redis = PaymentStatusRepository(self.redis_client)
+        return self._payment_status_redis
+
+    @property
+    def tariffs_version_redis(self) -> TariffsVersionRepository:
+        if self._tariffs_version_redis is None:
+            self._tariffs_version_redis = TariffsVersionRepository(self.redis_client)
+        return self._tariffs_version_redis
+
+    @property
+    def qr_cache_redis(self) -> QRCacheRepository:
+        if self._qr_cache_redis is None:
+            self._qr_cache_redis = QRCacheRepository(self.redis_client)
+        return self._qr_cache_redis
+
+    @property
+    def checkpoint_redis(self) -> BlockCheckpointRepository:
+        if self._checkpoint_redis is None:
+            self._checkpoint_redis = BlockCheckpointRepository(self.redis_client)
+        return self._checkpoint_redis
+
+    @property
+    def poller_metrics_redis(self) -> PollerMetricsRepository:
+        if self._poller_metrics_redis is None:
+            self._poller_metrics_redis = PollerMetricsRepository(self.redis_client)
+        return self._poller_metrics_redis
+
+    @property
+    def poller_coordination_redis(self) -> PollerCoordinationRepository:
+        if self._poller_coordination_redis is None:
+            self._poller_coordination_redis = PollerCoordinationRepository(self.redis_client)
+        return self._poller_coordination_redis
+
     @property
     def blockchain_helper(self) -> AsyncWeb3Service:
         if self._blockchain is None:
@@ -1,4 +1,7 @@
-from sqlalchemy import delete, select
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
 from app.infrastructure.db.postgres.schemas import Tariffs
 from app.infrastructure.db.postgres.database import AsyncDatabaseHelper
 
@@ -8,9 +11,23 @@ class TariffsRepository:
 
     async def create(self, data: dict) -> Tariffs:
         async with self.db_helper.transaction() as session:
-            tariff = Tariffs(**data)
-            session.add(tariff)
-            return tariff
+            result = await session.execute(insert(Tariffs).values(**data).returning(Tariffs))
+            return result.scalar_one()
+
+    async def bulk_upsert(self, items: list[dict]) -> list[Tariffs]:
+        """Создает или обновляет по имени весь список тарифов одним INSERT ... ON CONFLICT."""
+        async with self.db_helper.transaction() as session:
+            stmt = insert(Tariffs).values([{"tariff_id": uuid4(), **item} for item in items])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Tariffs.name],
+                set_={
+                    "price": stmt.excluded.price,
+                    "features": stmt.excluded.features,
+                    "is_active": stmt.excluded.is_active,
+                },
+            ).returning(Tariffs)
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
+            return list(result.scalars().all())
 
     async def get_all(self):
         async with self.db_helper.session_only() as session:
@@ -24,15 +41,21 @@ class TariffsRepository:
             tariff = result.scalar_one_or_none()
             return tariff
 
+    async def get_by_id(self, tariff_id):
+        async with self.db_helper.session_only() as session:
+            result = await session.execute(select(Tariffs).where(Tariffs.tariff_id == tariff_id))
+            tariff = result.scalar_one_or_none()
+            return tariff
+
     async def update(self, name: str, update_data: dict):
+        if not update_data:
+            return await self.get_by_name(name)
         async with self.db_helper.transaction() as session:
-            result = await session.execute(select(Tariffs).where(Tariffs.name == name))
+            result = await session.execute(
+                update(Tariffs).where(Tariffs.name == name).values(**update_data).returning(Tariffs),
+                execution_options={"synchronize_session": False},
+            )
             tariff = result.scalar_one_or_none()
-            if not tariff:
-                return None
-            for key, value in update_data.items():
-                setattr(tariff, key, value)
-            session.add(tariff)
             return tariff
 
     async def delete_by_name(self, name: str):
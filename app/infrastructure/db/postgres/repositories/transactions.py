@@ -2,7 +2,8 @@ from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 from app.infrastructure.db.postgres.schemas import Transactions  
 from app.infrastructure.db.postgres.database import AsyncDatabaseHelper
-from sqlalchemy import select
+from sqlalchemy import any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
 
 class TransactionsRepository:
     def __init__(self, async_db_helper: AsyncDatabaseHelper):
@@ -27,9 +28,42 @@ class TransactionsRepository:
                 session.rollback()
                 return False
 
+    async def create_many(self, rows: list[dict]) -> set:
+        """
+        Вставляет пачку транзакций одним многострочным INSERT. Уже сохраненные платежи
+        пропускаются (ON CONFLICT DO NOTHING). Возвращает payment_id вставленных строк.
+        """
+        if not rows:
+            return set()
+        async with self.async_db.transaction() as session:
+            stmt = insert(Transactions).values([
+                {
+                    "payment_id": row["payment_id"],
+                    "user_id": row["user_id"],
+                    "tariff_id": row["tariff_id"],
+                    "amount": row["amount"],
+                    "status": row.get("status", "pending"),
+                    "created_at": row["created_at"],
+                }
+                for row in rows
+            ])
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Transactions.payment_id]).returning(Transactions.payment_id)
+            result = await session.execute(stmt)
+            return set(result.scalars())
+
     async def find(self, payment_id):
         async with self.async_db.session_only() as session:
             query = select(Transactions).where(Transactions.payment_id == payment_id)
             result = await session.execute(query)
             tx = result.scalar_one_or_none() 
             return tx
+
+    async def find_existing(self, payment_ids: list) -> set:
+        """Какие из платежей есть в БД - одним запросом WHERE payment_id = ANY(:ids)."""
+        if not payment_ids:
+            return set()
+        async with self.async_db.session_only() as session:
+            ids = bindparam("ids", list(payment_ids), type_=ARRAY(UUID(as_uuid=True)))
+            query = select(Transactions.payment_id).where(Transactions.payment_id == any_(ids))
+            result = await session.execute(query)
+            return set(result.scalars())
@@ -0,0 +1,84 @@
+""" Redis pub/sub: одна подписка на процесс с раздачей сообщений обработчикам """
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis as AsyncRedis
+
+logger = logging.getLogger(__name__)
+
+# Обработчик получает текст сообщения. None приходит после (пере)подключения:
+# сообщения за время разрыва потеряны, и обработчик должен сбросить свое состояние
+MessageHandler = Callable[[Optional[str]], Awaitable[None]]
+
+
+class RedisPubSub:
+    """Держит одно соединение подписки на процесс и раздает сообщения по каналам."""
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+        self._handlers: dict[str, list[MessageHandler]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def publish(self, channel: str, message: str):
+        await self.redis.publish(channel, message)
+
+    async def publish_many(self, channel: str, messages: list[str]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.publish(channel, message)
+            await pipe.execute()
+
+    def subscribe(self, channel: str, handler: MessageHandler):
+        """Регистрирует обработчик. Если подписка уже запущена - переподписывается с новым каналом."""
+        self._handlers.setdefault(channel, []).append(handler)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, channel: str, handler: MessageHandler):
+        """Снимает обработчик. Соединение не трогаем: сообщения канала без обработчиков просто пропускаются."""
+        handlers = self._handlers.get(channel, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    async def start(self):
+        if self._task is None and self._handlers:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(*self._handlers)
+                    await self._dispatch_all(None)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub connection lost: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def _dispatch_all(self, data: Optional[str]):
+        for channel in self._handlers:
+            await self._dispatch(channel, data)
+
+    async def _dispatch(self, channel: str, data: Optional[str]):
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"Pub/sub handler for {channel} failed: {e}")
@@ -1,18 +1,108 @@
 from redis import Redis as SyncRedis
 from redis.asyncio import Redis as AsyncRedis
+import time
 from typing import Optional, Union
 import json
 
 class TransactionsRepository:
+    # Индекс ожидающих оплаты транзакций: ключ транзакции -> время истечения (unix)
+    PENDING_KEY = "transactions:pending"
+
     def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
         self.redis = redis_client
-        self.last_block_key = "last_processed_block"
 
     # Создать/обновить транзакцию
     async def create_transaction(self, key: str, transaction_data: dict, expire_seconds: int = 3600):
         data = json.dumps(transaction_data)
-        await self.redis.set(key, data)
-        await self.redis.expire(key, expire_seconds)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, data, ex=expire_seconds)
+            self._index_pending(pipe, [key], expire_seconds)
+            await pipe.execute()
+
+    # Атомарно занять индекс открытой транзакции и создать саму транзакцию.
+    # {1} - записано; {0, текущее} - значение индекса уже не то, что ожидалось, ничего не записано
+    # ('' - индекса нет: истек или удален)
+    CLAIM_SCRIPT = """
+    local current = redis.call('GET', KEYS[1]) or ''
+    if current ~= ARGV[2] then
+        return {0, current}
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+    redis.call('ZADD', KEYS[3], ARGV[4], KEYS[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[5])
+    return {1}
+    """
+
+    async def claim_transaction(
+            self, index_key: str, key: str, transaction_data: str, expected: str, expire_seconds: int
+        ) -> tuple[bool, Optional[str]]:
+        """(True, None) - транзакция создана, (False, текущее значение индекса или None) - нет."""
+        now = time.time()
+        result = await self.redis.eval(
+            self.CLAIM_SCRIPT, 3, index_key, key, self.PENDING_KEY,
+            transaction_data, expected, expire_seconds, now + expire_seconds, now
+        )
+        return self._parse_claim(result)
+
+    # Пакетная версия claim_transaction: все скрипты одним pipeline, claims - (индекс, ключ, транзакция, ожидаемое)
+    async def claim_transactions(
+            self, claims: list[tuple[str, str, str, str]], expire_seconds: int
+        ) -> list[tuple[bool, Optional[str]]]:
+        if not claims:
+            return []
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for index_key, key, transaction_data, expected in claims:
+                pipe.eval(
+                    self.CLAIM_SCRIPT, 3, index_key, key, self.PENDING_KEY,
+                    transaction_data, expected, expire_seconds, now + expire_seconds, now
+                )
+            results = await pipe.execute()
+        return [self._parse_claim(result) for result in results]
+
+    @staticmethod
+    def _parse_claim(result) -> tuple[bool, Optional[str]]:
+        if int(result[0]) == 1:
+            return True, None
+        return False, result[1] or None
+
+    # Связать ключ со значением на оставшийся TTL транзакции, если в нем все еще лежит expected
+    # ('' - ключа нет). Иначе вернуть то, что там лежит. Транзакции уже нет - ничего не пишем
+    REMEMBER_SCRIPT = """
+    local current = redis.call('GET', KEYS[1])
+    if current and current ~= ARGV[2] then
+        return current
+    end
+    local ttl = redis.call('PTTL', KEYS[2])
+    if ttl > 0 then
+        redis.call('SET', KEYS[1], ARGV[1], 'PX', ttl)
+    end
+    return false
+    """
+
+    async def remember_for_transaction(self, key: str, transaction_key: str, value: str, expected: str) -> Optional[str]:
+        return await self.redis.eval(self.REMEMBER_SCRIPT, 2, key, transaction_key, value, expected)
+
+    async def get_raw(self, key: str) -> Optional[str]:
+        return await self.redis.get(key)
+
+    async def get_many_raw(self, keys: list[str]) -> list[Optional[str]]:
+        if not keys:
+            return []
+        return await self.redis.mget(keys)
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self.redis.exists(key))
+
+    # EXISTS по каждому ключу одним pipeline
+    async def exists_many(self, keys: list[str]) -> list[bool]:
+        if not keys:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.exists(key)
+            return [bool(found) for found in await pipe.execute()]
 
     # Найти транзакцию
     async def find_transaction(self, key: str) -> Optional[dict]:
@@ -21,19 +111,420 @@ class TransactionsRepository:
             return None
         return json.loads(data)
 
+    # Найти пачку транзакций одним MGET, None - транзакции нет
+    async def find_transactions(self, keys: list[str]) -> list[Optional[dict]]:
+        if not keys:
+            return []
+        return [json.loads(data) if data else None for data in await self.redis.mget(keys)]
+
     # Удалить транзакцию
     async def delete_transaction(self, key: str):
-        await self.redis.delete(key)
+        await self.delete_transactions([key])
 
-    # Методы для последнего обработанного блока
-    async def get_last_block_number(self) -> int | None:
-        data = await self.redis.get(self.last_block_key)
-        if data is None:
-            return None
-        return int(data)
+    # Удалить пачку транзакций одной командой, related_keys - производные ключи платежей (кеш QR)
+    async def delete_transactions(self, keys: list[str], related_keys: Optional[list[str]] = None):
+        if keys:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys, *(related_keys or []))
+                pipe.zrem(self.PENDING_KEY, *keys)
+                await pipe.execute()
+
+    # Ключи неистекших ожидающих транзакций, None - их больше limit
+    async def pending_keys(self, limit: int) -> Optional[list[str]]:
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.PENDING_KEY, "-inf", now)
+            pipe.zrangebyscore(self.PENDING_KEY, now, "+inf", start=0, num=limit + 1)
+            _, keys = await pipe.execute()
+        return keys if len(keys) <= limit else None
+
+    def _index_pending(self, pipe, keys: list[str], expire_seconds: int):
+        if keys:
+            now = time.time()
+            pipe.zadd(self.PENDING_KEY, {key: now + expire_seconds for key in keys})
+            # Истекшие транзакции Redis удаляет сам, из индекса их убираем при записи
+            pipe.zremrangebyscore(self.PENDING_KEY, "-inf", now)
 
-    async def set_last_block_number(self, block_number: int):
-        await self.redis.set(self.last_block_key, block_number)
 
         
-    
\ No newline at end of file
+    
+
+class IntentPoolRepository:
+    """ Пулы заранее подготовленных платежей: по Redis-списку на тариф """
+    KEY_TEMPLATE = "intent_pool:{tariff_id}"
+    LOCK_KEY_TEMPLATE = "intent_pool_lock:{tariff_id}"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    # Добавить подготовленные платежи в конец пула
+    async def push_many(self, tariff_id, intents: list[str], expire_seconds: int):
+        key = self._make_key(tariff_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *intents)
+            pipe.expire(key, expire_seconds)
+            await pipe.execute()
+
+    # Атомарно забрать один платеж из пула, заодно узнать остаток
+    async def pop(self, tariff_id) -> tuple[Optional[str], int]:
+        key = self._make_key(tariff_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpop(key)
+            pipe.llen(key)
+            intent, remaining = await pipe.execute()
+        return intent, remaining
+
+    async def size(self, tariff_id) -> int:
+        return await self.redis.llen(self._make_key(tariff_id))
+
+    # Вернуть неиспользованный платеж в начало пула
+    async def push_back(self, tariff_id, intent: str):
+        await self.redis.lpush(self._make_key(tariff_id), intent)
+
+    async def clear(self, tariff_id):
+        await self.redis.delete(self._make_key(tariff_id))
+
+    async def clear_many(self, tariff_ids: list):
+        if tariff_ids:
+            await self.redis.delete(*(self._make_key(tariff_id) for tariff_id in tariff_ids))
+
+    # Блокировка наполнения, чтобы воркеры не заполняли один пул одновременно
+    async def try_lock(self, tariff_id, expire_seconds: int) -> bool:
+        return bool(await self.redis.set(self._make_lock_key(tariff_id), 1, nx=True, ex=expire_seconds))
+
+    async def unlock(self, tariff_id):
+        await self.redis.delete(self._make_lock_key(tariff_id))
+
+    @classmethod
+    def _make_key(cls, tariff_id) -> str:
+        return cls.KEY_TEMPLATE.format(tariff_id=tariff_id)
+
+    @classmethod
+    def _make_lock_key(cls, tariff_id) -> str:
+        return cls.LOCK_KEY_TEMPLATE.format(tariff_id=tariff_id)
+
+
+class ShortLinksRepository:
+    """ Короткие коды ссылок на оплату """
+    KEY_TEMPLATE = "short_link:{code}"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def create(self, code: str, url: str, expire_seconds: int):
+        await self.redis.set(self._make_key(code), url, ex=expire_seconds)
+
+    async def create_many(self, urls: dict[str, str], expire_seconds: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for code, url in urls.items():
+                pipe.set(self._make_key(code), url, ex=expire_seconds)
+            await pipe.execute()
+
+    async def find(self, code: str) -> Optional[str]:
+        return await self.redis.get(self._make_key(code))
+
+    @classmethod
+    def _make_key(cls, code: str) -> str:
+        return cls.KEY_TEMPLATE.format(code=code)
+
+
+class QRCacheRepository:
+    """
+    Кеш отрендеренных QR-кодов платежа: hash с содержимым QR и изображениями по форматам.
+    Живет столько же, сколько сам платеж.
+    """
+    KEY_TEMPLATE = "qr_cache:{payment_id}"
+    # Дописывает изображение, только если кеш платежа еще жив, не продлевая его TTL
+    ADD_IMAGE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('HSET', KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def create(self, payment_id, content: str, image_format: str, image: str, etag: str, expire_seconds: int):
+        key = self._make_key(payment_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "content": content,
+                image_format: image,
+                f"{image_format}:etag": etag,
+            })
+            pipe.expire(key, expire_seconds)
+            await pipe.execute()
+
+    # Закешировать только содержимое QR для пачки платежей
+    async def create_many(self, contents: dict, expire_seconds: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for payment_id, content in contents.items():
+                key = self._make_key(payment_id)
+                pipe.hset(key, "content", content)
+                pipe.expire(key, expire_seconds)
+            await pipe.execute()
+
+    # Найти содержимое QR, изображение нужного формата и оставшийся TTL
+    async def find(self, payment_id, image_format: str) -> Optional[dict]:
+        key = self._make_key(payment_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(key, "content", image_format, f"{image_format}:etag")
+            pipe.ttl(key)
+            (content, image, etag), ttl = await pipe.execute()
+        if content is None:
+            return None
+        return {"content": content, "image": image, "etag": etag, "ttl": ttl}
+
+    async def add_image(self, payment_id, image_format: str, image: str, etag: str):
+        await self.redis.eval(
+            self.ADD_IMAGE_SCRIPT, 1, self._make_key(payment_id),
+            image_format, image, f"{image_format}:etag", etag
+        )
+
+    @classmethod
+    def _make_key(cls, payment_id) -> str:
+        return cls.KEY_TEMPLATE.format(payment_id=payment_id)
+
+
+class TariffsVersionRepository:
+    """ Счетчик версий каталога тарифов: растет при каждом изменении """
+    KEY = "tariffs:version"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def get(self) -> int:
+        version = await self.redis.get(self.KEY)
+        return int(version) if version is not None else 0
+
+    async def bump(self) -> int:
+        return await self.redis.incr(self.KEY)
+
+
+class BlockCheckpointRepository:
+    """ Последний полностью обработанный поллером блок: номер и хеш """
+    KEY = "poller:checkpoint"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def get(self) -> Optional[tuple[int, str]]:
+        data = await self.redis.hgetall(self.KEY)
+        if not data:
+            return None
+        return int(data["number"]), data["hash"]
+
+    # Запись с fencing-токеном: точку, записанную лидером с токеном новее, старый лидер не перетрет
+    SET_SCRIPT = """
+    local stored = tonumber(redis.call('HGET', KEYS[1], 'token') or '0')
+    if tonumber(ARGV[3]) < stored then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'number', ARGV[1], 'hash', ARGV[2], 'token', ARGV[3])
+    return 1
+    """
+
+    async def set(self, block_number: int, block_hash: str, fencing_token: int = 0) -> bool:
+        accepted = await self.redis.eval(self.SET_SCRIPT, 1, self.KEY, block_number, block_hash, fencing_token)
+        return bool(accepted)
+
+
+class PollerCoordinationRepository:
+    """
+    Координация нескольких поллеров: аренда лидерства с fencing-токенами
+    и очередь диапазонов блоков, которые экземпляры разбирают для догоняющего обхода.
+    Диапазон хранится строкой "start:end".
+    """
+    LEADER_KEY = "poller:leader"
+    FENCING_KEY = "poller:fencing"
+    PENDING_KEY = "poller:ranges:pending"
+    CLAIMED_KEY = "poller:ranges:claimed"   # zset: диапазон -> дедлайн захвата, мс
+    DONE_KEY = "poller:ranges:done"         # zset: диапазон -> первый блок
+
+    # Захватить или продлить аренду. Новый захват выдает следующий fencing-токен
+    ACQUIRE_SCRIPT = """
+    local current = redis.call('GET', KEYS[1])
+    if current then
+        local token, owner = string.match(current, '^(%d+):(.*)$')
+        if owner == ARGV[1] then
+            redis.call('PEXPIRE', KEYS[1], ARGV[2])
+            return tonumber(token)
+        end
+        return false
+    end
+    local token = redis.call('INCR', KEYS[2])
+    redis.call('SET', KEYS[1], token .. ':' .. ARGV[1], 'PX', ARGV[2])
+    return token
+    """
+
+    # Продлить аренду, только если она все еще наша и с тем же токеном
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    # Взять следующий диапазон из очереди, а если она пуста - брошенный (захват истек)
+    CLAIM_RANGE_SCRIPT = """
+    local now = redis.call('TIME')
+    local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+    local range = redis.call('LPOP', KEYS[1])
+    if not range then
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now_ms, 'LIMIT', 0, 1)
+        range = expired[1]
+    end
+    if range then
+        redis.call('ZADD', KEYS[2], now_ms + tonumber(ARGV[1]), range)
+    end
+    return range
+    """
+
+    EXTEND_RANGE_SCRIPT = """
+    local now = redis.call('TIME')
+    local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+    return redis.call('ZADD', KEYS[1], 'XX', 'CH', now_ms + tonumber(ARGV[2]), ARGV[1])
+    """
+
+    COMPLETE_RANGE_SCRIPT = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+        redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def acquire_leader(self, instance_id: str, ttl_ms: int) -> Optional[int]:
+        token = await self.redis.eval(self.ACQUIRE_SCRIPT, 2, self.LEADER_KEY, self.FENCING_KEY, instance_id, ttl_ms)
+        return int(token) if token is not None else None
+
+    async def renew_leader(self, instance_id: str, token: int, ttl_ms: int) -> bool:
+        return bool(await self.redis.eval(self.RENEW_SCRIPT, 1, self.LEADER_KEY, f"{token}:{instance_id}", ttl_ms))
+
+    async def release_leader(self, instance_id: str, token: int):
+        await self.redis.eval(self.RELEASE_SCRIPT, 1, self.LEADER_KEY, f"{token}:{instance_id}")
+
+    async def plan_ranges(self, ranges: list[tuple[int, int]]):
+        """Новый лидер заменяет очередь диапазонов целиком: старые захваты доработают вхолостую."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.PENDING_KEY, self.CLAIMED_KEY, self.DONE_KEY)
+            if ranges:
+                pipe.rpush(self.PENDING_KEY, *(f"{start}:{end}" for start, end in ranges))
+            await pipe.execute()
+
+    async def claim_range(self, claim_ttl_ms: int) -> Optional[tuple[int, int]]:
+        claimed = await self.redis.eval(self.CLAIM_RANGE_SCRIPT, 2, self.PENDING_KEY, self.CLAIMED_KEY, claim_ttl_ms)
+        return self._parse_range(claimed) if claimed else None
+
+    async def extend_range(self, block_range: tuple[int, int], claim_ttl_ms: int) -> bool:
+        member = "{}:{}".format(*block_range)
+        return bool(await self.redis.eval(self.EXTEND_RANGE_SCRIPT, 1, self.CLAIMED_KEY, member, claim_ttl_ms))
+
+    async def complete_range(self, block_range: tuple[int, int]) -> bool:
+        member = "{}:{}".format(*block_range)
+        return bool(await self.redis.eval(
+            self.COMPLETE_RANGE_SCRIPT, 2, self.CLAIMED_KEY, self.DONE_KEY, member, block_range[0]
+        ))
+
+    async def get_done_ranges(self) -> list[tuple[int, int]]:
+        return [self._parse_range(member) for member in await self.redis.zrange(self.DONE_KEY, 0, -1)]
+
+    async def forget_done_ranges(self, ranges: list[tuple[int, int]]):
+        if ranges:
+            await self.redis.zrem(self.DONE_KEY, *("{}:{}".format(*block_range) for block_range in ranges))
+
+    @staticmethod
+    def _parse_range(member: str) -> tuple[int, int]:
+        start, end = member.split(":")
+        return int(start), int(end)
+
+
+class PollerMetricsRepository:
+    """ Последний снимок метрик поллера для API """
+    KEY = "poller:metrics"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def get(self) -> Optional[dict]:
+        data = await self.redis.get(self.KEY)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, snapshot: dict, expire_seconds: int):
+        await self.redis.set(self.KEY, json.dumps(snapshot, default=str), ex=expire_seconds)
+
+
+class PaymentStatusRepository:
+    """
+    Быстрый статус платежа для опроса клиентами: оплаченные платежи и
+    короткоживущий негативный кеш для тех, которых нет в Postgres.
+    """
+    SETTLED = "settled"
+    UNKNOWN = "unknown"
+    SETTLED_KEY_TEMPLATE = "payment_settled:{payment_id}"
+    UNKNOWN_KEY_TEMPLATE = "payment_unknown:{payment_id}"
+
+    def __init__(self, redis_client: Union[SyncRedis, AsyncRedis]):
+        self.redis = redis_client
+
+    async def get_status(self, payment_id) -> Optional[str]:
+        settled, unknown = await self.redis.mget(
+            self.SETTLED_KEY_TEMPLATE.format(payment_id=payment_id),
+            self.UNKNOWN_KEY_TEMPLATE.format(payment_id=payment_id),
+        )
+        if settled is not None:
+            return self.SETTLED
+        if unknown is not None:
+            return self.UNKNOWN
+        return None
+
+    async def get_statuses(self, payment_ids: list) -> dict:
+        """Статусы пачки платежей одним MGET, None - статуса в кеше нет."""
+        if not payment_ids:
+            return {}
+        keys = []
+        for payment_id in payment_ids:
+            keys.append(self.SETTLED_KEY_TEMPLATE.format(payment_id=payment_id))
+            keys.append(self.UNKNOWN_KEY_TEMPLATE.format(payment_id=payment_id))
+        values = await self.redis.mget(keys)
+
+        statuses = {}
+        for i, payment_id in enumerate(payment_ids):
+            settled, unknown = values[2 * i], values[2 * i + 1]
+            if settled is not None:
+                statuses[payment_id] = self.SETTLED
+            elif unknown is not None:
+                statuses[payment_id] = self.UNKNOWN
+            else:
+                statuses[payment_id] = None
+        return statuses
+
+    # Отметить платежи оплаченными и снять с них негативный кеш
+    async def mark_settled(self, payment_ids: list, expire_seconds: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for payment_id in payment_ids:
+                pipe.set(self.SETTLED_KEY_TEMPLATE.format(payment_id=payment_id), 1, ex=expire_seconds)
+                pipe.delete(self.UNKNOWN_KEY_TEMPLATE.format(payment_id=payment_id))
+            await pipe.execute()
+
+    async def mark_unknown(self, payment_id, expire_seconds: float):
+        await self.redis.set(
+            self.UNKNOWN_KEY_TEMPLATE.format(payment_id=payment_id), 1, px=int(expire_seconds * 1000)
+        )
+
+    async def mark_unknown_many(self, payment_ids: list, expire_seconds: float):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for payment_id in payment_ids:
+                pipe.set(self.UNKNOWN_KEY_TEMPLATE.format(payment_id=payment_id), 1, px=int(expire_seconds * 1000))
+            await pipe.execute()
@@ -0,0 +1,174 @@
+""" Адаптивный параллельный обход диапазона блоков окнами eth_getLogs """
+import asyncio
+from dataclasses import dataclass, field
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FetchRange = Callable[[int, int], Awaitable[List[Any]]]
+
+
+class LogScanError(Exception):
+    """Диапазон блоков так и не удалось получить - дальше идти нельзя, иначе события потеряются."""
+
+
+@dataclass
+class _Segment:
+    start: int
+    end: int
+    fetch: FetchRange
+    failures: int = 0   # неудачи этого диапазона и тех, от которых он отделен - для паузы перед запросом
+    attempts: int = 0   # повторы окна в один блок
+    task: Optional[asyncio.Task] = None   # None - запланирован, ждет свободного места
+    result: Optional[List[Any]] = field(default=None)
+
+
+class LogRangeScanner:
+    """
+    Делит диапазон на окна и запрашивает их параллельно, не больше concurrency запросов за раз.
+    Ошибка или таймаут окна (провайдер отказал "too many results", упал по времени) -
+    глобальный размер окна уменьшается, а окно заново планируется частями не больше половины;
+    части запускаются в общей очереди и с паузой, растущей с каждой неудачей. Успех - окно растет,
+    но не выше середины между удачным и отказавшим размером, пока потолок отказа не отпустит.
+    Результаты отдаются строго в порядке блоков. Окно в один блок повторяется с паузой,
+    а после retries неудач обход падает с LogScanError, а не пропускает диапазон.
+    """
+    def __init__(
+            self,
+            fetch: FetchRange,
+            initial_window: int = 2000,
+            min_window: int = 1,
+            max_window: int = 10000,
+            concurrency: int = 4,
+            timeout: float = 20.0,
+            retries: int = 5,
+            backoff: float = 0.5,
+            max_backoff: float = 30.0
+        ):
+        self.fetch = fetch
+        self.min_window = max(1, min_window)
+        self.max_window = max(self.min_window, max_window)
+        self.window = min(max(initial_window, self.min_window), self.max_window)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Самое маленькое окно, на котором провайдер отказал: рост окна к нему приближается, а не
+        # перепрыгивает. Каждый успех понемногу поднимает потолок - плотность событий меняется
+        self.ceiling: Optional[int] = None
+
+    async def scan(
+            self, from_block: int, to_block: int, fetch: Optional[FetchRange] = None
+        ) -> AsyncIterator[tuple[int, int, List[Any]]]:
+        """
+        Отдает (start, end, события) подряд идущими окнами от from_block до to_block.
+        fetch заменяет запрос по умолчанию на этот обход (например, с другим фильтром).
+        """
+        fetch = fetch or self.fetch
+        # По порядку блоков: запланированные, в работе и готовые, но ждущие очереди на выдачу
+        segments: list[_Segment] = []
+        cursor = from_block
+        try:
+            while segments or cursor <= to_block:
+                in_flight = sum(1 for segment in segments if segment.task is not None and not segment.task.done())
+                # Сначала перепланированные части - они раньше по блокам и держат выдачу.
+                # Пока часть ждала, окно могло уменьшиться еще - тогда от нее отрезается окно
+                i = 0
+                while i < len(segments) and in_flight < self.concurrency:
+                    segment = segments[i]
+                    if segment.task is None:
+                        if segment.end - segment.start + 1 > self.window:
+                            rest = _Segment(
+                                segment.start + self.window, segment.end, segment.fetch,
+                                failures=segment.failures, attempts=segment.attempts
+                            )
+                            segment.end = segment.start + self.window - 1
+                            segments.insert(i + 1, rest)
+                        self._launch(segment)
+                        in_flight += 1
+                    i += 1
+                # Новые окна - только когда перепланировать нечего; память ограничена concurrency окнами
+                while in_flight < self.concurrency and len(segments) < self.concurrency and cursor <= to_block:
+                    end = min(cursor + self.window - 1, to_block)
+                    segments.append(self._launch(_Segment(cursor, end, fetch)))
+                    cursor = end + 1
+                    in_flight += 1
+
+                head = segments[0].task
+                if head is None or not head.done():
+                    running = [segment.task for segment in segments if segment.task is not None and not segment.task.done()]
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                segments = self._collect(segments)
+                while segments and segments[0].result is not None:
+                    head = segments.pop(0)
+                    yield head.start, head.end, head.result
+        finally:
+            for segment in segments:
+                if segment.task is not None:
+                    segment.task.cancel()
+
+    def _collect(self, segments: list[_Segment]) -> list[_Segment]:
+        """Разбирает завершенные окна: успешные запоминает, упавшие перепланирует частями или повторяет."""
+        collected = []
+        for segment in segments:
+            if segment.result is not None or segment.task is None or not segment.task.done():
+                collected.append(segment)
+                continue
+            error = segment.task.exception()
+            if error is None:
+                segment.result = segment.task.result()
+                self._grow(segment.end - segment.start + 1)
+                collected.append(segment)
+                continue
+
+            # Окна, запущенные до уменьшения, не должны уронить размер повторно
+            size = segment.end - segment.start + 1
+            self.window = max(self.min_window, min(self.window, size // 2))
+            self.ceiling = size if self.ceiling is None else min(self.ceiling, size)
+            if segment.end > segment.start:
+                # Равные части не больше половины и не больше текущего окна: его уже уменьшили другие неудачи
+                parts = -(-size // max(1, min(self.window, (size + 1) // 2)))
+                part = -(-size // parts)
+                logger.warning(
+                    f"Log range {segment.start}-{segment.end} failed ({error!r}), "
+                    f"splitting into parts of {part}, window is now {self.window}"
+                )
+                collected.extend(
+                    _Segment(start, min(start + part - 1, segment.end), segment.fetch, failures=segment.failures + 1)
+                    for start in range(segment.start, segment.end + 1, part)
+                )
+                continue
+
+            if segment.attempts >= self.retries:
+                for pending in collected:
+                    if pending.task is not None:
+                        pending.task.cancel()
+                raise LogScanError(f"Block {segment.start} failed after {segment.attempts} attempts") from error
+            logger.warning(f"Block {segment.start} failed ({error!r}), retrying")
+            collected.append(_Segment(
+                segment.start, segment.end, segment.fetch,
+                failures=segment.failures + 1, attempts=segment.attempts + 1
+            ))
+        return collected
+
+    def _grow(self, size: int):
+        window = self.window + max(1, self.window // 2)
+        if self.ceiling is not None:
+            if size >= self.ceiling:
+                self.ceiling = None
+            else:
+                window = min(window, max(self.window, (size + self.ceiling) // 2))
+                self.ceiling += max(1, self.ceiling // 16)
+        self.window = min(self.max_window, window)
+
+    def _launch(self, segment: _Segment) -> _Segment:
+        segment.task = asyncio.create_task(self._fetch(segment))
+        return segment
+
+    async def _fetch(self, segment: _Segment) -> List[Any]:
+        if segment.failures:
+            await asyncio.sleep(min(self.max_backoff, self.backoff * 2 ** (segment.failures - 1)))
+        return await asyncio.wait_for(segment.fetch(segment.start, segment.end), self.timeout)
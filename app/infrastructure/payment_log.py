@@ -0,0 +1,127 @@
+""" Быстрый декодер сырых логов PaymentReceived """
+from decimal import Decimal
+from typing import Any, Optional
+
+from web3 import Web3
+
+
+def _as_bytes(value: Any) -> bytes:
+    """HTTP-ответы web3 отдают HexBytes, сырые сообщения подписки - 0x-строки."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _as_int(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else value
+
+
+class PaymentEvent:
+    """
+    Событие PaymentReceived. payment_id, tx_hash - hex без 0x, block_hash - с 0x.
+    Сумма в ETH и checksum-адрес отправителя считаются только при обращении:
+    поллеру для переноса платежа они не нужны.
+    """
+    __slots__ = (
+        "payment_id", "tariff_id", "sender", "amount_wei", "timestamp",
+        "block_number", "block_hash", "log_index", "tx_hash", "removed",
+    )
+
+    def __init__(
+            self,
+            payment_id: str,
+            tariff_id: str,
+            sender: bytes,
+            amount_wei: int,
+            timestamp: int,
+            block_number: int,
+            block_hash: str,
+            log_index: int,
+            tx_hash: str,
+            removed: bool = False
+        ):
+        self.payment_id = payment_id
+        self.tariff_id = tariff_id
+        self.sender = sender
+        self.amount_wei = amount_wei
+        self.timestamp = timestamp
+        self.block_number = block_number
+        self.block_hash = block_hash
+        self.log_index = log_index
+        self.tx_hash = tx_hash
+        self.removed = removed
+
+    @property
+    def key(self) -> tuple[str, int]:
+        """Идентификатор лога в цепи."""
+        return self.tx_hash, self.log_index
+
+    @property
+    def from_address(self) -> str:
+        return Web3.to_checksum_address(self.sender)
+
+    @property
+    def amount_eth(self) -> Decimal:
+        return Web3.from_wei(self.amount_wei, "ether")
+
+    def __repr__(self) -> str:
+        return (
+            f"PaymentEvent(payment_id={self.payment_id}, block={self.block_number}, "
+            f"tx={self.tx_hash}, log_index={self.log_index}, removed={self.removed})"
+        )
+
+
+class PaymentLogDecoder:
+    """
+    Разбирает лог PaymentReceived(bytes32 indexed paymentId, bytes32 indexed tariffId,
+    address indexed from, uint256 amount, uint256 timestamp) без ABI-машинерии web3:
+    индексированные поля - это topics[1..3] как есть, данные - два 32-байтных слова подряд.
+    Лог с чужим topic0 или неожиданной формой отбрасывается.
+    """
+    EVENT_NAME = "PaymentReceived"
+    ARG_TYPES = ("bytes32", "bytes32", "address", "uint256", "uint256")
+    INDEXED = (True, True, True, False, False)
+
+    def __init__(self, topic: bytes):
+        self.topic = topic
+
+    @classmethod
+    def from_abi(cls, abi: list) -> "PaymentLogDecoder":
+        """Находит событие в ABI, сверяет сигнатуру и вычисляет topic0."""
+        for item in abi:
+            if item.get("type") == "event" and item.get("name") == cls.EVENT_NAME:
+                arg_types = tuple(arg["type"] for arg in item["inputs"])
+                indexed = tuple(bool(arg.get("indexed")) for arg in item["inputs"])
+                if arg_types != cls.ARG_TYPES or indexed != cls.INDEXED:
+                    raise ValueError(f"Unexpected {cls.EVENT_NAME} signature in ABI: {arg_types}")
+                signature = f"{cls.EVENT_NAME}({','.join(arg_types)})"
+                return cls(topic=bytes(Web3.keccak(text=signature)))
+        raise ValueError(f"Event {cls.EVENT_NAME} not found in ABI")
+
+    @property
+    def topic_hex(self) -> str:
+        return "0x" + self.topic.hex()
+
+    def decode(self, log: Any) -> Optional[PaymentEvent]:
+        topics = log["topics"]
+        if len(topics) != 4 or _as_bytes(topics[0]) != self.topic:
+            return None
+        data = _as_bytes(log["data"])
+        if len(data) != 64:
+            return None
+        return PaymentEvent(
+            payment_id=_as_bytes(topics[1]).hex(),
+            tariff_id=_as_bytes(topics[2]).hex(),
+            sender=_as_bytes(topics[3])[12:],
+            amount_wei=int.from_bytes(data[:32], "big"),
+            timestamp=int.from_bytes(data[32:], "big"),
+            block_number=_as_int(log["blockNumber"]),
+            block_hash="0x" + _as_bytes(log["blockHash"]).hex(),
+            log_index=_as_int(log["logIndex"]),
+            tx_hash=_as_bytes(log["transactionHash"]).hex(),
+            removed=bool(log.get("removed", False)),
+        )
+
+    def decode_many(self, logs: list) -> list[PaymentEvent]:
+        decode = self.decode
+        return [event for event in map(decode, logs) if event is not None]
@@ -0,0 +1,199 @@
+""" Пул RPC-эндпоинтов с выбором по задержке и ошибкам и хеджированием медленных запросов """
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from web3 import AsyncWeb3
+from web3.exceptions import Web3RPCError
+from web3.providers import AsyncHTTPProvider
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+RpcCall = Callable[[AsyncWeb3], Awaitable[T]]
+
+
+def is_query_error(error: BaseException) -> bool:
+    """
+    Узел ответил JSON-RPC ошибкой с кодом ("query returned more than 10000 results", лимит
+    диапазона, revert): запрос плох сам по себе, другой эндпоинт ответит так же.
+    Эндпоинт при этом здоров - штрафовать его и дублировать запрос незачем.
+    """
+    if isinstance(error, Web3RPCError):
+        rpc_error = (error.rpc_response or {}).get("error")
+    elif isinstance(error, ValueError) and error.args:
+        # Так ошибки ответа отдавали версии web3 до Web3RPCError
+        rpc_error = error.args[0]
+    else:
+        return False
+    return isinstance(rpc_error, dict) and "code" in rpc_error
+
+
+class RpcEndpoint:
+    """Один RPC-провайдер и его статистика: EWMA задержки и доли ошибок, последние задержки для перцентилей."""
+    def __init__(self, url: str, w3: AsyncWeb3, alpha: float = 0.2, window: int = 100):
+        self.url = url
+        self.w3 = w3
+        self.alpha = alpha
+
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    @property
+    def score(self) -> float:
+        """Меньше - лучше. Неопробованный эндпоинт считается быстрым, чтобы получить первые замеры."""
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency + 0.05 * self.in_flight) * (1 + 10 * self.error_rate)
+
+    def observe(self, latency: float, ok: bool, cooldown: float = 0.0):
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            self._latencies.append(latency)
+        elif cooldown:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        values = sorted(self._latencies)
+        return values[min(len(values) - 1, int(len(values) * quantile))]
+
+
+class RpcPool:
+    """
+    Отправляет вызов на лучший здоровый эндпоинт, при ошибке - на следующий.
+    Упавший эндпоинт отдыхает cooldown секунд. call_hedged для тяжелых запросов
+    (eth_getLogs): если ответ не пришел за перцентиль hedge_quantile обычной задержки
+    эндпоинта, тот же запрос уходит на второй эндпоинт и побеждает первый ответ.
+    Ошибка самого запроса (is_query_error) сразу уходит вызывающему: ее не повторяют
+    на других эндпоинтах и не засчитывают эндпоинту - разбираться с ней должен вызывающий,
+    например делить диапазон eth_getLogs.
+    """
+    def __init__(
+            self,
+            endpoints: list[RpcEndpoint],
+            hedge_quantile: float = 0.9,
+            hedge_min_delay: float = 0.05,
+            cooldown: float = 5.0
+        ):
+        if not endpoints:
+            raise ValueError("RpcPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.cooldown = cooldown
+
+    @classmethod
+    def from_urls(cls, urls: list[str], **kwargs) -> "RpcPool":
+        endpoints = []
+        for url in urls:
+            # Повторы делает сам пул на другом эндпоинте: собственные ретраи провайдера с паузами
+            # задержали бы переключение на секунды
+            w3 = AsyncWeb3(AsyncHTTPProvider(url, exception_retry_configuration=None))
+            # Автодополнение нулями неправильных bytes переменных
+            w3.strict_bytes_type_checking = False
+            endpoints.append(RpcEndpoint(url, w3))
+        return cls(endpoints, **kwargs)
+
+    @property
+    def primary(self) -> AsyncWeb3:
+        return self.endpoints[0].w3
+
+    def ranked(self) -> list[RpcEndpoint]:
+        """Здоровые по score, за ними отдыхающие - на случай, если упали все."""
+        return sorted(self.endpoints, key=lambda endpoint: (not endpoint.healthy, endpoint.score))
+
+    async def call(self, fn: RpcCall[T]) -> T:
+        error: Optional[Exception] = None
+        for endpoint in self.ranked():
+            try:
+                return await self._call(endpoint, fn)
+            except Exception as e:
+                if is_query_error(e):
+                    raise
+                error = e
+                logger.warning(f"RPC call to {endpoint.url} failed: {e}")
+        raise error
+
+    async def call_hedged(self, fn: RpcCall[T]) -> T:
+        ranked = self.ranked()
+        if len(ranked) < 2 or not ranked[1].healthy:
+            return await self.call(fn)
+
+        primary, backup = ranked[0], ranked[1]
+        delay = max(self.hedge_min_delay, primary.latency_quantile(self.hedge_quantile) or 0.0)
+        first = asyncio.create_task(self._call(primary, fn))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done and first.exception() is not None and is_query_error(first.exception()):
+                raise first.exception()
+            if not done or first.exception() is not None:
+                # Основной медлит или упал сам - дублируем запрос на второй
+                tasks.add(asyncio.create_task(self._call(backup, fn)))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    if is_query_error(error):
+                        raise error
+            # Оба упали - пробуем остальные эндпоинты по очереди
+            for endpoint in ranked[2:]:
+                try:
+                    return await self._call(endpoint, fn)
+                except Exception as e:
+                    if is_query_error(e):
+                        raise
+                    error = e
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call(self, endpoint: RpcEndpoint, fn: RpcCall[T]) -> T:
+        started = time.monotonic()
+        endpoint.in_flight += 1
+        try:
+            result = await fn(endpoint.w3)
+        except asyncio.CancelledError:
+            # Проигравший хедж - не ошибка эндпоинта
+            raise
+        except Exception as e:
+            # Ошибка запроса - ответ здорового эндпоинта, но не замер его обычной задержки
+            if not is_query_error(e):
+                endpoint.observe(time.monotonic() - started, ok=False, cooldown=self.cooldown)
+            raise
+        else:
+            endpoint.observe(time.monotonic() - started, ok=True)
+            return result
+        finally:
+            endpoint.in_flight -= 1
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.w3.provider.disconnect()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "url": endpoint.url,
+                "latency": endpoint.latency,
+                "error_rate": round(endpoint.error_rate, 3),
+                "healthy": endpoint.healthy,
+            }
+            for endpoint in self.endpoints
+        ]
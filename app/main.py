@@ -22,12 +22,24 @@ async def lifespan(app: FastAPI):
     
     # Билдим образ контейнера сервисов
     app.state.service_container = ServicesContainer(infra=app.state.infra, settings=settings)
+    
+    # Поднимаем пул процессов для рендеринга QR-кодов и наполнитель пула платежей
+    await app.state.service_container.qr_render_executor.start()
+    await app.state.service_container.intent_pool.start()
+    
+    # Подписка на межворкерные уведомления: сброс кеша тарифов, оплата платежей
+    await app.state.service_container.payment_events.start()
+    await app.state.infra.pubsub.start()
 
     yield
     
     # Shutdown
     
-    # Закрываем соединения
+    # Останавливаем фоновые задачи и закрываем соединения
+    await app.state.service_container.payment_events.close()
+    await app.state.infra.pubsub.close()
+    await app.state.service_container.intent_pool.close()
+    await app.state.service_container.qr_render_executor.close()
     await app.state.infra.db_helper.close()
     
 app = FastAPI(title="QR-Blockchain Server", version="1.0.0", lifespan=lifespan)
@@ -1,7 +1,9 @@
 ''' Модуль для объединения всех роутов '''
 from fastapi import APIRouter
 
+from app.presentation.api.links import router as links_router
 from app.presentation.api.payments import router as payments_router
+from app.presentation.api.poller import router as poller_router
 from app.presentation.api.tariffs import router as tariffs_router
 
 router = APIRouter()
@@ -11,4 +13,6 @@ async def root():
     return {"message": "QR-Blockchain Server is running"}
 
 router.include_router(payments_router)
-router.include_router(tariffs_router)
\ No newline at end of file
+router.include_router(tariffs_router)
+router.include_router(links_router)
+router.include_router(poller_router)
\ No newline at end of file
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Path, Request
+from fastapi.responses import RedirectResponse
+
+from app.application.container import ServicesContainer
+
+router = APIRouter(prefix="/p", tags=["links"])
+
+def get_container(request: Request) -> ServicesContainer:
+    return request.app.state.service_container 
+
+@router.get("/{code}")
+async def resolve_short_link(
+    code: str = Path(..., pattern=r"^[A-Za-z0-9_-]{12}$"), 
+    container: ServicesContainer = Depends(get_container)
+):
+    """Перенаправляет с короткой ссылки из QR-кода на ссылку оплаты MetaMask."""
+    short_links = container.short_links
+    url = await short_links.resolve(code)
+    return RedirectResponse(url, status_code=302)
@@ -1,5 +1,5 @@
 '''DTO для API'''
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -72,6 +72,22 @@ class TariffRead(TariffCreate):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TariffBulkUpsertRequest(BaseModel):
+    """Модель для синхронизации каталога тарифов"""
+    tariffs: list[TariffCreate] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Тарифы для создания или обновления по имени"
+    )
+    
+    @field_validator('tariffs')
+    @classmethod
+    def validate_unique_names(cls, v):
+        # Одна строка в INSERT ... ON CONFLICT не может обновиться дважды - последний выигрывает
+        return list({tariff.name: tariff for tariff in v}.values())
+
+
 class TariffUpdateRequest(BaseModel):
     """Модель для обновления тарифа"""
     name: Optional[str] = Field(
@@ -131,6 +147,28 @@ class PaymentCheckResponse(BaseModel):
     """Модель ответа при проверке платежа"""
     token: Optional[str] = Field(None, description="Токен доступа")
 
+class PaymentCheckBatchRequest(BaseModel):
+    """Модель запроса пакетной проверки платежей"""
+    payment_ids: list[UUID] = Field(
+        ...,
+        min_length=1,
+        max_length=500,
+        description="Идентификаторы платежей"
+    )
+
+
+class PaymentStatus(BaseModel):
+    """Статус одного платежа в пакетной проверке"""
+    status: Literal["paid", "pending", "expired"] = Field(
+        ..., description="Оплачен, ждет оплаты или уже не ждет: истек или не выдавался"
+    )
+    token: Optional[str] = Field(None, description="Токен доступа, если платеж оплачен")
+
+
+class PaymentCheckBatchResponse(BaseModel):
+    """Модель ответа пакетной проверки платежей"""
+    payments: dict[UUID, PaymentStatus] = Field(..., description="Статусы по идентификатору платежа")
+
 # ==================== QR CODE MODELS ====================
 
 class QRCodeQuery(BaseModel):
@@ -147,10 +185,52 @@ class QRCodeQuery(BaseModel):
         max_length=255,
         description="Название тарифа"
     )
+    format: Literal["png", "svg"] = Field(
+        "png",
+        description="Формат изображения QR-кода"
+    )
+    
+    @field_validator('tariff_name')
+    @classmethod
+    def validate_tariff_name(cls, v):
+        if not v.strip():
+            raise ValueError('tariff_name не может быть пустым')
+        return v.strip()
+
+class QRCodeBatchQuery(BaseModel):
+    """Модель для пакетного запроса QR кодов"""
+    user_ids: list[int] = Field(
+        ...,
+        min_length=1,
+        max_length=5000,
+        description="Telegram user IDs"
+    )
+    tariff_name: str = Field(
+        ..., 
+        min_length=1, 
+        max_length=255,
+        description="Название тарифа"
+    )
+    format: Literal["png", "svg"] = Field(
+        "png",
+        description="Формат изображений QR-кодов"
+    )
+    output: Literal["zip", "ndjson"] = Field(
+        "zip",
+        description="Формат ответа: ZIP-архив или NDJSON с base64"
+    )
+    
+    @field_validator('user_ids')
+    @classmethod
+    def validate_user_ids(cls, v):
+        if any(user_id < 1 or user_id > 9223372036854775807 for user_id in v):
+            raise ValueError('user_ids должны быть положительными Telegram user ID')
+        # Убираем повторы, сохраняя порядок
+        return list(dict.fromkeys(v))
     
     @field_validator('tariff_name')
     @classmethod
     def validate_tariff_name(cls, v):
         if not v.strip():
             raise ValueError('tariff_name не может быть пустым')
-        return v.strip()
\ No newline at end of file
+        return v.strip()
@@ -1,10 +1,23 @@
+from typing import Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 from app.application.container import ServicesContainer
-from app.presentation.api.models import PaymentCheckResponse, QRCodeQuery
+from app.application.models import FailedQRCode
+from app.application.services.payment_events import PaymentEventsHub
+from app.application.services.qr_encoder import MEDIA_TYPES
+from app.presentation.api.http_cache import etag_matches
+from app.presentation.api.models import (
+    PaymentCheckBatchRequest,
+    PaymentCheckBatchResponse,
+    PaymentCheckResponse,
+    PaymentStatus,
+    QRCodeBatchQuery,
+    QRCodeQuery,
+)
+from app.presentation.api.streams import b64, ndjson_stream, zip_stream
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
@@ -16,26 +29,158 @@ async def check_payment(payment_id: UUID, container: ServicesContainer = Depends
     """ Проверяет факт платежа из БД и возвращает токен"""
     payment_service = container.payment_processor
     
-    return PaymentCheckResponse(payment_service.check_payment(payment_id))
+    token = await payment_service.check_payment(payment_id)
+    return PaymentCheckResponse(token=token)
+
+@router.post("/check", response_model=PaymentCheckBatchResponse)
+async def check_payments(query: PaymentCheckBatchRequest, container: ServicesContainer = Depends(get_container)):
+    """ Проверяет пачку платежей за один запрос и возвращает статусы с токенами"""
+    payment_service = container.payment_processor
+    
+    tokens = await payment_service.check_payments(query.payment_ids)
+    pending = await container.transaction_service.pending_payments(
+        [payment_id for payment_id, token in tokens.items() if not token]
+    )
+    return PaymentCheckBatchResponse(payments={
+        payment_id: PaymentStatus(
+            status="paid" if token else "pending" if payment_id in pending else "expired",
+            token=token
+        )
+        for payment_id, token in tokens.items()
+    })
+
+@router.get("/{payment_id}/events")
+async def payment_events(payment_id: UUID, container: ServicesContainer = Depends(get_container)):
+    """
+    Server-Sent Events об оплате: keepalive-комментарии, пока платеж не оплачен,
+    затем событие paid с токеном. Событие expired - платеж так и не оплатили.
+    Платеж, который уже не ждет оплаты (истек или не выдавался), - 404 без открытия потока.
+    """
+    status, _ = await container.payment_events.status(payment_id)
+    if status == PaymentEventsHub.EXPIRED:
+        raise HTTPException(status_code=404, detail="Платеж не найден или истек")
+    watch = container.payment_events.watch(payment_id)
+    
+    async def events():
+        async for token in watch:
+            if token is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: paid\ndata: {PaymentCheckResponse(token=token).model_dump_json()}\n\n"
+                return
+        yield "event: expired\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/{payment_id}/ws")
+async def payment_events_ws(websocket: WebSocket, payment_id: UUID):
+    """
+    WebSocket-вариант /events: сообщения status pending/paid/expired в JSON.
+    Платеж, который уже не ждет оплаты, сразу получает expired - без единого pending.
+    """
+    container: ServicesContainer = websocket.app.state.service_container
+    status, _ = await container.payment_events.status(payment_id)
+    await websocket.accept()
+    try:
+        if status == PaymentEventsHub.EXPIRED:
+            await websocket.send_json({"status": "expired"})
+            await websocket.close()
+            return
+        async for token in container.payment_events.watch(payment_id):
+            if token is None:
+                await websocket.send_json({"status": "pending"})
+            else:
+                await websocket.send_json({"status": "paid", "token": token})
+                break
+        else:
+            await websocket.send_json({"status": "expired"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 # TODO: переделать под GET
 @router.post("/qr-code")
-async def get_qr_code_image(query: QRCodeQuery, container: ServicesContainer = Depends(get_container)):
+async def get_qr_code_image(
+    query: QRCodeQuery,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    container: ServicesContainer = Depends(get_container)
+):
     """Генерирует QR-код для указанного пользователем тарифа."""
-    transaction_service = container.transaction_service
-    qr_service = container.qr_service
-    tariffs_service = container.tariffs_service
+    payment_intents = container.payment_intents
     
-    tariff = await tariffs_service.get_by_name(query.tariff_name)
-    data = await transaction_service.create_transaction_redis(query.user_id, tariff)
+    issued = await payment_intents.issue_qr_code(
+        query.user_id, query.tariff_name, image_format=query.format, idempotency_key=idempotency_key
+    )
     
-    url = qr_service.build_qr_payload(data=data)
-    qr_image = qr_service.generate_qr_code_image(url=url)
+    return Response(
+        content=issued.image,
+        media_type=MEDIA_TYPES[query.format],
+        headers={
+            "Content-Disposition": f"attachment; filename=qr_code_{query.user_id}_{query.tariff_name}.{query.format}",
+            "ETag": issued.etag,
+            "X-Payment-ID": str(issued.transaction.payment_id),
+        }
+    )
+
+@router.post("/qr-code/batch")
+async def get_qr_code_batch(query: QRCodeBatchQuery, container: ServicesContainer = Depends(get_container)):
+    """Генерирует QR-коды тарифа для пачки пользователей и отдает их потоком."""
+    payment_intents = container.payment_intents
+    
+    # Тариф и платежи создаются до начала ответа, чтобы ошибки вернулись обычным статусом
+    prepared = await payment_intents.prepare_batch(query.user_ids, query.tariff_name)
+    issued = payment_intents.render_batch(prepared, image_format=query.format)
     
+    if query.output == "ndjson":
+        items = (
+            {
+                "user_id": item.transaction.user_id,
+                "payment_id": item.transaction.payment_id,
+                "format": item.image_format,
+                **({"error": item.error} if isinstance(item, FailedQRCode) else {"image": b64(item.image)}),
+            }
+            async for item in issued
+        )
+        return StreamingResponse(ndjson_stream(items), media_type="application/x-ndjson")
+    
+    # Вместо неотрендеренного изображения в архив кладется файл .error.txt с причиной
+    files = (
+        (
+            f"qr_code_{item.transaction.user_id}_{item.transaction.payment_id}.{item.image_format}.error.txt",
+            item.error.encode(),
+        )
+        if isinstance(item, FailedQRCode) else
+        (f"qr_code_{item.transaction.user_id}_{item.transaction.payment_id}.{item.image_format}", item.image)
+        async for item in issued
+    )
     return StreamingResponse(
-        qr_image,
-        media_type="image/png",
+        zip_stream(files),
+        media_type="application/zip",
         headers={
-            "Content-Disposition": f"attachment; filename=qr_code_{query.user_id}_{query.tariff_name}.png"
+            "Content-Disposition": f"attachment; filename=qr_codes_{query.tariff_name}.zip"
         }
     )
+
+@router.get("/{payment_id}/qr")
+async def get_payment_qr_code(
+    payment_id: UUID,
+    format: Literal["png", "svg"] = "png",
+    if_none_match: Optional[str] = Header(None),
+    container: ServicesContainer = Depends(get_container)
+):
+    """Повторно отдает QR-код существующего неоплаченного платежа из кеша."""
+    payment_intents = container.payment_intents
+    
+    cached = await payment_intents.get_qr_code(payment_id, image_format=format)
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": f"private, max-age={cached.ttl}",
+    }
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=cached.image, media_type=MEDIA_TYPES[format], headers=headers)
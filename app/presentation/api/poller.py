@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from app.application.container import ServicesContainer
+
+router = APIRouter(prefix="/poller", tags=["poller"])
+
+def get_container(request: Request) -> ServicesContainer:
+    return request.app.state.service_container 
+
+@router.get("/metrics")
+async def get_poller_metrics(container: ServicesContainer = Depends(get_container)):
+    """Последний снимок метрик поллера: время до подтверждения платежей, реорганизации и т.п."""
+    snapshot = await container.poller_metrics.load()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Поллер давно не публиковал метрики")
+    return snapshot
@@ -0,0 +1,47 @@
+''' Потоковая выдача пачек файлов: ZIP-архив и NDJSON '''
+import base64
+import json
+from typing import AsyncIterator
+import zipfile
+
+
+class _ChunkWriter:
+    """Файлоподобный буфер без seek/tell: zipfile пишет в него, а мы забираем куски."""
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def zip_stream(files: AsyncIterator[tuple[str, bytes]]) -> AsyncIterator[bytes]:
+    """
+    Отдает ZIP-архив по мере поступления файлов. Архив без сжатия: PNG уже сжат,
+    а для непозиционируемого потока zipfile сам пишет data descriptor после каждого файла.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for name, content in files:
+            archive.writestr(name, content)
+            yield writer.drain()
+    # Центральный каталог дописывается при закрытии архива
+    yield writer.drain()
+
+
+async def ndjson_stream(items: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Отдает по одному JSON-объекту на строку."""
+    async for item in items:
+        yield json.dumps(item, default=str).encode() + b"\n"
+
+
+def b64(content: bytes) -> str:
+    return base64.b64encode(content).decode()
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import Response
 
 from app.application.container import ServicesContainer
+from app.config import settings
+from app.presentation.api.http_cache import etag_matches
 from app.presentation.api.models import (
     TariffActivateQuery,
+    TariffBulkUpsertRequest,
     TariffCreate,
     TariffDeleteResponse,
     TariffRead,
@@ -20,18 +26,49 @@ async def create_tariff(tariff: TariffCreate, container: ServicesContainer = Dep
     tariffs_service = container.tariffs_service
     return await tariffs_service.create(tariff)
 
+@router.put("/bulk", response_model=list[TariffRead])
+async def bulk_upsert_tariffs(request: TariffBulkUpsertRequest, container: ServicesContainer = Depends(get_container)):
+    """Создает или обновляет по имени пачку тарифов одним запросом к БД."""
+    tariffs_service = container.tariffs_service
+    return await tariffs_service.bulk_upsert(request.tariffs)
+
+def _catalogue_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.tariffs_http_max_age}, must-revalidate",
+    }
+
 @router.get("/", response_model=list[TariffRead])
-async def all_tariffs(container: ServicesContainer = Depends(get_container)):
+async def all_tariffs(
+    if_none_match: Optional[str] = Header(None), 
+    container: ServicesContainer = Depends(get_container)
+):
+    """Каталог тарифов: готовый JSON-снимок текущей версии или 304, если версия не менялась."""
     tariffs_service = container.tariffs_service
-    return await tariffs_service.get_all()
+    version = await tariffs_service.catalogue_version()
+    headers = _catalogue_headers(f'"tariffs-v{version}"')
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    snapshot = await tariffs_service.catalogue_snapshot(version)
+    return Response(content=snapshot, media_type="application/json", headers=headers)
 
 @router.get("/{name}", response_model=TariffRead)
-async def get_tariff_by_name(name: str, container: ServicesContainer = Depends(get_container)):
+async def get_tariff_by_name(
+    name: str, 
+    if_none_match: Optional[str] = Header(None), 
+    container: ServicesContainer = Depends(get_container)
+):
     tariffs_service = container.tariffs_service
-    tariff = await tariffs_service.get_by_name(name)
-    if not tariff:
+    version = await tariffs_service.catalogue_version()
+    headers = _catalogue_headers(f'"tariffs-v{version}"')
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    snapshot = await tariffs_service.tariff_snapshot(version, name)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Тариф не найден")
-    return tariff
+    return Response(content=snapshot, media_type="application/json", headers=headers)
 
 @router.patch("/{name}", response_model=TariffUpdateResponse)
 async def update_tariff(name: str, tariff_data: TariffUpdateRequest, container: ServicesContainer = Depends(get_container)):
@@ -0,0 +1,57 @@
+""" user-004: calldata payForTariff через encode_abi против предкомпилированного энкодера """
+import json
+from pathlib import Path
+import uuid
+
+from web3 import Web3
+
+from benchmarks import per_call, print_table
+from app.application.services.qr_renderer import render_qr
+from app.infrastructure.calldata import PayForTariffEncoder
+from app.infrastructure.models import ContractData
+
+ABI = json.loads((Path(__file__).parent.parent / "app" / "abi.json").read_text())
+PRICE = 10**16
+BATCH = 1000
+
+
+def payment_url(calldata: str) -> str:
+    return f"https://metamask.app.link/send/0x{'11' * 20}@1?value={PRICE}&data={calldata}"
+
+
+def main():
+    w3 = Web3()
+    w3.strict_bytes_type_checking = False
+    contract = w3.eth.contract(abi=ABI)
+    encoder = PayForTariffEncoder.from_abi(ABI)
+    tariff_id = uuid.uuid4()
+    batch = [ContractData(paymentId=uuid.uuid4(), tariffId=tariff_id, price=PRICE) for _ in range(BATCH)]
+    data = batch[0]
+
+    def encode_abi(item: ContractData = data) -> str:
+        # Прежний build_calldata без двух print: keccak обоих хешей на каждый вызов и encode_abi
+        payment_hash = Web3.keccak(text=str(item.paymentId)).hex()
+        tariff_hash = Web3.keccak(text=str(item.tariffId)).hex()
+        return contract.encode_abi("payForTariff", args=[payment_hash, tariff_hash, item.price])
+
+    old = per_call(encode_abi, 2000)
+    new = per_call(lambda: encoder.encode(data), 2000)
+    many = per_call(lambda: encoder.encode_many(batch), 20) / BATCH
+    print_table(["calldata", "us/call", "speedup"], [
+        ["encode_abi", f"{old * 1e6:.1f}", "1.0x"],
+        ["PayForTariffEncoder.encode", f"{new * 1e6:.1f}", f"{old / new:.0f}x"],
+        [f"encode_many (batch {BATCH}), per item", f"{many * 1e6:.1f}", f"{old / many:.0f}x"],
+    ])
+
+    # Задержка выдачи QR целиком: calldata, ссылка и рендер PNG
+    old_issue = per_call(lambda: render_qr(payment_url(encode_abi())), 30)
+    new_issue = per_call(lambda: render_qr(payment_url(encoder.encode(data))), 30)
+    print()
+    print_table(["QR issue (calldata + URL + PNG)", "ms"], [
+        ["with encode_abi", f"{old_issue * 1000:.2f}"],
+        ["with PayForTariffEncoder", f"{new_issue * 1000:.2f}"],
+    ])
+
+
+if __name__ == "__main__":
+    main()
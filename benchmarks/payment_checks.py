@@ -0,0 +1,80 @@
+""" user-012: запросов в Postgres на одну проверку /payments/{id}/check до и после кеша статусов в Redis """
+import asyncio
+import random
+import time
+import uuid
+
+import fakeredis
+
+from benchmarks import print_table
+from app.application.services.payment_processor import PaymentProcessor
+from app.infrastructure.db.redis.repositories import PaymentStatusRepository
+
+WAITING = 200            # клиентов ждут подтверждения: платежа в Postgres еще нет
+SETTLED = 50             # клиентов продолжают опрос уже оплаченного платежа
+POLL_INTERVAL = 0.5      # секунд между опросами одного клиента
+DURATION = 6.0           # секунд опроса
+DB_ROUND_TRIP = 0.001    # секунд на SELECT в Postgres
+
+
+class CountingTransactionsRepository:
+    """Postgres вместо TransactionsRepository: считает запросы, каждый - один round trip."""
+    def __init__(self, paid: set):
+        self.paid = paid
+        self.queries = 0
+
+    async def find(self, payment_id):
+        self.queries += 1
+        await asyncio.sleep(DB_ROUND_TRIP)
+        return object() if payment_id in self.paid else None
+
+    async def find_existing(self, payment_ids: list) -> set:
+        self.queries += 1
+        await asyncio.sleep(DB_ROUND_TRIP)
+        return {payment_id for payment_id in payment_ids if payment_id in self.paid}
+
+
+async def poll(check, payment_ids: list, checks: list):
+    deadline = time.monotonic() + DURATION
+    async def client(payment_id):
+        # Клиенты начинают опрос вразнобой, как и в жизни
+        await asyncio.sleep(random.uniform(0, POLL_INTERVAL))
+        while time.monotonic() < deadline:
+            await check(payment_id)
+            checks.append(payment_id)
+            await asyncio.sleep(POLL_INTERVAL)
+    await asyncio.gather(*(client(payment_id) for payment_id in payment_ids))
+
+
+async def run(cached: bool) -> tuple[int, int]:
+    paid = {uuid.uuid4() for _ in range(SETTLED)}
+    payment_ids = [uuid.uuid4() for _ in range(WAITING)] + list(paid)
+    repo = CountingTransactionsRepository(paid)
+    checks = []
+    if cached:
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True, max_connections=WAITING + SETTLED)
+        status_repo = PaymentStatusRepository(redis)
+        # Оплаченные платежи поллер уже отметил при переносе
+        await status_repo.mark_settled(list(paid), expire_seconds=3600)
+        processor = PaymentProcessor(repo, status_repo)
+        await poll(processor.check_payment, payment_ids, checks)
+    else:
+        # Прежний check_payment: каждый опрос - SELECT по payment_id
+        await poll(repo.find, payment_ids, checks)
+    return len(checks), repo.queries
+
+
+async def main():
+    rows = []
+    for name, cached in [("before: find per check", False), ("after: Redis status + negative cache", True)]:
+        checks, queries = await run(cached)
+        rows.append([name, checks, queries, f"{queries / checks:.3f}", f"{queries / DURATION:.0f}"])
+    print(
+        f"{WAITING} waiting + {SETTLED} settled payments, poll every {POLL_INTERVAL}s for {DURATION}s, "
+        f"negative TTL {PaymentProcessor(None, None).negative_ttl_seconds}s"
+    )
+    print_table(["/payments/{id}/check", "checks", "DB queries", "queries/check", "DB queries/s"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+""" user-024: декодирование 100k логов PaymentReceived - PaymentLogDecoder против process_log web3 """
+import json
+from pathlib import Path
+import random
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from benchmarks import per_call, print_table
+from app.infrastructure.payment_log import PaymentLogDecoder
+
+ABI = json.loads((Path(__file__).parent.parent / "app" / "abi.json").read_text())
+CONTRACT_ADDRESS = Web3.to_checksum_address("0x" + "11" * 20)
+LOGS = 100_000
+
+
+def make_logs(topic: bytes) -> list[dict]:
+    """Логи в том виде, в каком их отдает get_logs через HTTP: поля уже HexBytes и int."""
+    rng = random.Random(0)
+    return [
+        {
+            "address": CONTRACT_ADDRESS,
+            "topics": [
+                HexBytes(topic),
+                HexBytes(rng.randbytes(32)),
+                HexBytes(rng.randbytes(32)),
+                HexBytes(bytes(12) + rng.randbytes(20)),
+            ],
+            "data": HexBytes(rng.randrange(10**21).to_bytes(32, "big") + rng.getrandbits(40).to_bytes(32, "big")),
+            "blockNumber": rng.randrange(10**8),
+            "blockHash": HexBytes(rng.randbytes(32)),
+            "logIndex": rng.randrange(500),
+            "transactionHash": HexBytes(rng.randbytes(32)),
+            "transactionIndex": rng.randrange(300),
+            "removed": False,
+        }
+        for _ in range(LOGS)
+    ]
+
+
+def as_subscription_message(log: dict) -> dict:
+    """То же событие из подписки без форматирования: все поля - 0x-строки."""
+    return {
+        **log,
+        "topics": [topic.to_0x_hex() for topic in log["topics"]],
+        "data": log["data"].to_0x_hex(),
+        "blockNumber": hex(log["blockNumber"]),
+        "blockHash": log["blockHash"].to_0x_hex(),
+        "logIndex": hex(log["logIndex"]),
+        "transactionHash": log["transactionHash"].to_0x_hex(),
+        "transactionIndex": hex(log["transactionIndex"]),
+    }
+
+
+def main():
+    decoder = PaymentLogDecoder.from_abi(ABI)
+    payment_event = Web3().eth.contract(address=CONTRACT_ADDRESS, abi=ABI).events.PaymentReceived()
+    logs = make_logs(decoder.topic)
+    messages = [as_subscription_message(log) for log in logs]
+
+    def process_log(batch=logs):
+        # Прежний AsyncWeb3Service._parse_log: process_log, .hex() на каждое поле и from_wei
+        parsed = []
+        for log in batch:
+            event = payment_event.process_log(log)
+            args = event["args"]
+            parsed.append({
+                "payment_id": args["paymentId"].hex(),
+                "from_address": args["from"],
+                "amount_wei": args["amount"],
+                "amount_eth": Web3.from_wei(args["amount"], "ether"),
+                "timestamp": args["timestamp"],
+                "block_number": event["blockNumber"],
+                "block_hash": event["blockHash"].to_0x_hex(),
+                "log_index": event["logIndex"],
+                "tx_hash": event["transactionHash"].hex()
+            })
+        return parsed
+
+    old = per_call(process_log, 1, repeat=1)  # ~50 с на проход
+    new = per_call(lambda: decoder.decode_many(logs), 1, repeat=3)
+    raw = per_call(lambda: decoder.decode_many(messages), 1, repeat=3)
+    # Поллеру сумма в ETH и checksum-адрес не нужны, но если их прочитать - вот цена
+    lazy = per_call(lambda: [(e.amount_eth, e.from_address) for e in decoder.decode_many(logs)], 1, repeat=3)
+
+    print(f"{LOGS} PaymentReceived logs")
+    print_table(["decoder", "s / 100k", "us/log", "speedup"], [
+        ["process_log + dict (before)", f"{old:.2f}", f"{old / LOGS * 1e6:.2f}", "1.0x"],
+        ["decode_many, HexBytes (get_logs)", f"{new:.2f}", f"{new / LOGS * 1e6:.2f}", f"{old / new:.0f}x"],
+        ["decode_many, 0x strings (subscription)", f"{raw:.2f}", f"{raw / LOGS * 1e6:.2f}", f"{old / raw:.0f}x"],
+        ["decode_many + amount_eth + from_address", f"{lazy:.2f}", f"{lazy / LOGS * 1e6:.2f}", f"{old / lazy:.0f}x"],
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+""" user-019: пропускная способность обработки очереди PaymentPoller при 1/4/16 обработчиках """
+import asyncio
+import os
+from types import SimpleNamespace
+import time
+
+from benchmarks import print_table
+from app.application.services.blockchain_listener import PaymentPoller
+from app.application.services.block_checkpoint import BlockCheckpoint
+from app.application.services.poller_metrics import PollerMetrics
+from app.infrastructure.payment_log import PaymentEvent
+
+EVENTS = 4000
+EVENTS_PER_BLOCK = 4
+# Перенос пачки: MGET в Redis, многострочный INSERT в Postgres, удаление и статусы в Redis
+REDIS_ROUND_TRIP = 0.0005
+PG_ROUND_TRIP = 0.002
+PG_PER_ROW = 0.00002
+
+
+class SimulatedTransactionService:
+    """Вместо TransactionService: задержки сети вместо Redis и Postgres, платежи считаются."""
+    def __init__(self):
+        self.migrated = 0
+
+    async def migrate_transactions(self, payment_hashes: list[str]) -> list:
+        await asyncio.sleep(REDIS_ROUND_TRIP)
+        await asyncio.sleep(PG_ROUND_TRIP + PG_PER_ROW * len(payment_hashes))
+        await asyncio.sleep(3 * REDIS_ROUND_TRIP)
+        self.migrated += len(payment_hashes)
+        return []
+
+
+def make_events() -> list[PaymentEvent]:
+    return [
+        PaymentEvent(
+            payment_id=os.urandom(32).hex(), tariff_id="00" * 32, sender=b"\x11" * 20, amount_wei=10**16,
+            timestamp=0, block_number=1000 + i // EVENTS_PER_BLOCK, block_hash="0x" + "ab" * 32,
+            log_index=i % EVENTS_PER_BLOCK, tx_hash=os.urandom(32).hex(),
+        )
+        for i in range(EVENTS)
+    ]
+
+
+async def measure(workers: int, batch_size: int) -> float:
+    settings = SimpleNamespace(
+        poller_workers=workers, poller_batch_size=batch_size, poller_batch_wait_ms=20.0,
+        poller_queue_size=10000, poller_retry_max_seconds=30.0, blockchain_confirmations=0,
+    )
+    service = SimulatedTransactionService()
+    checkpoint = BlockCheckpoint(checkpoint_repo=None, blockchain_helper=None)
+    poller = PaymentPoller(
+        settings, transactions_pg=None, blockchain_helper=None, transaction_service=service,
+        checkpoint=checkpoint, metrics=PollerMetrics(None), coordinator=None, log_filter=None,
+    )
+    checkpoint.mark_source(PaymentPoller.LIVE_SOURCE, 10**9)
+    events = make_events()
+
+    processing = asyncio.create_task(poller.process_queue())
+    started = time.perf_counter()
+    for event in events:
+        await poller.enqueue(event)
+    # Все события обработаны, когда контрольную точку больше ничего не держит
+    while checkpoint.safe_block != 10**9:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    processing.cancel()
+    await asyncio.gather(processing, return_exceptions=True)
+    assert service.migrated == EVENTS
+    return EVENTS / elapsed
+
+
+async def main():
+    rows = []
+    for name, workers, batch_size in [
+        ("1 worker, batch 1 (as before)", 1, 1),
+        ("4 workers, batch 1", 4, 1),
+        ("16 workers, batch 1", 16, 1),
+        ("1 worker, batch 100", 1, 100),
+        ("4 workers, batch 100", 4, 100),
+        ("16 workers, batch 100", 16, 100),
+    ]:
+        rows.append([name, f"{await measure(workers, batch_size):.0f}"])
+    print(
+        f"{EVENTS} events, {EVENTS_PER_BLOCK} per block; migration: Redis RTT {REDIS_ROUND_TRIP * 1000:.1f} ms x4, "
+        f"Postgres RTT {PG_ROUND_TRIP * 1000:.1f} ms + {PG_PER_ROW * 1e6:.0f} us/row"
+    )
+    print_table(["process_queue", "events/s"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
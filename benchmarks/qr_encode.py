@@ -0,0 +1,77 @@
+""" user-002: кодирование матрицы QR в PNG/SVG напрямую против Pillow и SVG-фабрики qrcode """
+from io import BytesIO
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+
+from benchmarks import per_call, print_table
+from app.application.services.qr_encoder import build_matrix, matrix_to_png, matrix_to_svg
+
+# Ссылка MetaMask с calldata payForTariff - то, что кодируется в QR без коротких ссылок
+PAYLOAD = (
+    "https://metamask.app.link/send/0x" + "11" * 20 + "@1?value=10000000000000000&data=0x"
+    + "a1b2c3d4" + "ab" * 96
+)
+
+
+def pillow_png(data: str) -> bytes:
+    # Так QR рендерился до прямого кодировщика
+    qr = qrcode.QRCode(version=1, box_size=6, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    bio = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(bio, "PNG")
+    return bio.getvalue()
+
+
+def qrcode_svg(data: str) -> bytes:
+    qr = qrcode.QRCode(version=1, box_size=6, border=2, image_factory=SvgPathImage)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image().to_string()
+
+
+def direct_png(data: str) -> bytes:
+    return matrix_to_png(build_matrix(data))
+
+
+def direct_svg(data: str) -> bytes:
+    return matrix_to_svg(build_matrix(data)).encode()
+
+
+def main():
+    matrix = build_matrix(PAYLOAD)
+    rows = []
+    for name, fn in [
+        ("Pillow PNG", lambda: pillow_png(PAYLOAD)),
+        ("direct PNG", lambda: direct_png(PAYLOAD)),
+        ("qrcode SvgPathImage", lambda: qrcode_svg(PAYLOAD)),
+        ("direct SVG", lambda: direct_svg(PAYLOAD)),
+    ]:
+        rows.append([name, f"{per_call(fn, 50) * 1000:.2f}", len(fn())])
+    print(f"Payload {len(PAYLOAD)} chars, matrix {len(matrix)}x{len(matrix)} with border")
+    print_table(["encoder", "ms/QR (matrix included)", "bytes"], rows)
+
+    # Только кодирование готовой матрицы - то, что заменил прямой кодировщик
+    qr = qrcode.QRCode(version=None, box_size=6, border=2)
+    qr.add_data(PAYLOAD)
+    qr.make(fit=True)
+    svg_qr = qrcode.QRCode(version=None, box_size=6, border=2, image_factory=SvgPathImage)
+    svg_qr.add_data(PAYLOAD)
+    svg_qr.make(fit=True)
+
+    def pillow_encode():
+        qr.make_image(fill_color="black", back_color="white").save(BytesIO(), "PNG")
+
+    encode_rows = [
+        ["Pillow PNG", f"{per_call(pillow_encode, 200) * 1000:.3f}"],
+        ["direct PNG", f"{per_call(lambda: matrix_to_png(matrix), 200) * 1000:.3f}"],
+        ["qrcode SvgPathImage", f"{per_call(lambda: svg_qr.make_image().to_string(), 200) * 1000:.3f}"],
+        ["direct SVG", f"{per_call(lambda: matrix_to_svg(matrix), 200) * 1000:.3f}"],
+    ]
+    print()
+    print_table(["matrix -> image", "ms"], encode_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+""" user-005: версия QR, время рендера и размер для ссылки MetaMask и короткой ссылки """
+import json
+from pathlib import Path
+import uuid
+
+import qrcode
+
+from benchmarks import per_call, print_table
+from app.application.services.qr_renderer import render_qr
+from app.application.services.short_links import ShortLinkService
+from app.infrastructure.calldata import PayForTariffEncoder
+from app.infrastructure.models import ContractData
+
+ABI = json.loads((Path(__file__).parent.parent / "app" / "abi.json").read_text())
+PRICE = 10**16
+
+
+def qr_version(data: str) -> int:
+    qr = qrcode.QRCode(version=None, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.version
+
+
+def main():
+    payment_id = uuid.uuid4()
+    calldata = PayForTariffEncoder.from_abi(ABI).encode(
+        ContractData(paymentId=payment_id, tariffId=uuid.uuid4(), price=PRICE)
+    )
+    payloads = {
+        "MetaMask URL": f"https://metamask.app.link/send/0x{'11' * 20}@1?value={PRICE}&data={calldata}",
+        "short link": ShortLinkService(None, "https://pay.example.com").short_url(payment_id),
+    }
+
+    rows = []
+    for name, payload in payloads.items():
+        version = qr_version(payload)
+        png, svg = render_qr(payload, "png"), render_qr(payload, "svg")
+        rows.append([
+            name, len(payload), version, f"{17 + 4 * version}x{17 + 4 * version}",
+            f"{per_call(lambda: render_qr(payload, 'png'), 30) * 1000:.2f}", len(png),
+            f"{per_call(lambda: render_qr(payload, 'svg'), 30) * 1000:.2f}", len(svg),
+        ])
+    print_table(["payload", "chars", "version", "modules", "PNG ms", "PNG bytes", "SVG ms", "SVG bytes"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+""" user-010: запросов в секунду к GET /tariffs/ до и после версионных снимков с ETag/304 """
+import asyncio
+import logging
+from types import SimpleNamespace
+import time
+import uuid
+
+from benchmarks import print_table
+import fakeredis
+from fastapi import APIRouter, Depends, FastAPI, Request
+import httpx
+
+from app.application.services.tariff_cache import TariffCache
+from app.application.services.tariffs import TariffsService
+from app.infrastructure.db.redis.repositories import TariffsVersionRepository
+from app.presentation.api.models import TariffRead
+from app.presentation.api.tariffs import router as tariffs_router
+
+TARIFFS = 50
+DB_ROUND_TRIP = 0.001   # секунд на SELECT каталога: локальный Postgres
+REQUESTS = 2000
+
+
+class InMemoryTariffsRepository:
+    """Каталог вместо Postgres: строки как ORM-объекты, каждый запрос - один round trip."""
+    def __init__(self):
+        self.queries = 0
+        self.rows = [
+            SimpleNamespace(
+                tariff_id=uuid.uuid4(), name=f"tariff-{i}", price=990 * (i + 1),
+                features="Описание возможностей тарифа " * 4, is_active=True,
+            )
+            for i in range(TARIFFS)
+        ]
+
+    async def get_all(self):
+        self.queries += 1
+        await asyncio.sleep(DB_ROUND_TRIP)
+        return list(self.rows)
+
+
+class NullPubSub:
+    def subscribe(self, channel, handler):
+        pass
+
+    async def publish(self, channel, message):
+        pass
+
+
+def get_container(request: Request):
+    return request.app.state.service_container
+
+
+# Прежний обработчик: каждый запрос - SELECT и сериализация response_model
+baseline_router = APIRouter(prefix="/tariffs")
+
+
+@baseline_router.get("/", response_model=list[TariffRead])
+async def all_tariffs(container=Depends(get_container)):
+    return await container.tariffs_service.get_all()
+
+
+def make_app(router: APIRouter, repo: InMemoryTariffsRepository) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.state.service_container = SimpleNamespace(tariffs_service=TariffsService(
+        tariffs_repo=repo,
+        intent_pool_repo=None,
+        version_repo=TariffsVersionRepository(fakeredis.FakeAsyncRedis(decode_responses=True)),
+        cache=TariffCache(),
+        pubsub=NullPubSub(),
+    ))
+    return app
+
+
+async def measure(router: APIRouter, conditional: bool) -> tuple[float, float, int, int]:
+    repo = InMemoryTariffsRepository()
+    transport = httpx.ASGITransport(app=make_app(router, repo))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await client.get("/tariffs/")
+        headers = {"If-None-Match": first.headers["ETag"]} if conditional else {}
+        repo.queries = 0
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            response = await client.get("/tariffs/", headers=headers)
+        elapsed = time.perf_counter() - started
+    return REQUESTS / elapsed, repo.queries / REQUESTS, response.status_code, len(response.content)
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rows = []
+    for name, router, conditional in [
+        ("before: SELECT + response_model", baseline_router, False),
+        ("after: snapshot, 200", tariffs_router, False),
+        ("after: If-None-Match, 304", tariffs_router, True),
+    ]:
+        rps, queries, status, size = await measure(router, conditional)
+        rows.append([name, status, f"{rps:.0f}", f"{queries:.2f}", size])
+    print(f"{TARIFFS} tariffs, DB round trip {DB_ROUND_TRIP * 1000:.1f} ms, {REQUESTS} sequential requests in-process")
+    print_table(["GET /tariffs/", "status", "req/s", "DB queries/req", "body bytes"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
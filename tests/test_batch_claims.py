@@ -0,0 +1,120 @@
+""" Пакетная выдача платежей подчиняется тому же индексу открытых платежей, что и одиночная """
+import asyncio
+from typing import Optional
+import uuid
+
+import pytest
+
+from app.application.models import TariffData
+from app.application.services.payment_processor import TransactionService
+
+
+class InMemoryTransactions:
+    """Словарь вместо Redis с той же семантикой CLAIM_SCRIPT, что у TransactionsRepository."""
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self.before_claim = None  # вмешательство конкурента прямо перед скриптом
+
+    async def get_raw(self, key: str) -> Optional[str]:
+        return self.values.get(key)
+
+    async def get_many_raw(self, keys: list[str]) -> list[Optional[str]]:
+        return [self.values.get(key) for key in keys]
+
+    async def exists(self, key: str) -> bool:
+        return key in self.values
+
+    async def exists_many(self, keys: list[str]) -> list[bool]:
+        return [key in self.values for key in keys]
+
+    async def claim_transaction(self, index_key, key, transaction_data, expected, expire_seconds):
+        return self._claim(index_key, key, transaction_data, expected)
+
+    async def claim_transactions(self, claims, expire_seconds):
+        return [self._claim(*claim) for claim in claims]
+
+    def _claim(self, index_key, key, transaction_data, expected):
+        if self.before_claim:
+            self.before_claim(index_key)
+        current = self.values.get(index_key, "")
+        if current != expected:
+            return False, current or None
+        self.values[index_key] = transaction_data
+        self.values[key] = transaction_data
+        return True, None
+
+    def expire(self, data):
+        self.values.pop(TransactionService.REDIS_KEY_TEMPLATE.format(
+            payment_hash=TransactionService.compute_payment_hash(data.payment_id)
+        ))
+
+
+@pytest.fixture
+def repo() -> InMemoryTransactions:
+    return InMemoryTransactions()
+
+
+@pytest.fixture
+def service(repo) -> TransactionService:
+    return TransactionService(
+        redis_repository=repo, transactions_pg=None, payment_status_redis=None, pubsub=None
+    )
+
+
+@pytest.fixture
+def tariff() -> TariffData:
+    return TariffData(tariff_id=uuid.uuid4(), name="pro", price=10**16, features="", is_active=True)
+
+
+def test_batch_reuses_payment_issued_by_single_request(service, tariff):
+    async def scenario():
+        single, _ = await service.claim_transaction(1, tariff, expected=None)
+        batch = await service.claim_transactions([1, 2], tariff)
+        return single, batch
+
+    single, batch = asyncio.run(scenario())
+    assert batch[1] == (single, False)
+    assert batch[2][1] is True
+
+
+def test_single_request_reuses_payment_issued_by_batch(service, tariff):
+    async def scenario():
+        batch = await service.claim_transactions([1], tariff)
+        return batch, await service.find_open_transaction(1, tariff.tariff_id)
+
+    batch, opened = asyncio.run(scenario())
+    assert opened == batch[1][0]
+
+
+def test_batch_replaces_expired_or_repriced_payments(service, repo, tariff):
+    async def scenario():
+        first = await service.claim_transactions([1, 2], tariff)
+        repo.expire(first[1][0])
+        repriced = tariff.model_copy(update={"price": tariff.price * 2})
+        return first, await service.claim_transactions([1], tariff), await service.claim_transactions([2], repriced)
+
+    first, after_expiry, after_reprice = asyncio.run(scenario())
+    assert after_expiry[1][1] is True and after_expiry[1][0] != first[1][0]
+    assert after_reprice[2][1] is True and after_reprice[2][0].amount == tariff.price * 2
+
+
+def test_batch_takes_competitor_payment_after_lost_race(service, repo, tariff):
+    async def scenario():
+        competitor, _ = await service.claim_transaction(1, tariff, expected=None)
+        index_key = service._make_open_key(1, tariff.tariff_id)
+        stolen = repo.values.pop(index_key)
+
+        def race(key):
+            # Конкурент возвращает индекс между чтением пачки и скриптом
+            if key == index_key and index_key not in repo.values:
+                repo.values[index_key] = stolen
+        repo.before_claim = race
+        return competitor, await service.claim_transactions([1], tariff)
+
+    competitor, batch = asyncio.run(scenario())
+    assert batch[1] == (competitor, False)
+
+
+def test_batch_collapses_duplicate_users(service, tariff):
+    batch = asyncio.run(service.claim_transactions([1, 1, 2], tariff))
+    assert sorted(batch) == [1, 2]
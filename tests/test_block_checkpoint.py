@@ -0,0 +1,91 @@
+""" Контрольная точка поллера: сверка с цепью при загрузке и fencing-токены при записи """
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.application.services.block_checkpoint import BlockCheckpoint
+from app.application.services.poller_coordination import PollerCoordinator
+from app.infrastructure.db.redis.repositories import BlockCheckpointRepository, PollerCoordinationRepository
+
+
+class FakeChain:
+    def __init__(self, height: int = 1000, branch: str = "a"):
+        self.height = height
+        self.branch = branch
+
+    async def get_block_hash(self, block_number: int) -> str:
+        return f"0x{self.branch}{block_number}"
+
+    async def get_canonical_hash(self, block_number: int):
+        return f"0x{self.branch}{block_number}" if block_number <= self.height else None
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture
+def repo(redis) -> BlockCheckpointRepository:
+    return BlockCheckpointRepository(redis)
+
+
+def test_stale_fencing_token_cannot_overwrite_checkpoint(redis, repo):
+    chain = FakeChain()
+    old_leader = PollerCoordinator(PollerCoordinationRepository(redis), lease_ttl_seconds=0.05)
+    new_leader = PollerCoordinator(PollerCoordinationRepository(redis), lease_ttl_seconds=10)
+    old, new = BlockCheckpoint(repo, chain), BlockCheckpoint(repo, chain)
+
+    async def scenario():
+        old.fencing_token = await old_leader.acquire()
+        old.mark_source("live", 100)
+        await old.flush()
+        # Старый лидер завис дольше аренды - ее забрал другой экземпляр
+        await asyncio.sleep(0.1)
+        new.fencing_token = await new_leader.acquire()
+        new.mark_source("live", 120)
+        await new.flush()
+
+        old.mark_source("live", 150)
+        with pytest.raises(RuntimeError):
+            await old.flush()
+        return old.fencing_token, new.fencing_token, await repo.get()
+
+    old_token, new_token, stored = asyncio.run(scenario())
+    assert new_token > old_token
+    assert stored == (120, "0xa120")
+
+
+@pytest.mark.parametrize("chain", [FakeChain(branch="b"), FakeChain(height=450)], ids=["reorged", "shorter"])
+def test_load_rewinds_when_checkpoint_is_not_canonical(repo, chain):
+    async def scenario():
+        await repo.set(500, "0xa500")
+        checkpoint = BlockCheckpoint(repo, chain, reorg_rewind_blocks=128)
+        return checkpoint, await checkpoint.load()
+
+    checkpoint, resumed = asyncio.run(scenario())
+    assert resumed == checkpoint.persisted == 372
+
+
+def test_load_keeps_canonical_checkpoint(repo):
+    async def scenario():
+        await repo.set(500, "0xa500")
+        return await BlockCheckpoint(repo, FakeChain()).load()
+
+    assert asyncio.run(scenario()) == 500
+
+
+def test_safe_block_trails_unprocessed_events(repo):
+    checkpoint = BlockCheckpoint(repo, FakeChain())
+    checkpoint.mark_source("catch_up", 200)
+    checkpoint.mark_source("live", 300)
+    checkpoint.add(150)
+    checkpoint.add(180)
+    assert checkpoint.safe_block == 149
+
+    checkpoint.done(150)
+    assert checkpoint.safe_block == 179
+    checkpoint.done(180)
+    checkpoint.finish_source("catch_up")
+    assert checkpoint.safe_block == 300
@@ -0,0 +1,80 @@
+""" Предкомпилированный энкодер payForTariff должен совпадать с ABI-кодированием web3 байт в байт """
+import json
+from pathlib import Path
+import random
+import uuid
+
+import pytest
+from web3 import Web3
+
+from app.infrastructure.calldata import PayForTariffEncoder
+from app.infrastructure.models import ContractData
+
+MAX_PRICE = 2**256 - 1
+
+
+@pytest.fixture(scope="module")
+def abi() -> list:
+    # app.config при импорте читает настройки окружения - ABI берем напрямую
+    return json.loads((Path(__file__).parent.parent / "app" / "abi.json").read_text())
+
+
+@pytest.fixture(scope="module")
+def contract(abi):
+    w3 = Web3()
+    # Как в AsyncWeb3Service: hex-строки хешей дополняются до bytes32
+    w3.strict_bytes_type_checking = False
+    return w3.eth.contract(abi=abi)
+
+
+@pytest.fixture(scope="module")
+def encoder(abi) -> PayForTariffEncoder:
+    return PayForTariffEncoder.from_abi(abi)
+
+
+def reference_calldata(contract, data: ContractData) -> str:
+    """Прежняя сборка calldata через contract.encode_abi."""
+    payment_hash = Web3.keccak(text=str(data.paymentId)).hex()
+    tariff_hash = Web3.keccak(text=str(data.tariffId)).hex()
+    return contract.encode_abi("payForTariff", args=[payment_hash, tariff_hash, data.price])
+
+
+def random_items(count: int, seed: int = 0) -> list[ContractData]:
+    rng = random.Random(seed)
+    prices = [0, 1, MAX_PRICE, 10**18] + [rng.randrange(MAX_PRICE) for _ in range(count - 4)]
+    return [
+        ContractData(
+            paymentId=uuid.UUID(int=rng.getrandbits(128), version=4),
+            tariffId=uuid.UUID(int=rng.getrandbits(128), version=4),
+            price=price,
+        )
+        for price in prices
+    ]
+
+
+@pytest.mark.parametrize("data", random_items(50), ids=lambda data: str(data.price)[:12])
+def test_encode_matches_encode_abi(encoder, contract, data):
+    assert encoder.encode(data) == reference_calldata(contract, data)
+
+
+def test_encode_many_matches_encode_abi(encoder, contract):
+    items = random_items(200, seed=1)
+    # Один тариф на несколько платежей - проверяем и кеш хешей тарифов
+    items += [item.model_copy(update={"tariffId": items[0].tariffId}) for item in items[:10]]
+    assert encoder.encode_many(items) == [reference_calldata(contract, data) for data in items]
+
+
+def test_encode_rejects_price_out_of_uint256(encoder):
+    for price in (-1, MAX_PRICE + 1):
+        data = ContractData(paymentId=uuid.uuid4(), tariffId=uuid.uuid4(), price=price)
+        with pytest.raises(ValueError):
+            encoder.encode(data)
+
+
+def test_from_abi_rejects_unexpected_signature(abi):
+    changed = [
+        {**item, "inputs": item["inputs"][:2]} if item.get("name") == PayForTariffEncoder.FUNCTION_NAME else item
+        for item in abi
+    ]
+    with pytest.raises(ValueError):
+        PayForTariffEncoder.from_abi(changed)
@@ -0,0 +1,115 @@
+""" Буфер подтверждений: реорганизация выбрасывает события отвалившейся ветки """
+import asyncio
+import time
+
+import pytest
+
+from app.application.services.confirmations import ConfirmationBuffer
+from app.application.services.poller_metrics import PollerMetrics
+from app.infrastructure.payment_log import PaymentEvent
+
+
+class FakeChain:
+    """Каноническая цепь: хеш блока зависит от ветки, в каждом блоке ветки по одному платежу."""
+    def __init__(self):
+        self.hashes: dict[int, str] = {}
+        self.events: dict[int, list[PaymentEvent]] = {}
+
+    def build(self, start: int, end: int, branch: str):
+        for number in range(start, end + 1):
+            block_hash = f"0x{branch}{number}"
+            self.hashes[number] = block_hash
+            self.events[number] = [PaymentEvent(
+                payment_id=f"{branch}{number}", tariff_id="t", sender=b"\0" * 20, amount_wei=1,
+                timestamp=int(time.time()), block_number=number, block_hash=block_hash,
+                log_index=0, tx_hash=f"{branch}{number}",
+            )]
+
+    def header(self, number: int) -> dict:
+        return {"number": number, "hash": self.hashes[number], "parent_hash": self.hashes.get(number - 1, "0x0")}
+
+    async def get_block_hash(self, block_number: int) -> str:
+        return self.hashes[block_number]
+
+    async def get_payment_logs(self, from_block: int, to_block: int) -> list[PaymentEvent]:
+        return [event for number in range(from_block, to_block + 1) for event in self.events.get(number, [])]
+
+
+@pytest.fixture
+def chain() -> FakeChain:
+    return FakeChain()
+
+
+@pytest.fixture
+def released() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def buffer(chain, released) -> ConfirmationBuffer:
+    async def release(event: PaymentEvent):
+        released.append(event.payment_id)
+
+    buffer = ConfirmationBuffer(
+        chain, confirmations=3, release=release, on_confirmed=lambda block: None, metrics=PollerMetrics(None)
+    )
+    buffer.start(99)
+    return buffer
+
+
+async def deliver(buffer: ConfirmationBuffer, chain: FakeChain, start: int, end: int):
+    """Как подписка: заголовок, логи блока, отметка о доставке."""
+    for number in range(start, end + 1):
+        await buffer.on_head(chain.header(number))
+        for event in chain.events[number]:
+            await buffer.add(event)
+        await buffer.on_progress(number)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_reorg_at_depth_drops_buffered_payments_of_orphaned_branch(buffer, chain, released, depth):
+    async def scenario():
+        chain.build(100, 103, "a")
+        await deliver(buffer, chain, 100, 103)
+        assert released == ["a100"]
+
+        # Последние depth блоков заменяются другой веткой, новый заголовок ссылается на нее
+        chain.build(104 - depth, 110, "b")
+        await deliver(buffer, chain, 104, 110)
+
+    asyncio.run(scenario())
+    fork = 104 - depth
+    assert released == [f"a{n}" for n in range(100, fork)] + [f"b{n}" for n in range(fork, 108)]
+    assert buffer.metrics.reorgs == 1
+    assert buffer.metrics.reorged_events == depth
+
+
+def test_reorg_missed_by_headers_is_caught_on_release(buffer, chain, released):
+    async def scenario():
+        chain.build(100, 102, "a")
+        await deliver(buffer, chain, 100, 102)
+        # Ветка сменилась, но заголовок 103 пришел от узла, еще не видевшего ее (parent - старый 102)
+        chain.build(101, 105, "b")
+        await buffer.on_head({**chain.header(103), "parent_hash": "0xa102"})
+        await buffer.on_progress(103)
+        await deliver(buffer, chain, 104, 105)
+
+    asyncio.run(scenario())
+    assert released == ["a100", "b101", "b102"]
+    assert buffer.metrics.reorged_events == 2
+
+
+def test_removed_log_is_dropped_from_buffer(buffer, chain, released):
+    async def scenario():
+        chain.build(100, 101, "a")
+        await deliver(buffer, chain, 100, 101)
+        removed = chain.events[101][0]
+        removed.removed = True
+        await buffer.add(removed)
+        chain.build(102, 105, "a")
+        chain.events[101] = []
+        await deliver(buffer, chain, 102, 105)
+
+    asyncio.run(scenario())
+    assert "a101" not in released
+    assert buffer.metrics.reorged_events == 1
@@ -0,0 +1,97 @@
+""" Подтверждение прогресса подписки по заголовкам: eth_getLogs только после разрыва цепочки """
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.infrastructure.blockchain import AsyncWeb3Service
+
+
+def header(number: int, parent_hash: str = None, fork: str = "") -> dict:
+    return {
+        "number": number,
+        "hash": f"0x{fork}{number:x}",
+        "parent_hash": parent_hash if parent_hash is not None else f"0x{fork}{number - 1:x}",
+    }
+
+
+class StubRpcPool:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def call(self, fn):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("node unavailable")
+        return []
+
+
+@pytest.fixture
+def service() -> AsyncWeb3Service:
+    service = AsyncWeb3Service(settings)
+    service.rpc_pool = StubRpcPool()
+    service.progress = []
+    service.ranges = []
+
+    async def on_progress(block_number):
+        service.progress.append(block_number)
+
+    async def get_payment_logs(from_block, to_block):
+        service.ranges.append((from_block, to_block))
+        return []
+
+    service._on_progress = on_progress
+    service.get_payment_logs = get_payment_logs
+    # Как после догрузки: все до блока 100 отдано, цепочка продолжается от его заголовка
+    service._listen_block = 100
+    service._last_head = header(100)
+    return service
+
+
+async def noop(event):
+    pass
+
+
+def confirm(service: AsyncWeb3Service, *headers: dict):
+    async def scenario():
+        for item in headers:
+            await service._confirm_delivered(noop, item)
+    asyncio.run(scenario())
+
+
+def test_contiguous_heads_advance_without_rpc(service):
+    confirm(service, *(header(number) for number in range(101, 111)))
+
+    assert service.rpc_pool.calls == 0
+    assert service.progress == list(range(101, 110))
+
+
+def test_missed_head_number_is_confirmed_through_get_logs(service):
+    confirm(service, header(101), header(104), header(105))
+
+    assert service.rpc_pool.calls == 1
+    assert service.ranges == [(101, 102)]
+    assert service.progress == [103, 104]
+
+
+def test_parent_hash_mismatch_is_confirmed_through_get_logs(service):
+    # Реорганизация: блок 101 заменен, новый 102 ссылается на другого родителя
+    confirm(service, header(101), header(102, parent_hash="0xf65", fork="f"), header(103, fork="f"))
+
+    assert service.rpc_pool.calls == 1
+    assert service.progress == [101, 102]
+
+
+def test_failed_confirmation_keeps_checking_until_it_succeeds(service):
+    service._last_head = None
+    service.rpc_pool.fail = True
+    confirm(service, header(102), header(103))
+    assert service.progress == []
+
+    service.rpc_pool.fail = False
+    confirm(service, header(104), header(105))
+
+    assert service.rpc_pool.calls == 3
+    assert service.ranges == [(101, 102)]
+    assert service.progress == [103, 104]
@@ -0,0 +1,119 @@
+""" Idempotency-Key не переживает свой платеж и не выдает повторно оплаченный или истекший """
+import asyncio
+import uuid
+
+import fakeredis
+import pytest
+
+from app.application.models import TariffData
+from app.application.services.payment_intents import PaymentIntentsService
+from app.application.services.payment_processor import TransactionService
+from app.infrastructure.db.redis.repositories import TransactionsRepository
+
+
+class StubTariffs:
+    def __init__(self, tariff: TariffData):
+        self.tariff = tariff
+
+    async def get_by_name(self, name: str) -> TariffData:
+        return self.tariff
+
+
+class StubIntentPool:
+    async def acquire(self, tariff):
+        return None
+
+    async def release(self, intent):
+        pass
+
+
+class StubQRService:
+    """Без рендера и кеша: запоминает, для каких платежей публиковались ссылки."""
+    def __init__(self):
+        self.published = []
+
+    async def get_cached_image(self, payment_id, image_format):
+        return None
+
+    def build_qr_payload(self, data) -> str:
+        return f"pay:{data.payment_id}"
+
+    def qr_content(self, payment_id, url: str) -> str:
+        return url
+
+    async def publish_payment_url(self, payment_id, url, content):
+        self.published.append(payment_id)
+
+    async def generate_qr_code_image(self, url, image_format="png", background=False) -> bytes:
+        return url.encode()
+
+    async def cache_image(self, payment_id, content, image, image_format) -> str:
+        return '"etag"'
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture
+def transactions(redis) -> TransactionService:
+    return TransactionService(
+        redis_repository=TransactionsRepository(redis), transactions_pg=None, payment_status_redis=None, pubsub=None
+    )
+
+
+@pytest.fixture
+def qr_service() -> StubQRService:
+    return StubQRService()
+
+
+@pytest.fixture
+def intents(transactions, qr_service) -> PaymentIntentsService:
+    tariff = TariffData(tariff_id=uuid.uuid4(), name="pro", price=10**16, features="", is_active=True)
+    return PaymentIntentsService(StubTariffs(tariff), transactions, qr_service, StubIntentPool())
+
+
+def payment_key(data) -> str:
+    return TransactionService.REDIS_KEY_TEMPLATE.format(
+        payment_hash=TransactionService.compute_payment_hash(data.payment_id)
+    )
+
+
+def test_retry_with_same_key_returns_same_payment(intents):
+    async def scenario():
+        first = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        second = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert second.transaction == first.transaction
+
+
+def test_key_expires_with_its_payment(intents, redis):
+    async def scenario():
+        issued = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        await redis.pexpire(payment_key(issued.transaction), 60_000)
+        # Переиспользованный платеж: ключ живет ровно столько, сколько осталось платежу
+        reused = await intents.issue_qr_code(1, "pro", idempotency_key="other")
+        return reused, await redis.pttl(TransactionService._make_idempotency_key(1, "other"))
+
+    reused, ttl = asyncio.run(scenario())
+    assert 0 < ttl <= 60_000
+
+
+def test_paid_payment_is_not_reissued_by_key(intents, redis, qr_service):
+    async def scenario():
+        paid = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        # Поллер перенес оплаченный платеж: транзакция и индекс открытых удалены
+        await redis.delete(payment_key(paid.transaction))
+        await redis.delete(TransactionService._make_open_key(1, paid.transaction.tariff_id))
+        published = len(qr_service.published)
+        retried = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        again = await intents.issue_qr_code(1, "pro", idempotency_key="k")
+        return paid, retried, again, qr_service.published[published:]
+
+    paid, retried, again, published = asyncio.run(scenario())
+    assert retried.transaction.payment_id != paid.transaction.payment_id
+    assert again.transaction == retried.transaction
+    assert paid.transaction.payment_id not in published
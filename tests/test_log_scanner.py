@@ -0,0 +1,97 @@
+""" Адаптивный обход eth_getLogs: деление, сжатие и рост окна без превышения concurrency """
+import asyncio
+
+import pytest
+
+from app.infrastructure.log_scanner import LogRangeScanner, LogScanError
+
+
+class StubProvider:
+    """eth_getLogs, который отказывает на окнах больше limit блоков и считает запросы."""
+    def __init__(self, limit: int = 10**9, failing_blocks: frozenset = frozenset(), delay: float = 0.001):
+        self.limit = limit
+        self.failing_blocks = failing_blocks
+        self.delay = delay
+        self.calls: list[tuple[int, int]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, start: int, end: int) -> list[int]:
+        self.calls.append((start, end))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if end - start + 1 > self.limit:
+                raise ValueError("query returned more than 10000 results")
+            if self.failing_blocks & set(range(start, end + 1)):
+                raise TimeoutError()
+            return list(range(start, end + 1))
+        finally:
+            self.in_flight -= 1
+
+
+def scan(scanner: LogRangeScanner, from_block: int, to_block: int) -> list[tuple[int, int, list]]:
+    async def run():
+        return [window async for window in scanner.scan(from_block, to_block)]
+    return asyncio.run(run())
+
+
+def make_scanner(provider: StubProvider, **kwargs) -> LogRangeScanner:
+    kwargs.setdefault("backoff", 0)
+    return LogRangeScanner(fetch=provider.fetch, **kwargs)
+
+
+def test_failing_windows_split_without_exceeding_concurrency():
+    provider = StubProvider(limit=50)
+    scanner = make_scanner(provider, initial_window=2000, concurrency=4)
+
+    windows = scan(scanner, 0, 7999)
+
+    assert provider.max_in_flight <= 4
+    assert [block for _, _, events in windows for block in events] == list(range(8000))
+    assert all(start == prev_end + 1 for (_, prev_end, _), (start, _, _) in zip(windows, windows[1:]))
+    # Без общей очереди деление запускалось сразу: 256 запросов одновременно и 508 всего
+    assert len(provider.calls) < 450
+
+
+def test_window_shrinks_on_failure_and_grows_back():
+    provider = StubProvider(limit=100)
+    scanner = make_scanner(provider, initial_window=400, max_window=1000, concurrency=1)
+
+    scan(scanner, 0, 999)
+    sizes = [end - start + 1 for start, end in provider.calls]
+    assert sizes[0] == 400 and min(sizes) <= 100 and scanner.window < 200
+
+    provider.limit = 10**9
+    provider.calls.clear()
+    scan(scanner, 1000, 19999)
+    sizes = [end - start + 1 for start, end in provider.calls]
+    assert sizes == sorted(sizes[:-1]) + sizes[-1:]
+    assert scanner.window == 1000
+
+
+def test_split_ranges_back_off_before_retry():
+    provider = StubProvider(limit=10)
+    scanner = make_scanner(provider, initial_window=40, concurrency=4, backoff=0.05)
+    loop_time = []
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        async for _ in scanner.scan(0, 39):
+            pass
+        loop_time.append(asyncio.get_running_loop().time() - started)
+
+    asyncio.run(run())
+    # 40 -> 20 -> 10: две неудачи подряд, паузы 0.05 и 0.1
+    assert loop_time[0] >= 0.15
+
+
+def test_single_block_failure_is_retried_then_raises():
+    provider = StubProvider(failing_blocks=frozenset({7}))
+    scanner = make_scanner(provider, initial_window=16, concurrency=2, retries=2)
+
+    with pytest.raises(LogScanError):
+        scan(scanner, 0, 15)
+    assert provider.calls.count((7, 7)) == 3
+    assert provider.max_in_flight <= 2
@@ -0,0 +1,151 @@
+""" Ожидание оплаты: уведомления через Redis pub/sub, явный запуск и остановка подписки, статусы до потока """
+import asyncio
+from types import SimpleNamespace
+import uuid
+
+import fakeredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from app.application.services.payment_events import PaymentEventsHub
+from app.application.services.payment_processor import TransactionService
+from app.infrastructure.db.redis.pubsub import RedisPubSub
+from app.presentation.api.payments import router as payments_router
+
+
+class StubPaymentProcessor:
+    def __init__(self):
+        self.paid: set = set()
+
+    async def check_payment(self, payment_id, fresh: bool = False):
+        return "TOKEN" if payment_id in self.paid else None
+
+    async def check_payments(self, payment_ids: list) -> dict:
+        return {payment_id: await self.check_payment(payment_id) for payment_id in payment_ids}
+
+
+class StubTransactionService:
+    def __init__(self):
+        self.pending: set = set()
+
+    async def is_payment_pending(self, payment_id) -> bool:
+        return payment_id in self.pending
+
+    async def pending_payments(self, payment_ids: list) -> set:
+        return {payment_id for payment_id in payment_ids if payment_id in self.pending}
+
+
+def make_hub(pubsub: RedisPubSub) -> tuple[PaymentEventsHub, StubPaymentProcessor, StubTransactionService]:
+    processor, transactions = StubPaymentProcessor(), StubTransactionService()
+    hub = PaymentEventsHub(pubsub, processor, transactions, keepalive_seconds=30.0, max_wait_seconds=30.0)
+    return hub, processor, transactions
+
+
+async def first(watch):
+    async for token in watch:
+        return token
+    return "finished"
+
+
+def test_started_hub_wakes_waiter_on_settlement():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        pubsub = RedisPubSub(redis)
+        hub, processor, transactions = make_hub(pubsub)
+        payment_id = uuid.uuid4()
+        transactions.pending.add(payment_id)
+
+        await hub.start()
+        await pubsub.start()
+        try:
+            waiter = asyncio.create_task(first(hub.watch(payment_id)))
+            while hub.waiters == 0:
+                await asyncio.sleep(0.01)
+            processor.paid.add(payment_id)
+            transactions.pending.discard(payment_id)
+            # Подписка могла еще не успеть подключиться - публикуем, пока ждущий не проснется
+            while not waiter.done():
+                await redis.publish(TransactionService.SETTLED_CHANNEL, str(payment_id))
+                await asyncio.sleep(0.05)
+            return await waiter
+        finally:
+            await hub.close()
+            await pubsub.close()
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == "TOKEN"
+
+
+def test_close_unsubscribes_and_ends_waiting():
+    async def scenario():
+        pubsub = RedisPubSub(fakeredis.FakeAsyncRedis(decode_responses=True))
+        hub, _, transactions = make_hub(pubsub)
+        payment_id = uuid.uuid4()
+        transactions.pending.add(payment_id)
+
+        await hub.start()
+        waiter = asyncio.create_task(first(hub.watch(payment_id)))
+        while hub.waiters == 0:
+            await asyncio.sleep(0.01)
+        await hub.close()
+        return await waiter, hub.waiters, pubsub._handlers[TransactionService.SETTLED_CHANNEL]
+
+    result, waiters, handlers = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert result == "finished"
+    assert waiters == 0
+    assert handlers == []
+
+
+@pytest.fixture
+def api():
+    hub, processor, transactions = make_hub(RedisPubSub(fakeredis.FakeAsyncRedis(decode_responses=True)))
+    app = FastAPI()
+    app.include_router(payments_router)
+    app.state.service_container = SimpleNamespace(
+        payment_events=hub, payment_processor=processor, transaction_service=transactions
+    )
+    with TestClient(app) as client:
+        yield client, processor, transactions
+
+
+def test_events_of_unknown_or_expired_payment_are_404_before_streaming(api):
+    client, _, _ = api
+
+    response = client.get(f"/payments/{uuid.uuid4()}/events")
+
+    assert response.status_code == 404
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_events_of_paid_payment_stream_the_token(api):
+    client, processor, _ = api
+    payment_id = uuid.uuid4()
+    processor.paid.add(payment_id)
+
+    response = client.get(f"/payments/{payment_id}/events")
+
+    assert response.status_code == 200
+    assert response.text.startswith("event: paid\n")
+
+
+def test_ws_of_expired_payment_gets_expired_without_pending(api):
+    client, _, _ = api
+
+    with client.websocket_connect(f"/payments/{uuid.uuid4()}/ws") as websocket:
+        assert websocket.receive_json() == {"status": "expired"}
+
+
+def test_batch_check_tells_pending_from_expired(api):
+    client, processor, transactions = api
+    paid, pending, expired = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    processor.paid.add(paid)
+    transactions.pending.add(pending)
+
+    response = client.post("/payments/check", json={"payment_ids": [str(paid), str(pending), str(expired)]})
+
+    assert response.status_code == 200
+    assert response.json()["payments"] == {
+        str(paid): {"status": "paid", "token": "TOKEN"},
+        str(pending): {"status": "pending", "token": None},
+        str(expired): {"status": "expired", "token": None},
+    }
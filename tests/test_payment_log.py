@@ -0,0 +1,99 @@
+""" Быстрый декодер PaymentReceived должен давать то же, что и process_log web3 """
+import json
+from pathlib import Path
+import random
+
+from hexbytes import HexBytes
+import pytest
+from web3 import Web3
+
+from app.infrastructure.payment_log import PaymentLogDecoder
+
+CONTRACT_ADDRESS = Web3.to_checksum_address("0x" + "11" * 20)
+
+
+@pytest.fixture(scope="module")
+def abi() -> list:
+    return json.loads((Path(__file__).parent.parent / "app" / "abi.json").read_text())
+
+
+@pytest.fixture(scope="module")
+def event(abi):
+    return Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi).events.PaymentReceived()
+
+
+@pytest.fixture(scope="module")
+def decoder(abi) -> PaymentLogDecoder:
+    return PaymentLogDecoder.from_abi(abi)
+
+
+def random_logs(decoder: PaymentLogDecoder, count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    amounts = [0, 1, 2**256 - 1] + [rng.randrange(10**21) for _ in range(count - 3)]
+    return [
+        {
+            "address": CONTRACT_ADDRESS,
+            "topics": [
+                HexBytes(decoder.topic),
+                HexBytes(rng.randbytes(32)),
+                HexBytes(rng.randbytes(32)),
+                HexBytes(bytes(12) + rng.randbytes(20)),
+            ],
+            "data": HexBytes(amount.to_bytes(32, "big") + rng.getrandbits(40).to_bytes(32, "big")),
+            "blockNumber": rng.randrange(10**8),
+            "blockHash": HexBytes(rng.randbytes(32)),
+            "logIndex": rng.randrange(500),
+            "transactionHash": HexBytes(rng.randbytes(32)),
+            "transactionIndex": rng.randrange(300),
+            "removed": False,
+        }
+        for amount in amounts
+    ]
+
+
+def test_decode_matches_process_log(decoder, event):
+    for log in random_logs(decoder, 200):
+        expected = event.process_log(log)
+        args = expected["args"]
+        decoded = decoder.decode(log)
+
+        assert decoded.payment_id == args["paymentId"].hex()
+        assert decoded.tariff_id == args["tariffId"].hex()
+        assert decoded.from_address == args["from"]
+        assert decoded.amount_wei == args["amount"]
+        assert decoded.amount_eth == Web3.from_wei(args["amount"], "ether")
+        assert decoded.timestamp == args["timestamp"]
+        assert decoded.block_number == expected["blockNumber"]
+        assert decoded.block_hash == expected["blockHash"].to_0x_hex()
+        assert decoded.log_index == expected["logIndex"]
+        assert decoded.tx_hash == expected["transactionHash"].hex()
+        assert not decoded.removed
+
+
+def test_decode_raw_subscription_message(decoder):
+    """Сообщения подписки без форматирования: все поля - 0x-строки."""
+    log = random_logs(decoder, 4, seed=1)[-1]
+    raw = {
+        **log,
+        "topics": [topic.to_0x_hex() for topic in log["topics"]],
+        "data": log["data"].to_0x_hex(),
+        "blockNumber": hex(log["blockNumber"]),
+        "blockHash": log["blockHash"].to_0x_hex(),
+        "logIndex": hex(log["logIndex"]),
+        "transactionHash": log["transactionHash"].to_0x_hex(),
+        "removed": True,
+    }
+    decoded, expected = decoder.decode(raw), decoder.decode(log)
+    for field in expected.__slots__:
+        if field != "removed":
+            assert getattr(decoded, field) == getattr(expected, field)
+    assert decoded.removed
+
+
+def test_decode_skips_foreign_logs(decoder):
+    log = random_logs(decoder, 4, seed=2)[-1]
+    assert decoder.decode({**log, "topics": [HexBytes(bytes(32))] + log["topics"][1:]}) is None
+    assert decoder.decode({**log, "topics": log["topics"][:3]}) is None
+    assert decoder.decode({**log, "data": log["data"][:32]}) is None
+    decoded = decoder.decode_many([log, {**log, "topics": log["topics"][:1]}])
+    assert [event.key for event in decoded] == [decoder.decode(log).key]
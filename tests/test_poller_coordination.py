@@ -0,0 +1,87 @@
+""" Аренда лидерства и захват диапазонов догоняющего обхода между экземплярами поллера """
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.application.services.poller_coordination import PollerCoordinator
+from app.infrastructure.db.redis.repositories import PollerCoordinationRepository
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def coordinator(redis, **kwargs) -> PollerCoordinator:
+    return PollerCoordinator(PollerCoordinationRepository(redis), **kwargs)
+
+
+def test_expired_lease_goes_to_another_instance_with_newer_token(redis):
+    first = coordinator(redis, lease_ttl_seconds=0.05)
+    second = coordinator(redis, lease_ttl_seconds=10)
+
+    async def scenario():
+        token = await first.acquire()
+        blocked = await second.acquire()
+        renewed = await first.renew()
+        await asyncio.sleep(0.1)
+        taken = await second.acquire()
+        return token, blocked, renewed, taken, await first.renew()
+
+    token, blocked, renewed, taken, renewed_late = asyncio.run(scenario())
+    assert blocked is None and renewed
+    assert taken > token
+    assert not renewed_late
+
+
+def test_abandoned_range_is_claimed_again_after_claim_expires(redis):
+    crashed = coordinator(redis, range_blocks=5, claim_ttl_seconds=0.05)
+    alive = coordinator(redis, range_blocks=5, claim_ttl_seconds=10)
+
+    async def scenario():
+        await alive.plan(0, 9)
+        lost = await crashed.claim()
+        own = await alive.claim()
+        nothing = await alive.claim()
+        await asyncio.sleep(0.1)
+        retaken = await alive.claim()
+        await alive.complete(own)
+        await alive.complete(retaken)
+        return lost, own, nothing, retaken, await alive.advance_frontier(-1)
+
+    lost, own, nothing, retaken, frontier = asyncio.run(scenario())
+    assert (lost, own) == ((0, 4), (5, 9))
+    assert nothing is None
+    assert retaken == lost
+    assert frontier == 9
+
+
+def test_extended_claim_is_not_taken_over(redis):
+    worker = coordinator(redis, range_blocks=5, claim_ttl_seconds=0.1)
+    other = coordinator(redis, range_blocks=5, claim_ttl_seconds=0.1)
+
+    async def scenario():
+        await worker.plan(0, 4)
+        claimed = await worker.claim()
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            assert await worker.extend(claimed)
+        return await other.claim()
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_frontier_stops_at_first_gap(redis):
+    leader = coordinator(redis, range_blocks=5)
+
+    async def scenario():
+        await leader.plan(0, 14)
+        ranges = [await leader.claim() for _ in range(3)]
+        await leader.complete(ranges[0])
+        await leader.complete(ranges[2])
+        first = await leader.advance_frontier(-1)
+        await leader.complete(ranges[1])
+        return first, await leader.advance_frontier(first)
+
+    assert asyncio.run(scenario()) == (4, 14)
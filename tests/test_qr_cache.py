@@ -0,0 +1,105 @@
+""" Кеш QR-кода отдается только пока платеж ждет оплаты """
+import asyncio
+import uuid
+
+import fakeredis
+from fastapi import HTTPException
+import pytest
+
+from app.application.models import TariffData
+from app.application.services.payment_intents import PaymentIntentsService
+from app.application.services.payment_processor import TransactionService
+from app.application.services.qr_generator import QRCodeService
+from app.config import settings
+from app.infrastructure.db.redis.repositories import (
+    PaymentStatusRepository,
+    QRCacheRepository,
+    TransactionsRepository,
+)
+
+
+class InMemoryTransactionsPg:
+    def __init__(self):
+        self.rows: dict = {}
+
+    async def create_many(self, rows: list[dict]):
+        for row in rows:
+            self.rows.setdefault(row["payment_id"], row)
+
+
+class NullPubSub:
+    async def publish_many(self, channel: str, messages: list[str]):
+        pass
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture
+def transactions(redis) -> TransactionService:
+    return TransactionService(
+        redis_repository=TransactionsRepository(redis),
+        transactions_pg=InMemoryTransactionsPg(),
+        payment_status_redis=PaymentStatusRepository(redis),
+        pubsub=NullPubSub(),
+    )
+
+
+@pytest.fixture
+def intents(redis, transactions) -> PaymentIntentsService:
+    qr_service = QRCodeService(
+        settings=settings,
+        transaction_service=transactions,
+        blockchain_helper=None,
+        render_executor=None,
+        short_links=None,
+        qr_cache=QRCacheRepository(redis),
+    )
+    return PaymentIntentsService(tariffs_service=None, transaction_service=transactions, qr_service=qr_service, intent_pool=None)
+
+
+@pytest.fixture
+def tariff() -> TariffData:
+    return TariffData(tariff_id=uuid.uuid4(), name="pro", price=10**16, features="", is_active=True)
+
+
+async def issue(intents: PaymentIntentsService, tariff: TariffData):
+    data, _ = await intents.transaction_service.claim_transaction(1, tariff, expected=None)
+    await intents.qr_service.cache_image(data.payment_id, "pay", b"png-bytes", "png")
+    return data
+
+
+def test_pending_payment_is_served_from_cache(intents, tariff):
+    async def scenario():
+        data = await issue(intents, tariff)
+        return await intents.get_qr_code(data.payment_id, "png")
+
+    assert asyncio.run(scenario()).image == b"png-bytes"
+
+
+def test_settled_payment_returns_404(intents, redis, tariff):
+    async def scenario():
+        data = await issue(intents, tariff)
+        await intents.transaction_service.migrate_transactions([TransactionService.compute_payment_hash(data.payment_id)])
+        with pytest.raises(HTTPException) as error:
+            await intents.get_qr_code(data.payment_id, "png")
+        return error.value, await redis.exists(QRCacheRepository.KEY_TEMPLATE.format(payment_id=data.payment_id))
+
+    error, cached = asyncio.run(scenario())
+    assert error.status_code == 404
+    assert not cached
+
+
+def test_expired_payment_returns_404_while_cache_lives(intents, redis, tariff):
+    async def scenario():
+        data = await issue(intents, tariff)
+        await redis.delete(TransactionService.REDIS_KEY_TEMPLATE.format(
+            payment_hash=TransactionService.compute_payment_hash(data.payment_id)
+        ))
+        with pytest.raises(HTTPException) as error:
+            await intents.get_qr_code(data.payment_id, "png")
+        return error.value
+
+    assert asyncio.run(scenario()).status_code == 404
@@ -0,0 +1,58 @@
+""" Прямой кодировщик QR: PNG и SVG воспроизводят матрицу модуль в модуль """
+from io import BytesIO
+import re
+from xml.etree import ElementTree
+
+from PIL import Image
+import pytest
+
+from app.application.services.qr_encoder import build_matrix, matrix_to_png, matrix_to_svg
+
+PAYLOADS = [
+    "https://example.com/p/AbCdEfGhIjKl",
+    "https://metamask.app.link/send/0x" + "11" * 20 + "@1?value=10000000000000000&data=0x" + "ab" * 100,
+]
+
+
+def png_to_matrix(png: bytes, box_size: int) -> list[list[bool]]:
+    image = Image.open(BytesIO(png))
+    assert image.mode == "1"
+    width, height = image.size
+    pixels = image.load()
+    # Каждый модуль - квадрат box_size x box_size одного цвета
+    for y in range(height):
+        for x in range(width):
+            assert pixels[x, y] == pixels[x - x % box_size, y - y % box_size]
+    return [[pixels[x, y] == 0 for x in range(0, width, box_size)] for y in range(0, height, box_size)]
+
+
+def svg_to_matrix(svg: str) -> list[list[bool]]:
+    root = ElementTree.fromstring(svg)
+    count = int(root.get("viewBox").split()[2])
+    matrix = [[False] * count for _ in range(count)]
+    path = root.find("{http://www.w3.org/2000/svg}path").get("d")
+    for x, y, width in re.findall(r"M(\d+) (\d+)h(\d+)v1h-\d+z", path):
+        for column in range(int(x), int(x) + int(width)):
+            assert not matrix[int(y)][column], "серии модулей не должны пересекаться"
+            matrix[int(y)][column] = True
+    return matrix
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+@pytest.mark.parametrize("box_size", [1, 3, 6])
+def test_png_decodes_to_the_same_matrix(payload, box_size):
+    matrix = build_matrix(payload)
+    png = matrix_to_png(matrix, box_size=box_size)
+
+    assert Image.open(BytesIO(png)).size == (len(matrix) * box_size, len(matrix) * box_size)
+    assert png_to_matrix(png, box_size) == matrix
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_svg_path_covers_exactly_the_dark_modules(payload):
+    matrix = build_matrix(payload)
+    svg = matrix_to_svg(matrix, box_size=6)
+
+    root = ElementTree.fromstring(svg)
+    assert root.get("width") == str(len(matrix) * 6)
+    assert svg_to_matrix(svg) == matrix
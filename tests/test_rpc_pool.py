@@ -0,0 +1,103 @@
+""" Пул RPC против локальных заглушек JSON-RPC с задержками и ошибками """
+import asyncio
+from contextlib import asynccontextmanager
+import time
+
+from aiohttp import web
+import pytest
+from web3.exceptions import Web3RPCError
+
+from app.infrastructure.rpc_pool import RpcPool
+
+
+class StubNode:
+    """JSON-RPC узел: отвечает с задержкой delay, mode - ok, query_error (ошибка запроса) или down (HTTP 502)."""
+    def __init__(self, delay: float = 0.0, mode: str = "ok"):
+        self.delay = delay
+        self.mode = mode
+        self.requests: list[str] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(payload["method"])
+        await asyncio.sleep(self.delay)
+        if self.mode == "down":
+            return web.Response(status=502)
+        if self.mode == "query_error":
+            error = {"code": -32005, "message": "query returned more than 10000 results"}
+            return web.json_response({"jsonrpc": "2.0", "id": payload["id"], "error": error})
+        result = "0x10" if payload["method"] == "eth_blockNumber" else []
+        return web.json_response({"jsonrpc": "2.0", "id": payload["id"], "result": result})
+
+
+@asynccontextmanager
+async def serve(*nodes: StubNode):
+    runners, urls = [], []
+    for node in nodes:
+        app = web.Application()
+        app.router.add_post("/", node.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        urls.append(f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/")
+    pool = RpcPool.from_urls(urls, hedge_min_delay=0.05, cooldown=60.0)
+    try:
+        yield pool
+    finally:
+        await pool.close()
+        for runner in runners:
+            await runner.cleanup()
+
+
+def get_logs(w3):
+    return w3.eth.get_logs({"fromBlock": 1, "toBlock": 2})
+
+
+def test_slow_primary_is_hedged_to_backup():
+    primary, backup = StubNode(delay=1.0), StubNode()
+
+    async def scenario():
+        async with serve(primary, backup) as pool:
+            started = time.monotonic()
+            logs = await pool.call_hedged(get_logs)
+            return logs, time.monotonic() - started
+
+    logs, elapsed = asyncio.run(scenario())
+    assert logs == []
+    assert elapsed < 0.8
+    assert backup.requests == ["eth_getLogs"]
+
+
+def test_transport_error_puts_endpoint_in_cooldown():
+    primary, backup = StubNode(mode="down"), StubNode()
+
+    async def scenario():
+        async with serve(primary, backup) as pool:
+            first = await pool.call(lambda w3: w3.eth.block_number)
+            second = await pool.call(lambda w3: w3.eth.block_number)
+            return pool, first, second
+
+    pool, first, second = asyncio.run(scenario())
+    assert first == second == 16
+    assert not pool.endpoints[0].healthy and pool.endpoints[1].healthy
+    # Второй вызов уже не пошел на отдыхающий эндпоинт
+    assert len(primary.requests) == 1 and len(backup.requests) == 2
+
+
+def test_query_error_is_not_penalized_or_repeated():
+    nodes = [StubNode(mode="query_error"), StubNode(mode="query_error"), StubNode(mode="query_error")]
+
+    async def scenario():
+        async with serve(*nodes) as pool:
+            with pytest.raises(Web3RPCError):
+                await pool.call_hedged(get_logs)
+            with pytest.raises(Web3RPCError):
+                await pool.call(get_logs)
+            return pool
+
+    pool = asyncio.run(scenario())
+    assert all(endpoint.healthy and endpoint.error_rate == 0 for endpoint in pool.endpoints)
+    # Каждый обреченный запрос ушел ровно на один эндпоинт
+    assert sum(len(node.requests) for node in nodes) == 2